@@ -1,9 +1,8 @@
 """
-Command used to convert spellbook files from the XML (.xml or .xml.gz)
+Command used to convert spellbook files from the XML (.xml or compressed, e.g. .xml.gz)
 format to the TEXT (.sbk or .sbk.gz) format
 """
 import os
-import gzip
 from pathlib import Path
 from typing import TextIO, List
 
@@ -11,7 +10,9 @@ import click
 from rich.console import Console
 
 from pycana.models import Spell
-from pycana.services.xml_loader import load_spells
+from pycana.services.compression import open_gzip_text
+from pycana.services.parse_cache import ParseCache
+from pycana.services.xml_loader import load_spells, bundle_suffixes
 
 
 @click.command()
@@ -24,7 +25,8 @@ from pycana.services.xml_loader import load_spells
     "--source-compressed",
     is_flag=True,
     default=False,
-    help="Specifies that the compressed XML files will be loaded, rather than the uncompressed.",
+    help="Specifies that the compressed XML files (.xml.gz, .xml.bz2, .xml.xz, ...) will be loaded, rather than the "
+    "uncompressed.",
 )
 @click.option(
     "--dest-directory",
@@ -34,17 +36,39 @@ from pycana.services.xml_loader import load_spells
 @click.option(
     "--dest-compressed", is_flag=True, default=False, help="Specifies that the generated files will be compressed."
 )
+@click.option(
+    "--parallel-compression",
+    is_flag=True,
+    default=False,
+    help="Compresses the generated files in independent blocks on multiple threads (with --dest-compressed).",
+)
+@click.option(
+    "--compression-level",
+    type=click.IntRange(1, 9),
+    default=9,
+    help="The compression level (1-9) used for the generated files, trading size for speed.",
+)
+@click.option(
+    "--no-parse-cache",
+    is_flag=True,
+    default=False,
+    help="Parses all the source files, rather than reading the unchanged ones from the parse cache (~/.pycana/cache).",
+)
 @click.option("--verbose", is_flag=True, help="Enables more extensive logging messages.", default=False)
+# pylint: disable=too-many-locals
 def convert(
     source_directory: str,
     source_compressed: bool,
     dest_directory: str,
     dest_compressed: bool,
+    parallel_compression: bool,
+    compression_level: int,
+    no_parse_cache: bool,
     verbose: bool,
 ) -> None:
     """
-    Converts the .xml or .xml.gz files in the source directory to the spellbook text format in the destination
-    directory.
+    Converts the .xml or compressed (.xml.gz, .xml.bz2, ...) files in the source directory to the spellbook text
+    format in the destination directory.
     """
     console = Console()
 
@@ -55,20 +79,23 @@ def convert(
         f"Converting {source_state}files in '{source_directory}' to {dest_state}files in '{dest_directory}'...",
     )
 
-    src_suffix = ".xml.gz" if source_compressed else ".xml"
+    src_suffixes = bundle_suffixes(compressed=source_compressed)
 
     dest_root = Path(dest_directory)
     dest_root.mkdir(parents=True, exist_ok=True)
 
-    for file in filter(lambda f: f.endswith(src_suffix), os.listdir(source_directory)):
-        spells = load_spells(console, str(Path(source_directory, file)), verbose=verbose)
+    parse_cache = None if no_parse_cache else ParseCache()
 
-        sbk_path = Path(dest_root, file.replace(src_suffix, ".sbk.gz" if dest_compressed else ".sbk"))
+    for file in filter(lambda f: f.endswith(tuple(src_suffixes)), os.listdir(source_directory)):
+        spells = load_spells(console, str(Path(source_directory, file)), verbose=verbose, parse_cache=parse_cache)
+
+        src_suffix = next(suffix for suffix in src_suffixes if file.endswith(suffix))
+        sbk_path = Path(dest_root, file[: -len(src_suffix)] + (".sbk.gz" if dest_compressed else ".sbk"))
 
         console.print(f"Writing {len(spells)} spells into {sbk_path}", style="yellow")
 
         if dest_compressed:
-            with gzip.open(sbk_path, "wt", encoding="utf-8") as sbk_file:
+            with open_gzip_text(sbk_path, level=compression_level, parallel=parallel_compression) as sbk_file:
                 _write_spells(sbk_file, spells)
         else:
             with open(sbk_path, "w", encoding="utf-8") as sbk_file:
@@ -92,8 +119,8 @@ def _write_spells(sbk_file, spells: List[Spell]) -> None:
         _write_field(sbk_file, "ritual", "Y" if spell.ritual else "N")
         _write_field(sbk_file, "range", spell.range)
         _write_field(sbk_file, "duration", spell.duration)
-        _write_field(sbk_file, "components", _display_components(spell.components, details=True))
-        _write_field(sbk_file, "casters", _display_casters(spell.casters))
+        _write_field(sbk_file, "components", spell.display_components(details=True))
+        _write_field(sbk_file, "casters", spell.display_casters())
         sbk_file.write("description:\n")
         sbk_file.write(spell.description)
         sbk_file.write("\n^^^\n\n")
@@ -101,17 +128,3 @@ def _write_spells(sbk_file, spells: List[Spell]) -> None:
 
 def _write_field(file: TextIO, field: str, value: str) -> None:
     file.write(f"{field}: {value}\n")
-
-
-def _display_casters(casters) -> str:
-    return ", ".join(map(str, casters))
-
-
-def _display_components(components, details: bool = False) -> str:
-    comps = []
-    for comp in components:
-        if comp["type"] == "material":
-            comps.append(f"M{' (' + comp['details'] + ')' if details and comp['details'] else ''}")
-        else:
-            comps.append(comp["type"][0].upper())
-    return ", ".join(comps)
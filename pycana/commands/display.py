@@ -0,0 +1,163 @@
+"""
+Functions used to display the spells, shared by the commands.
+"""
+from functools import lru_cache
+from typing import List, Final, Callable, Any, Dict, Optional, Union, Tuple
+
+import click
+from rich.console import Console, ConsoleRenderable, RichCast
+from rich.markdown import Markdown
+from rich.segment import Segment, Segments
+from rich.table import Table
+from rich.text import Text
+
+from pycana.models import Spell
+
+_TEXT_COLUMNS: Final[Dict[str, Callable[[Spell], str]]] = {
+    "book": lambda sp: sp.book,
+    "name": lambda sp: sp.name,
+    "level": lambda sp: str(sp.level),
+    "school": lambda sp: str(sp.school),
+    "category": lambda sp: sp.category if sp.category else "-",
+    "ritual": lambda sp: "Y" if sp.ritual else "N",
+    "guild": lambda sp: "Y" if sp.guild else "N",
+    "range": lambda sp: sp.range,
+    "duration": lambda sp: sp.duration,
+    "casting_time": lambda sp: sp.casting_time,
+    "description": lambda sp: sp.description[0:150] + "...",
+    "casters": lambda sp: sp.display_casters(),
+    "components": lambda sp: sp.display_components(),
+}
+
+
+@lru_cache(maxsize=256)
+def _parsed_markdown(text: str) -> Markdown:
+    return Markdown(text)
+
+
+_COLUMNS: Final[Dict[str, Callable[[Any], Optional[Union[ConsoleRenderable, RichCast, str]]]]] = {
+    **_TEXT_COLUMNS,
+    "description": lambda sp: _parsed_markdown(sp.description[0:150] + "..."),
+}
+
+
+def resolve_visible_cols(shown_cols: str, hidden_cols: str, add_cols: str) -> List[str]:
+    """
+    Resolves the columns displayed for the spells, from the default columns and the (comma-separated) columns
+    shown, hidden or added by the command options.
+
+    Returns: The names of the visible columns.
+    """
+    # FIXME: call configuration:load(location)['default_columns']
+    visible_cols = ["book", "name", "level", "school", "category", "ritual", "guild", "casters", "components"]
+
+    if shown_cols is not None:
+        visible_cols = _extract_cols(shown_cols)
+
+    if hidden_cols is not None:
+        hidden_cols_list = _extract_cols(hidden_cols)
+        visible_cols = [i for i in visible_cols if i not in hidden_cols_list]
+
+    if add_cols is not None:
+        for col in _extract_cols(add_cols):
+            visible_cols.append(col)
+
+    return visible_cols
+
+
+def _extract_cols(col_list: str) -> List[str]:
+    return list(map(lambda x: x.strip(), col_list.split(",")))
+
+
+def _output_field(console: Console, field_name: str, field_value: str) -> None:
+    console.print(Text.assemble((f"{field_name}: ", "white b"), field_value))
+
+
+def display_results(console: Console, spells: List[Spell], visible_cols: List[str]) -> None:
+    """
+    Displays the spells as a (numbered) table of the visible columns.
+    """
+    table = Table(highlight=True)
+    table.add_column("N", style="blue b")
+
+    for vis_col in visible_cols:
+        table.add_column(vis_col.capitalize())
+
+    for idx, spell in enumerate(spells):
+        cols: List[Union[ConsoleRenderable, RichCast, str]] = [str(idx + 1)]
+        for vis_col in visible_cols:
+            cols.append(_COLUMNS[vis_col](spell))  # type: ignore[arg-type]
+
+        table.add_row(*cols)
+
+    console.print(table)
+
+
+def display_text(spells: List[Spell], visible_cols: List[str], output_format: str) -> None:
+    """
+    Writes the spells as plain text ("plain" or "tsv" format) rows of the visible columns, bypassing rich.
+    """
+    # the text formats are written directly, bypassing rich entirely
+    if output_format == "tsv":
+        click.echo("\t".join(visible_cols))
+        for spell in spells:
+            click.echo("\t".join(_tsv_value(_TEXT_COLUMNS[vis_col](spell)) for vis_col in visible_cols))
+    else:
+        rows = [["N"] + [vis_col.capitalize() for vis_col in visible_cols]]
+        for idx, spell in enumerate(spells):
+            rows.append([str(idx + 1)] + [" ".join(_TEXT_COLUMNS[vis_col](spell).split()) for vis_col in visible_cols])
+
+        display_rows(rows, output_format)
+
+
+def display_rows(rows: List[List[str]], output_format: str) -> None:
+    """
+    Writes the rows (the first being the header) as aligned plain text, or tab-separated values ("tsv" format).
+    """
+    widths = [max(len(row[col]) for row in rows) for col in range(len(rows[0]))]
+    for row in rows:
+        if output_format == "tsv":
+            click.echo("\t".join(_tsv_value(value) for value in row))
+        else:
+            click.echo("  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip())
+
+
+def _tsv_value(value: str) -> str:
+    return value.replace("\t", " ").replace("\r", " ").replace("\n", " ")
+
+
+@lru_cache(maxsize=64)
+def _rendered_description(description: str, width: int) -> Tuple[Segment, ...]:
+    # the rendered (styled) segments of a description are cached by text and terminal width, so that repeated views
+    # (e.g. in the shell) skip the markdown parsing and layout - the segments are written by whichever console
+    # displays them
+    return tuple(Console(width=width).render(_parsed_markdown(description)))
+
+
+def display_single(console: Console, spell: Spell, related: Optional[List[Tuple[str, str]]] = None) -> None:
+    """
+    Displays all the details of a single spell, with its rendered description (and its related spells, if any).
+    """
+    console.print(f"\n{spell.name}", style="red b")
+    console.print(f"level {spell.level} {spell.school}{' (ritual)' if spell.ritual else ''}", style="white b i")
+    if spell.category and len(spell.category) > 0:
+        console.print(f"Category: {spell.category}")
+
+    _output_field(console, "Book", spell.book)
+    _output_field(console, "Range", spell.range)
+    _output_field(console, "Duration", spell.duration)
+    _output_field(console, "Casting Time", spell.casting_time)
+    _output_field(console, "Components", spell.display_components(details=True))
+    _output_field(console, "Casters", spell.display_casters())
+
+    console.print()
+    console.print(Segments(_rendered_description(spell.description, console.width)))
+
+    if related:
+        # the related spells from other books are told apart by their book
+        console.print()
+        _output_field(
+            console,
+            "Related Spells",
+            ", ".join(name if book == spell.book else f"{name} ({book})" for book, name in related),
+        )
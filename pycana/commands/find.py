@@ -2,40 +2,65 @@
 Command used to find spells in the database by criteria.
 """
 import html
+import json
 import random
-from typing import List, Final, Callable, Any, Dict, Optional, Union
+import sys
+from pathlib import Path
+from dataclasses import fields
+from typing import List, Final, Any, Dict, Optional, TextIO, Tuple
 
 import click
-from rich.console import Console, ConsoleRenderable, RichCast
-from rich.markdown import Markdown
+from rich.console import Console
 from rich.table import Table
-from rich.text import Text
-
-from pycana.models import SpellCriteria, Spell
-from pycana.services.database import find_spells, resolve_db_path
-
-_COLUMNS: Final[Dict[str, Callable[[Any], Optional[Union[ConsoleRenderable, RichCast, str]]]]] = {
-    "book": lambda sp: html.unescape(sp.book),
-    "name": lambda sp: html.unescape(sp.name),
-    "level": lambda sp: str(sp.level),
-    "school": lambda sp: str(sp.school),
-    "category": lambda sp: sp.category if sp.category else "-",
-    "ritual": lambda sp: "Y" if sp.ritual else "N",
-    "guild": lambda sp: "Y" if sp.guild else "N",
-    "range": lambda sp: sp.range,
-    "duration": lambda sp: sp.duration,
-    "casting_time": lambda sp: sp.casting_time,
-    "description": lambda sp: Markdown(sp.description[0:150] + "..."),
-    "casters": lambda sp: _display_casters(sp.casters),
-    "components": lambda sp: _display_components(sp.components),
-}
+
+from pycana.commands.display import (
+    display_results,
+    display_rows,
+    display_single,
+    display_text,
+    resolve_visible_cols,
+)
+from pycana.commands.options import (
+    apply_bool_criteria,
+    apply_criteria,
+    connection_options,
+    connection_settings,
+    in_memory_option,
+    open_in_memory,
+    query_metrics_options,
+    query_metrics_recorder,
+)
+from pycana.models import SpellCriteria, Spell, School, Caster
+from pycana.services.database import (
+    find_spells_across,
+    resolve_db_paths,
+    count_spells,
+    spell_facets,
+    find_spells_many,
+    find_spells_fuzzy,
+    find_description,
+    find_related,
+    ConnectionSettings,
+    iter_spell_rows,
+)
+from pycana.services.database_session import Database
+from pycana.services.exporter import EXPORT_FORMATS, export_rows, open_export_file
+
+_OUTPUT_FORMATS: Final[List[str]] = ["table", "plain", "tsv"]
+
+_FACET_GROUPS: Final[List[str]] = ["book", "school", "caster", "level"]
 
 
 # FIXME: add --offset N to offset the starting index (when using --liomit)
 
 
 @click.command()
-@click.option("--db-file", default=None, help="The file to be used for the database, if not using the default.")
+@click.option(
+    "--db-file",
+    multiple=True,
+    help="The file to be used for the database, if not using the default - may be repeated to search multiple "
+    "databases together.",
+)
 @click.option("--book", default=None, help='Filters the results for "book" containing the given string.')
 @click.option("--name", default=None, help='Filters the results for "name" containing the given string.')
 @click.option("--category", default=None, help='Filters the results for "category" containing the given string.')
@@ -49,7 +74,10 @@ _COLUMNS: Final[Dict[str, Callable[[Any], Optional[Union[ConsoleRenderable, Rich
 @click.option("--casting-time", default=None, help='Filters the results for "casting time" containing the given value.')
 @click.option("--description", default=None, help='Filters the results for "description" containing the given string.')
 @click.option(
-    "--limit", default=None, help="Limits the results to the specified number of rows (unlimited by default)."
+    "--limit",
+    type=int,
+    default=None,
+    help="Limits the results to the specified number of rows (unlimited by default).",
 )
 @click.option(
     "--general",
@@ -65,10 +93,69 @@ _COLUMNS: Final[Dict[str, Callable[[Any], Optional[Union[ConsoleRenderable, Rich
 @click.option("--show-cols", default=None, help="Specifies the columns that are to be shown.")
 @click.option("--hide-cols", default=None, help="Specifies the columns that are to be hidden.")
 @click.option("--add-cols", default=None, help="Adds the specified columns to the display.")
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(_OUTPUT_FORMATS, case_sensitive=False),
+    default="table",
+    help="The format of the results: a rich 'table' (the default), or 'plain' text and 'tsv' (tab-separated) "
+    "output, which are much faster for large results and suited to piping.",
+)
 @click.option("--random-selection", is_flag=True, help="Randomly selects a spell matching the provided criteria.")
-# pylint: disable=too-many-locals
+@click.option(
+    "--fuzzy",
+    is_flag=True,
+    help="Matches the --name by similarity (tolerating typos, spacing and case), listing the closest matches first.",
+)
+@click.option(
+    "--count",
+    "count_only",
+    is_flag=True,
+    help="Only counts the spells matching the criteria, without listing them.",
+)
+@click.option(
+    "--facets",
+    is_flag=True,
+    help="Breaks the spells matching the criteria down by book, school, caster and level, without listing them.",
+)
+@click.option(
+    "--batch",
+    "batch_file",
+    type=click.File("r", encoding="utf-8"),
+    default=None,
+    help="Runs the searches in the given JSON Lines file (one object of criteria fields per line, '-' for stdin), "
+    "writing the results of each as a line of JSON. The filter options are ignored.",
+)
+@click.option(
+    "--export",
+    "export_format",
+    type=click.Choice(EXPORT_FORMATS, case_sensitive=False),
+    default=None,
+    help="Streams the matching spells to the --output file in the given format, rather than displaying them.",
+)
+@click.option(
+    "--output",
+    default=None,
+    help="The file the exported spells are written to (standard output by default) - compressed if it ends with .gz.",
+)
+@click.option(
+    "--parallel-compression",
+    is_flag=True,
+    default=False,
+    help="Compresses the export file in independent blocks on multiple threads.",
+)
+@click.option(
+    "--compression-level",
+    type=click.IntRange(1, 9),
+    default=9,
+    help="The compression level (1-9) used for the export file, trading size for speed.",
+)
+@in_memory_option
+@connection_options
+@query_metrics_options
+# pylint: disable=too-many-locals,too-many-branches,too-many-statements
 def find(
-    db_file: str,
+    db_file: Tuple[str, ...],
     book: str,
     name: str,
     category: str,
@@ -88,7 +175,23 @@ def find(
     show_cols: str,
     hide_cols: str,
     add_cols: str,
+    output_format: str,
     random_selection: bool,
+    fuzzy: bool,
+    count_only: bool,
+    facets: bool,
+    batch_file: Optional[TextIO],
+    export_format: Optional[str],
+    output: Optional[str],
+    parallel_compression: bool,
+    compression_level: int,
+    in_memory: bool,
+    immutable: bool,
+    mmap_size: Optional[int],
+    cache_size: Optional[int],
+    slow_query_log: Optional[str],
+    slow_query_ms: float,
+    query_metrics: Optional[str],
 ) -> None:
     """
     Finds spells filtered by the provided criteria from the specified database.
@@ -99,34 +202,94 @@ def find(
     Example: `--level 3 --caster "('wizard', 'warlock')"` would find third-level spells that can be cast by a wizard or
     warlock.
 
-    The values are compared with string "contains" comparisons ignoring case.
+    The values are compared with string "contains" comparisons ignoring case - a value starting with "^" only matches
+    at the start (e.g. `--name "^fire"`), which is resolved with an index. The level may also be a range, such as
+    `--level 1-3`.
 
     The available columns are: book, name, level, school, ritual, guild, category, range, duration, casting_time,
     casters, components, and description
     """
     console = Console()
+    settings = connection_settings(
+        immutable, mmap_size, cache_size, query_metrics_recorder(slow_query_log, slow_query_ms, query_metrics)
+    )
+    db_files = resolve_db_paths(db_file)
+
+    if len(db_files) > 1 and (batch_file is not None or fuzzy):
+        raise click.UsageError("The --batch and --fuzzy options search a single database.")
+
+    if in_memory and (batch_file is not None or fuzzy or export_format is not None):
+        raise click.UsageError("The --in-memory option cannot be used with --batch, --fuzzy or --export.")
 
-    spells = find_spells(
-        resolve_db_path(db_file),
-        _build_criteria(
-            book,
-            name,
-            category,
-            level,
-            ritual,
-            guild,
-            caster,
-            school,
-            range,
-            duration,
-            casting_time,
-            description,
-            general,
-        ),
-        limit,
-        sort_by,
+    if fuzzy and (export_format is not None or count_only or facets):
+        raise click.UsageError("The --fuzzy option cannot be used with --export, --count or --facets.")
+
+    database = open_in_memory(db_files, settings) if in_memory else None
+
+    if batch_file is not None:
+        _run_batch(db_files[0], batch_file, limit, sort_by, settings)
+        return
+
+    criteria = _build_criteria(
+        book,
+        name,
+        category,
+        level,
+        ritual,
+        guild,
+        caster,
+        school,
+        range,
+        duration,
+        casting_time,
+        description,
+        general,
     )
 
+    if count_only or facets:
+        _display_aggregates(console, db_files, criteria, settings, facets, output_format.lower(), database)
+        return
+
+    if export_format is not None:
+        # the xml bundles group the spells by book
+        sort_by = sort_by if sort_by or export_format.lower() != "xml" else "book, name"
+        if len(db_files) == 1:
+            rows = iter_spell_rows(db_files[0], criteria, limit, sort_by, settings)
+        else:
+            rows = (spell.to_row() for spell in find_spells_across(db_files, criteria, limit, sort_by, settings))
+
+        if output is None:
+            export_rows(rows, sys.stdout, export_format.lower())
+        else:
+            Path(output).parent.mkdir(parents=True, exist_ok=True)
+            with open_export_file(output, compression_level, parallel_compression) as export_file:
+                count = export_rows(rows, export_file, export_format.lower())
+            console.print(f"Exported {count} spells to {output}.", style="green")
+        return
+
+    visible_cols = resolve_visible_cols(show_cols, hide_cols, add_cols)
+
+    # the descriptions are stored apart, and only loaded when shown in the table (or later, for the single view)
+    with_description = "description" in visible_cols and not random_selection
+
+    if fuzzy:
+        if not name:
+            raise click.UsageError("The --fuzzy option requires a --name to be matched.")
+
+        criteria.name = None
+        spells = find_spells_fuzzy(
+            db_files[0],
+            html.unescape(name),
+            criteria,
+            limit,
+            settings=settings,
+            with_description=with_description,
+        )
+    elif database is not None:
+        spells = database.find_spells(criteria, limit, sort_by, with_description)
+    else:
+        spells = find_spells_across(db_files, criteria, limit, sort_by, settings, with_description)
+
     if len(spells) == 0:
         console.print("No spells found matching your criteria.", style="yellow b i")
         return
@@ -134,16 +297,172 @@ def find(
     # FIXME: if there is only one result - just show it?
 
     if not random_selection:
-        _display_results(console, spells, _resolve_visible_cols(show_cols, hide_cols, add_cols))
+        if output_format.lower() == "table":
+            display_results(console, spells, visible_cols)
+        else:
+            display_text(spells, visible_cols, output_format.lower())
 
     if not no_selection:
         if random_selection:
             selected = random.randint(0, len(spells) - 1)
-            _display_single(console, spells[selected])
+            spell = _described(db_files, spells[selected], settings, database)
+            display_single(console, spell, _related(db_files, spell, settings, database))
         else:
             selected = int(console.input(f"Which one would you like to view (1-{len(spells)}; 0 to quit)? ").strip())
             if selected != 0:
-                _display_single(console, spells[selected - 1])
+                spell = _described(db_files, spells[selected - 1], settings, database)
+                display_single(console, spell, _related(db_files, spell, settings, database))
+
+
+def _described(
+    db_files: List[str], spell: Spell, settings: ConnectionSettings, database: Optional[Database] = None
+) -> Spell:
+    if database is not None and not spell.description:
+        spell.description = database.find_description(spell.book, spell.name)
+
+    # the spell is in one of the searched databases
+    for db_file in db_files:
+        if spell.description:
+            break
+        spell.description = find_description(db_file, spell.book, spell.name, settings)
+    return spell
+
+
+def _related(
+    db_files: List[str], spell: Spell, settings: ConnectionSettings, database: Optional[Database] = None
+) -> List[Tuple[str, str]]:
+    if database is not None:
+        return database.find_related(spell.book, spell.name)
+
+    # the spells are related within their own database
+    for db_file in db_files:
+        related = find_related(db_file, spell.book, spell.name, settings)
+        if related:
+            return related
+    return []
+
+
+def _display_aggregates(
+    console: Console,
+    db_files: List[str],
+    criteria: SpellCriteria,
+    settings: ConnectionSettings,
+    facets: bool,
+    output_format: str,
+    database: Optional[Database] = None,
+) -> None:
+    if not facets:
+        if database is not None:
+            total = database.count_spells(criteria)
+        else:
+            total = sum(count_spells(db_file, criteria, settings) for db_file in db_files)
+        if output_format == "table":
+            console.print(f"{total} spells match your criteria.")
+        else:
+            click.echo(str(total))
+        return
+
+    results = _summed_facets(db_files, criteria, settings, database)
+
+    if output_format == "table":
+        console.print(f"{results['meta']['total']} spells match your criteria.\n")
+        for group in _FACET_GROUPS:
+            console.print(_facet_table(group, results[f"{group}s"]))
+    else:
+        rows = [["facet", "value", "count"]]
+        for group in _FACET_GROUPS:
+            rows += [
+                [group, _facet_label(group, key), str(count)] for key, count in sorted(results[f"{group}s"].items())
+            ]
+        display_rows(rows, output_format)
+
+
+def _summed_facets(
+    db_files: List[str],
+    criteria: SpellCriteria,
+    settings: ConnectionSettings,
+    database: Optional[Database],
+) -> Dict[str, Dict[Any, int]]:
+    # the facets of each database are summed
+    if database is not None:
+        facet_results = [database.spell_facets(criteria)]
+    else:
+        facet_results = [spell_facets(db_file, criteria, settings) for db_file in db_files]
+
+    # every group is listed, even when no spell matches
+    results: Dict[str, Dict[Any, int]] = {"meta": {"total": 0}, **{f"{group}s": {} for group in _FACET_GROUPS}}
+    for db_facets in facet_results:
+        for group, counts in db_facets.items():
+            for key, count in counts.items():
+                results.setdefault(group, {})[key] = results.get(group, {}).get(key, 0) + count
+    return results
+
+
+def _facet_table(group: str, counts: Dict[Any, int]) -> Table:
+    table = Table(title=f"By {group.capitalize()}", width=50)
+    table.add_column(group.capitalize())
+    table.add_column("Count", justify="center")
+
+    for key, count in sorted(counts.items()):
+        table.add_row(_facet_label(group, key), str(count))
+
+    return table
+
+
+def _facet_label(group: str, key: Any) -> str:
+    if group == "school":
+        return str(School.from_str(key))
+    elif group == "caster":
+        return str(Caster.from_str(key))
+    else:
+        return str(key)
+
+
+def _run_batch(
+    db_file: str,
+    batch_file: TextIO,
+    limit: Optional[int],
+    sort_by: Optional[str],
+    settings: ConnectionSettings,
+) -> None:
+    queries: List[Dict[str, Any]] = []
+    criteria_list: List[SpellCriteria] = []
+
+    for line_number, line in enumerate(batch_file, start=1):
+        if line.strip():
+            try:
+                query = json.loads(line)
+                criteria_list.append(_batch_criteria(query))
+                queries.append(query)
+            except ValueError as ex:
+                raise click.BadParameter(f"Invalid search on line {line_number}: {ex}", param_hint="--batch") from ex
+
+    for query, spells in zip(queries, find_spells_many(db_file, criteria_list, limit, sort_by, settings)):
+        click.echo(json.dumps({"query": query, "count": len(spells), "spells": [spell.to_dict() for spell in spells]}))
+
+
+def _batch_criteria(query: Any) -> SpellCriteria:
+    # the searches are checked as they are read, rather than failing later on a value of the wrong type
+    if not isinstance(query, dict):
+        raise ValueError("a search must be a JSON object.")
+
+    criteria = SpellCriteria()
+    known = {item.name for item in fields(SpellCriteria)}
+    for key, value in query.items():
+        if key not in known:
+            raise ValueError(f"unknown criterion '{key}'.")
+        if key == "level" and isinstance(value, int) and not isinstance(value, bool):
+            value = str(value)
+        if key in ("ritual", "guild"):
+            if value is not None and not isinstance(value, bool):
+                raise ValueError(f"the '{key}' criterion must be true or false.")
+        elif value is not None and not isinstance(value, str):
+            raise ValueError(f"the '{key}' criterion must be a string.")
+        setattr(criteria, key, value)
+
+    # (building the predicate checks the syntax of the values, e.g. of the levels)
+    criteria.predicate()
+    return criteria
 
 
 def _build_criteria(
@@ -163,102 +482,24 @@ def _build_criteria(
 ) -> SpellCriteria:
     criteria = SpellCriteria()
 
-    _apply_criteria(criteria, "general", general)
-    _apply_criteria(criteria, "book", book, escaped=True)
-    _apply_criteria(criteria, "name", name, escaped=True)
-    _apply_criteria(criteria, "category", category)
-    _apply_criteria(criteria, "range", spell_range)
-    _apply_criteria(criteria, "duration", duration)
-    _apply_criteria(criteria, "description", description)
-    _apply_criteria(criteria, "casting_time", casting_time)
-    _apply_criteria(criteria, "caster", caster)
-    _apply_criteria(criteria, "school", school)
-    _apply_criteria(criteria, "level", level)
-    _apply_bool_criteria(criteria, "ritual", ritual)
-    _apply_bool_criteria(criteria, "guild", guild)
+    apply_criteria(criteria, "general", general)
+    apply_criteria(criteria, "book", book, escaped=True)
+    apply_criteria(criteria, "name", name, escaped=True)
+    apply_criteria(criteria, "category", category)
+    apply_criteria(criteria, "range", spell_range)
+    apply_criteria(criteria, "duration", duration)
+    apply_criteria(criteria, "description", description)
+    apply_criteria(criteria, "casting_time", casting_time)
+    apply_criteria(criteria, "caster", caster)
+    apply_criteria(criteria, "school", school)
+    apply_criteria(criteria, "level", level)
+    apply_bool_criteria(criteria, "ritual", ritual)
+    apply_bool_criteria(criteria, "guild", guild)
+
+    # the level syntax is checked up-front, rather than failing once the search is run
+    try:
+        SpellCriteria(level=criteria.level).predicate()
+    except ValueError as ex:
+        raise click.BadParameter(str(ex), param_hint="--level") from ex
 
     return criteria
-
-
-def _apply_criteria(criteria: SpellCriteria, name: str, value: Optional[str], escaped: Optional[bool] = False) -> None:
-    if value is not None and len(value) > 0:
-        setattr(criteria, name, value if not escaped else html.unescape(value))
-
-
-def _apply_bool_criteria(criteria: SpellCriteria, name: str, value: Optional[str]) -> None:
-    if value is not None and len(value) > 0:
-        setattr(criteria, name, value.lower() in ["true", "yes", "y"])
-
-
-def _resolve_visible_cols(shown_cols: str, hidden_cols: str, add_cols: str) -> List[str]:
-    # FIXME: call configuration:load(location)['default_columns']
-    visible_cols = ["book", "name", "level", "school", "category", "ritual", "guild", "casters", "components"]
-
-    if shown_cols is not None:
-        visible_cols = _extract_cols(shown_cols)
-
-    if hidden_cols is not None:
-        hidden_cols_list = _extract_cols(hidden_cols)
-        visible_cols = [i for i in visible_cols if i not in hidden_cols_list]
-
-    if add_cols is not None:
-        for col in _extract_cols(add_cols):
-            visible_cols.append(col)
-
-    return visible_cols
-
-
-def _extract_cols(col_list: str) -> List[str]:
-    return list(map(lambda x: x.strip(), col_list.split(",")))
-
-
-def _display_casters(casters) -> str:
-    return ", ".join(map(str, casters))
-
-
-def _display_components(components, details: bool = False) -> str:
-    comps = []
-    for comp in components:
-        if comp["type"] == "material":
-            comps.append(f"M{' (' + comp['details'] + ')' if details and comp['details'] else ''}")
-        else:
-            comps.append(comp["type"][0].upper())
-    return ", ".join(comps)
-
-
-def _output_field(console: Console, field_name: str, field_value: str) -> None:
-    console.print(Text.assemble((f"{field_name}: ", "white b"), field_value))
-
-
-def _display_results(console: Console, spells: List[Spell], visible_cols: List[str]) -> None:
-    table = Table(highlight=True)
-    table.add_column("N", style="blue b")
-
-    for vis_col in visible_cols:
-        table.add_column(vis_col.capitalize())
-
-    for idx, spell in enumerate(spells):
-        cols: List[Union[ConsoleRenderable, RichCast, str]] = [str(idx + 1)]
-        for vis_col in visible_cols:
-            cols.append(_COLUMNS[vis_col](spell))  # type: ignore[arg-type]
-
-        table.add_row(*cols)
-
-    console.print(table)
-
-
-def _display_single(console: Console, spell: Spell) -> None:
-    console.print(f"\n{html.unescape(spell.name)}", style="red b")
-    console.print(f"level {spell.level} {spell.school}{' (ritual)' if spell.ritual else ''}", style="white b i")
-    if spell.category and len(spell.category) > 0:
-        console.print(f"Category: {spell.category}")
-
-    _output_field(console, "Book", html.unescape(spell.book))
-    _output_field(console, "Range", spell.range)
-    _output_field(console, "Duration", spell.duration)
-    _output_field(console, "Casting Time", spell.casting_time)
-    _output_field(console, "Components", _display_components(spell.components, details=True))
-    _output_field(console, "Casters", _display_casters(spell.casters))
-
-    console.print()
-    console.print(Markdown(spell.description))
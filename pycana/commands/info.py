@@ -1,31 +1,50 @@
 """
 Command used to generate a report of the database contents.
 """
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 
 import click
 from rich.console import Console
 from rich.table import Table
 
-from pycana.services.database import db_info, resolve_db_path
+from pycana.commands.options import connection_options, connection_settings, in_memory_option, open_in_memory
+from pycana.services.database import db_info_across, resolve_db_paths
 
 
 @click.command()
-@click.option("--db-file", default=None, help="The file to be used for the database.")
+@click.option(
+    "--db-file",
+    multiple=True,
+    help="The file to be used for the database - may be repeated to report on multiple databases together.",
+)
 @click.option(
     "--show-table",
     type=click.Choice(["total", "book", "school", "caster", "level"], case_sensitive=False),
     default=None,
     help="Show only the specified info table in the results.",
 )
-def info(db_file: str, show_table: str) -> None:
+@in_memory_option
+@connection_options
+def info(
+    db_file: Tuple[str, ...],
+    show_table: str,
+    in_memory: bool,
+    immutable: bool,
+    mmap_size: Optional[int],
+    cache_size: Optional[int],
+) -> None:
     """
     Generates a report of the database contents with statistics about the spells currently contained within it.
     """
     console = Console()
-    db_file = resolve_db_path(db_file)
 
-    info_results = db_info(db_file)
+    db_files = resolve_db_paths(db_file)
+    settings = connection_settings(immutable, mmap_size, cache_size)
+
+    if in_memory:
+        info_results = open_in_memory(db_files, settings).db_info()
+    else:
+        info_results = db_info_across(db_files, settings)
 
     total_spell_count = info_results["meta"]["total"]
 
@@ -4,7 +4,9 @@ Command used to install spells in a database.
 import click
 from rich.console import Console
 
-from pycana.services.database import create_db, load_db, clear_db, resolve_db_path
+from pycana.services.database import rebuild_db, resolve_db_path
+from pycana.services.description_storage import DESCRIPTION_STORAGES, PLAIN
+from pycana.services.parse_cache import ParseCache
 from pycana.services.xml_loader import load_all_spells
 
 # FIXME: add support for text format (spellbook text - .sbk or .sbk.gz)
@@ -17,11 +19,49 @@ from pycana.services.xml_loader import load_all_spells
     help="The directory containing the source files to be installed.",
 )
 @click.option("--db-file", default=None, help="The file to be used for the database.")
-@click.option("--name-filter", default=None, help="Suffix filter used to restrict the files loaded.")
+@click.option(
+    "--name-filter",
+    default=None,
+    help="Suffix filter used to restrict the files loaded (all compressed bundles by default). The compression codec "
+    "is selected by the file suffix.",
+)
+@click.option(
+    "--description-storage",
+    type=click.Choice(DESCRIPTION_STORAGES, case_sensitive=False),
+    default=PLAIN,
+    show_default=True,
+    help="How the spell descriptions are stored: as plain text, or compressed one by one (zlib), optionally with a "
+    "dictionary trained on the installed descriptions (zdict) - compressed descriptions make a smaller database, "
+    "and are searched through a text index.",
+)
+@click.option(
+    "--no-parse-cache",
+    is_flag=True,
+    default=False,
+    help="Parses all the source files, rather than reading the unchanged ones from the parse cache (~/.pycana/cache).",
+)
+@click.option(
+    "--no-related",
+    is_flag=True,
+    default=False,
+    help="Skips computing the related spells of each spell (shown with a single spell) - all the descriptions are "
+    "compared, which is the slowest step of large installs without NumPy.",
+)
 @click.option("--verbose", is_flag=True, help="Enables more extensive logging messages.", default=False)
-def install(source_directory: str, db_file: str, name_filter: str, verbose: bool) -> None:
+def install(
+    source_directory: str,
+    db_file: str,
+    name_filter: str,
+    description_storage: str,
+    no_parse_cache: bool,
+    no_related: bool,
+    verbose: bool,
+) -> None:
     """
     Installs the spells from the specified source directory into the given database file.
+
+    The spells are loaded into a new database file, which then atomically replaces the existing one - searches
+    running during the install continue to see the previously installed spells.
     """
     console = Console()
 
@@ -29,9 +69,7 @@ def install(source_directory: str, db_file: str, name_filter: str, verbose: bool
 
     console.print(f"Installing spells from {source_directory} into {db_file}...", style="blue")
 
-    create_db(db_file)
-    clear_db(db_file)
-    load_db(
+    stats = rebuild_db(
         console,
         db_file,
         load_all_spells(
@@ -39,8 +77,24 @@ def install(source_directory: str, db_file: str, name_filter: str, verbose: bool
             source_directory,
             name_filter=name_filter,
             verbose=verbose,
+            parse_cache=None if no_parse_cache else ParseCache(),
         ),
         verbose=verbose,
+        description_storage=description_storage.lower(),
+        related=not no_related,
     )
 
+    console.print(f"Installed {stats.stored} spells.", style="blue")
+    if stats.duplicates > 0:
+        console.print(
+            f"Found {stats.duplicates} spells duplicating the description of another spell (stored once).", style="blue"
+        )
+
+    if description_storage.lower() != PLAIN:
+        console.print(
+            f"Stored {stats.text_size // 1024} KiB of descriptions in {stats.stored_size // 1024} KiB "
+            f"({description_storage.lower()}).",
+            style="blue",
+        )
+
     console.print("Done.", style="green b")
@@ -0,0 +1,119 @@
+"""
+Command used to generate the spell lists of casters, by spell level.
+"""
+import ast
+from pathlib import Path
+from typing import Optional, List, Dict
+
+import click
+from rich.console import Console
+from rich.table import Table
+
+from pycana.commands.options import connection_options, connection_settings
+from pycana.models import Caster, SpellCriteria, Spell
+from pycana.services.database import spell_listing, resolve_db_path
+from pycana.services.exporter import EXPORT_FORMATS, export_rows, open_export_file
+
+
+@click.command()
+@click.option("--db-file", default=None, help="The file to be used for the database, if not using the default.")
+@click.option(
+    "--caster", default=None, help="The caster (or casters) whose spell lists are generated (all by default)."
+)
+@click.option("--spell-level", default=None, help="The spell level (or levels) included in the lists.")
+@click.option(
+    "--school", default=None, help='Restricts the lists to spells with a "school" containing the given string.'
+)
+@click.option(
+    "--category", default=None, help='Restricts the lists to spells with a "category" containing the given string.'
+)
+@click.option("--number", type=int, default=None, help="The maximum number of spells listed for each level.")
+@click.option(
+    "--export",
+    "export_format",
+    type=click.Choice(EXPORT_FORMATS, case_sensitive=False),
+    default=None,
+    help="Exports the list of each caster to a file in the --output-directory, rather than displaying it.",
+)
+@click.option("--output-directory", default=".", help="The directory the exported lists are written to.")
+@connection_options
+def listing(
+    db_file: str,
+    caster: Optional[str],
+    spell_level: Optional[str],
+    school: Optional[str],
+    category: Optional[str],
+    number: Optional[int],
+    export_format: Optional[str],
+    output_directory: str,
+    immutable: bool,
+    mmap_size: Optional[int],
+    cache_size: Optional[int],
+) -> None:
+    """
+    Generates the spell lists of the casters, by spell level, from a single pass over the spells in the database.
+
+    The criteria may be single- or multi-value, as with the find command. Example: `--caster "('wizard', 'warlock')"
+    --spell-level "(1, 2)"` would list the first- and second-level spells of wizards and warlocks.
+    """
+    console = Console()
+
+    spell_lists = spell_listing(
+        resolve_db_path(db_file),
+        _parse_casters(caster),
+        SpellCriteria(level=spell_level, school=school, category=category),
+        number,
+        connection_settings(immutable, mmap_size, cache_size),
+        with_description=export_format is not None,
+    )
+
+    if len(spell_lists) == 0:
+        console.print("No spells found matching your criteria.", style="yellow b i")
+        return
+
+    for listed_caster, levels in spell_lists.items():
+        if export_format is None:
+            console.print(_build_table(listed_caster, levels))
+        else:
+            _export_list(console, listed_caster, levels, export_format.lower(), output_directory)
+
+
+def _parse_casters(value: Optional[str]) -> Optional[List[Caster]]:
+    if value is None or len(value) == 0:
+        return None
+
+    try:
+        labels = ast.literal_eval(value) if value.startswith("(") and value.endswith(")") else value
+        return [Caster.from_str(label) for label in ([labels] if isinstance(labels, str) else labels)]
+    except (ValueError, SyntaxError, KeyError) as ex:
+        raise click.BadParameter(f"Unknown caster(s): {value}", param_hint="--caster") from ex
+
+
+def _export_list(
+    console: Console,
+    caster: Caster,
+    levels: Dict[int, List[Spell]],
+    export_format: str,
+    output_directory: str,
+) -> None:
+    export_path = Path(output_directory, f"{caster.name.lower()}.{export_format}")
+    export_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open_export_file(str(export_path)) as export_file:
+        rows = (spell.to_row() for level in sorted(levels) for spell in levels[level])
+        count = export_rows(rows, export_file, export_format)
+
+    console.print(f"Exported {count} {caster} spells to {export_path}.", style="green")
+
+
+def _build_table(caster: Caster, levels: Dict[int, List[Spell]]) -> Table:
+    table = Table(title=f"{caster} Spells", highlight=True)
+    table.add_column("Level", style="blue b")
+    table.add_column("Count", justify="center")
+    table.add_column("Spells")
+
+    for level in sorted(levels):
+        names = [f"{spell.name}{' (R)' if spell.ritual else ''}" for spell in levels[level]]
+        table.add_row(str(level), str(len(names)), ", ".join(names))
+
+    return table
@@ -0,0 +1,116 @@
+"""
+Command used to measure the searches under load.
+"""
+from typing import Optional, List
+
+import click
+from rich.console import Console
+from rich.table import Table
+
+from pycana.commands.options import connection_options, connection_settings
+from pycana.models import SpellCriteria
+from pycana.services.database import ConnectionSettings, find_spells, resolve_db_path
+from pycana.services.loadtest import LoadTestResult, criteria_mix, run_load_test
+from pycana.services.xml_loader import load_all_spells
+
+
+@click.command()
+@click.option("--db-file", default=None, help="The file to be used for the database, if not using the default.")
+@click.option("--workers", type=click.IntRange(min=1), default=4, show_default=True, help="The concurrent searchers.")
+@click.option(
+    "--processes",
+    is_flag=True,
+    default=False,
+    help="Runs the searchers as processes rather than threads, so that they search in parallel.",
+)
+@click.option(
+    "--duration",
+    type=click.FloatRange(min=0, min_open=True),
+    default=10.0,
+    show_default=True,
+    help="The duration of the test, in seconds (unless a number of requests is given).",
+)
+@click.option("--requests", type=click.IntRange(min=1), default=None, help="The total number of searches made.")
+@click.option("--seed", type=int, default=None, help="The seed of the search mix, to replay the same searches.")
+@click.option(
+    "--during-install",
+    default=None,
+    help="A directory of spell bundles reinstalled into the database over and over during the test, to measure the "
+    "searches while the database is being replaced.",
+)
+@connection_options
+# pylint: disable=too-many-locals
+def loadtest(
+    db_file: Optional[str],
+    workers: int,
+    processes: bool,
+    duration: float,
+    requests: Optional[int],
+    seed: Optional[int],
+    during_install: Optional[str],
+    immutable: bool,
+    mmap_size: Optional[int],
+    cache_size: Optional[int],
+) -> None:
+    """
+    Replays a realistic mix of searches (drawn from the installed spells) against the database from concurrent
+    searchers, and reports the throughput and the latency percentiles.
+    """
+    console = Console()
+    settings = connection_settings(immutable, mmap_size, cache_size)
+    db_path = resolve_db_path(db_file)
+
+    if immutable and during_install is not None:
+        raise click.UsageError("The --immutable option cannot be used with --during-install.")
+
+    mix = _search_mix(db_path, settings, seed)
+    install_spells = load_all_spells(console, during_install, name_filter=None) if during_install is not None else None
+    if install_spells is not None and not install_spells:
+        raise click.UsageError(f"The --during-install directory ({during_install}) contains no spells to install.")
+
+    console.print(
+        f"Searching {db_path} from {workers} {'processes' if processes else 'threads'} "
+        f"({f'{requests} searches' if requests is not None else f'{duration:g} s'})...",
+        style="blue",
+    )
+
+    try:
+        result = run_load_test(
+            db_path,
+            mix,
+            workers=workers,
+            processes=processes,
+            duration=duration,
+            requests=requests,
+            settings=settings,
+            install_spells=install_spells,
+        )
+    except RuntimeError as ex:
+        raise click.ClickException(str(ex)) from ex
+
+    console.print(_build_table(result, install_spells is not None))
+
+
+def _search_mix(db_path: str, settings: ConnectionSettings, seed: Optional[int]) -> List[SpellCriteria]:
+    spells = find_spells(db_path, settings=settings, with_description=False)
+    if not spells:
+        raise click.UsageError("The database contains no spells to draw the searches from.")
+    return criteria_mix(spells, seed=seed)
+
+
+def _build_table(result: LoadTestResult, during_install: bool) -> Table:
+    table = Table(title="Load Test", width=50)
+    table.add_column("Measure")
+    table.add_column("Value", justify="right")
+
+    table.add_row("Searches", str(result.requests))
+    table.add_row("Errors", str(result.errors))
+    table.add_row("Duration", f"{result.seconds:.2f} s")
+    table.add_row("Throughput", f"{result.throughput:.1f} /s")
+    for percent in (50, 95, 99):
+        table.add_row(f"p{percent}", f"{result.percentile(percent) * 1000:.2f} ms")
+    table.add_row("Max", f"{result.percentile(100) * 1000:.2f} ms")
+    if during_install:
+        table.add_row("Reinstalls", str(result.reinstalls))
+
+    return table
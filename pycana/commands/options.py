@@ -0,0 +1,150 @@
+"""
+Command line options shared by multiple commands.
+"""
+import html
+from typing import Callable, Any, Optional, List
+
+import click
+
+from pycana.models import SpellCriteria
+from pycana.services.database import ConnectionSettings
+from pycana.services.database_session import Database
+from pycana.services.query_metrics import QueryMetrics, SLOW_THRESHOLD
+
+
+def connection_options(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Decorates a command with the options used to tune its (read-only) database connection. The values are passed to
+    the command as the `immutable`, `mmap_size` and `cache_size` arguments - see `connection_settings`.
+    """
+    func = click.option(
+        "--cache-size",
+        type=int,
+        default=None,
+        help="The database page cache size (pages if positive, KiB if negative).",
+    )(func)
+    func = click.option(
+        "--mmap-size",
+        type=int,
+        default=None,
+        help="The maximum number of bytes of the database file to memory-map.",
+    )(func)
+    func = click.option(
+        "--immutable",
+        is_flag=True,
+        default=False,
+        help="Opens the database as immutable (no locking) - only for database files that are never modified.",
+    )(func)
+    return func
+
+
+def connection_settings(
+    immutable: bool, mmap_size: Optional[int], cache_size: Optional[int], metrics: Optional[QueryMetrics] = None
+) -> ConnectionSettings:
+    """
+    Builds the read-only connection settings from the values of the `connection_options` (and the recorder built by
+    `query_metrics_recorder`, if any).
+    """
+    return ConnectionSettings(
+        read_only=True, immutable=immutable, mmap_size=mmap_size, cache_size=cache_size, metrics=metrics
+    )
+
+
+def query_metrics_options(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Decorates a command with the options used to measure its database statements. The values are passed to the
+    command as the `slow_query_log`, `slow_query_ms` and `query_metrics` arguments - see `query_metrics_recorder`.
+    """
+    func = click.option(
+        "--query-metrics",
+        type=click.Path(dir_okay=False, writable=True),
+        default=None,
+        help="The file the statement metrics are written to at the end - as JSON if it ends with .json, in the "
+        "Prometheus text format otherwise.",
+    )(func)
+    func = click.option(
+        "--slow-query-ms",
+        type=click.FloatRange(min=0),
+        default=SLOW_THRESHOLD * 1000,
+        show_default=True,
+        help="The duration (in milliseconds) from which a statement is written to the slow-query log.",
+    )(func)
+    func = click.option(
+        "--slow-query-log",
+        type=click.Path(dir_okay=False, writable=True),
+        default=None,
+        help="The file the slow statements are appended to (their shape, without the searched values).",
+    )(func)
+    return func
+
+
+def query_metrics_recorder(
+    slow_query_log: Optional[str], slow_query_ms: float, query_metrics: Optional[str]
+) -> Optional[QueryMetrics]:
+    """
+    Builds the recorder of the database statements from the values of the `query_metrics_options` - the metrics are
+    written along with the end of the command.
+
+    Returns: The recorder (`None` if neither a slow-query log nor a metrics file is requested).
+    """
+    if slow_query_log is None and query_metrics is None:
+        return None
+
+    metrics = QueryMetrics(slow_threshold=slow_query_ms / 1000, slow_log_path=slow_query_log)
+    if query_metrics is not None:
+        click.get_current_context().call_on_close(lambda: metrics.dump(query_metrics))
+
+    return metrics
+
+
+def in_memory_option(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Decorates a command with the `--in-memory` option, passed to the command as the `in_memory` argument - see
+    `open_in_memory`.
+    """
+    return click.option(
+        "--in-memory",
+        is_flag=True,
+        default=False,
+        help="Copies the database into memory, and serves the searches from there (the copy time is reported).",
+    )(func)
+
+
+def open_in_memory(db_files: List[str], settings: ConnectionSettings) -> Database:
+    """
+    Copies the database into memory for the `--in-memory` option, reporting the cost of the copy on the standard
+    error. The database is closed along with the command.
+
+    Raises:
+        click.UsageError: if there is more than one database.
+    """
+    if len(db_files) > 1:
+        raise click.UsageError("The --in-memory option applies to a single database.")
+
+    database = Database(db_files[0], in_memory=True, settings=settings)
+    click.get_current_context().call_on_close(database.close)
+
+    if database.load_cost is not None:
+        click.echo(
+            f"Loaded the database into memory ({database.load_cost.size // 1024} KiB) in "
+            f"{database.load_cost.seconds * 1000:.1f} ms.",
+            err=True,
+        )
+
+    return database
+
+
+def apply_criteria(criteria: SpellCriteria, name: str, value: Optional[str], escaped: Optional[bool] = False) -> None:
+    """
+    Sets a criteria field from the value of its option (unless empty) - html-unescaped if `escaped`.
+    """
+    if value is not None and len(value) > 0:
+        setattr(criteria, name, value if not escaped else html.unescape(value))
+
+
+def apply_bool_criteria(criteria: SpellCriteria, name: str, value: Optional[str]) -> None:
+    """
+    Sets a boolean criteria field from the value of its option (unless empty) - "true", "yes" or "y" being true.
+    """
+    if value is not None and len(value) > 0:
+        setattr(criteria, name, value.lower() in ["true", "yes", "y"])
@@ -0,0 +1,40 @@
+"""
+Command used to restore a snapshot of a database (see the `snapshot` command).
+"""
+import time
+from typing import Optional
+
+import click
+from rich.console import Console
+
+from pycana.services.database import count_spells, resolve_db_path, restore_db
+
+
+@click.command()
+@click.option("--db-file", default=None, help="The file to be used for the database, if not using the default.")
+@click.option(
+    "--snapshot-file",
+    required=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="The snapshot file to be restored (written by the snapshot command, compressed or not).",
+)
+def restore(db_file: Optional[str], snapshot_file: str) -> None:
+    """
+    Restores the snapshot in place of the database, atomically - the searches running meanwhile keep seeing the
+    previous database, and a snapshot which is not a valid spell database is rejected before replacing anything.
+    """
+    console = Console()
+    db_path = resolve_db_path(db_file)
+
+    console.print(f"Restoring {snapshot_file} into the database ({db_path})...", style="blue")
+
+    started = time.perf_counter()
+    try:
+        restore_db(snapshot_file, db_path)
+    except (ValueError, EOFError, OSError) as error:
+        raise click.ClickException(f"The snapshot could not be restored: {error}") from error
+
+    console.print(
+        f"Restored {count_spells(db_path)} spells in {time.perf_counter() - started:.2f} s.",
+        style="green b",
+    )
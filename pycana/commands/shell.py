@@ -0,0 +1,219 @@
+"""
+Command used to search the spells interactively.
+"""
+import cmd
+import shlex
+import sqlite3
+import time
+from dataclasses import fields, replace
+from typing import List, Final, Dict, Optional, Tuple
+
+import click
+from rich.console import Console
+
+from pycana.commands.display import display_results, display_single, resolve_visible_cols
+from pycana.commands.options import (
+    apply_bool_criteria,
+    apply_criteria,
+    connection_options,
+    connection_settings,
+    in_memory_option,
+    open_in_memory,
+    query_metrics_options,
+    query_metrics_recorder,
+)
+from pycana.models import Spell, SpellCriteria
+from pycana.services.database import resolve_db_path
+from pycana.services.database_session import Database
+
+# the criteria fields which may be refined, and their aliases
+_FIELDS: Final[List[str]] = [item.name for item in fields(SpellCriteria)]
+
+_ALIASES: Final[Dict[str, str]] = {"casters": "caster", "casting-time": "casting_time"}
+
+_BOOL_FIELDS: Final[List[str]] = ["ritual", "guild"]
+
+# the fields whose values may be html-escaped (like the find options)
+_ESCAPED_FIELDS: Final[List[str]] = ["book", "name"]
+
+_DEFAULT_SORT: Final[str] = "level, name, book"
+
+# the number of results listed after each search (the list command shows them all)
+_PAGE_SIZE: Final[int] = 20
+
+
+@click.command()
+@click.option("--db-file", default=None, help="The file to be used for the database, if not using the default.")
+@in_memory_option
+@connection_options
+@query_metrics_options
+def shell(
+    db_file: Optional[str],
+    in_memory: bool,
+    immutable: bool,
+    mmap_size: Optional[int],
+    cache_size: Optional[int],
+    slow_query_log: Optional[str],
+    slow_query_ms: float,
+    query_metrics: Optional[str],
+) -> None:
+    """
+    Starts an interactive search session over the spells (type "help" for the commands).
+
+    The database stays open for the whole session: each refinement of the criteria only searches the previous results
+    when it is stricter (e.g. a longer name, or an added field), and any number of spells may be viewed.
+    """
+    settings = connection_settings(
+        immutable, mmap_size, cache_size, query_metrics_recorder(slow_query_log, slow_query_ms, query_metrics)
+    )
+    db_path = resolve_db_path(db_file)
+
+    if in_memory:
+        database = open_in_memory([db_path], settings)
+    else:
+        database = Database(db_path, settings=settings)
+        click.get_current_context().call_on_close(database.close)
+
+    SpellShell(Console(), database).cmdloop()
+
+
+class SpellShell(cmd.Cmd):
+    """
+    The interactive search session - the criteria are built up by the commands, and the matching spells are listed
+    after each change.
+    """
+
+    intro = 'Search the spells by criteria (type "help" for the commands, "quit" to leave).'
+    prompt = "pycana> "
+
+    def __init__(self, console: Console, database: Database) -> None:
+        super().__init__()
+        self._console = console
+        self._database = database
+        self._criteria = SpellCriteria()
+        self._sort_by = _DEFAULT_SORT
+        self._columns = resolve_visible_cols(None, None, None)  # type: ignore[arg-type]
+        self._spells: List[Spell] = []
+
+    def do_find(self, arg: str) -> None:
+        """
+        find FIELD=VALUE ... - searches with new criteria, e.g. find level=1-3 caster=wizard name="magic m"
+        """
+        self._search(self._parsed(SpellCriteria(), arg))
+
+    def do_refine(self, arg: str) -> None:
+        """
+        refine FIELD=VALUE ... - adds criteria, or changes their values, e.g. refine school=evocation
+        """
+        self._search(self._parsed(replace(self._criteria), arg))
+
+    def do_drop(self, arg: str) -> None:
+        """
+        drop FIELD ... - removes criteria, e.g. drop level school
+        """
+        criteria = replace(self._criteria)
+        for name in arg.split():
+            setattr(criteria, self._field(name), None)
+        self._search(criteria)
+
+    def do_sort(self, arg: str) -> None:
+        """
+        sort CLAUSE - changes the order of the results, e.g. sort name desc (level, name and book by default)
+        """
+        self._sort_by = arg.strip() or _DEFAULT_SORT
+        self._search(self._criteria)
+
+    def do_list(self, arg: str) -> None:  # pylint: disable=unused-argument
+        """
+        list - lists all the current results
+        """
+        self._display(self._spells)
+
+    def do_view(self, arg: str) -> None:
+        """
+        view N ... - shows the spells with the given result numbers, e.g. view 1 3
+        """
+        for number in arg.split():
+            if not number.isdigit() or not 1 <= int(number) <= len(self._spells):
+                raise ValueError(f"There is no result number {number}.")
+
+            spell = self._spells[int(number) - 1]
+            if not spell.description:
+                spell.description = self._database.find_description(spell.book, spell.name)
+            display_single(self._console, spell, self._database.find_related(spell.book, spell.name))
+
+    def do_criteria(self, arg: str) -> None:  # pylint: disable=unused-argument
+        """
+        criteria - shows the current criteria
+        """
+        values = {item.name: getattr(self._criteria, item.name) for item in fields(self._criteria)}
+        current = " ".join(f"{name}={shlex.quote(str(value))}" for name, value in values.items() if value is not None)
+        self._console.print(current or "No criteria (all spells).", highlight=False)
+
+    def do_quit(self, arg: str) -> bool:  # pylint: disable=unused-argument
+        """
+        quit - ends the session
+        """
+        return True
+
+    do_EOF = do_quit
+
+    def default(self, line: str) -> None:
+        # any other text refines the name, so a name can be typed progressively ("fi", "fire", "fireb"...)
+        self._search(replace(self._criteria, name=line.strip()))
+
+    def emptyline(self) -> bool:
+        # (rather than repeating the last command)
+        return False
+
+    def onecmd(self, line: str) -> bool:
+        try:
+            return super().onecmd(line)
+        except (ValueError, sqlite3.Error) as ex:
+            self._console.print(str(ex), style="red")
+            return False
+
+    def _parsed(self, criteria: SpellCriteria, arg: str) -> SpellCriteria:
+        for term in shlex.split(arg):
+            name, separator, value = term.partition("=")
+            if not separator:
+                raise ValueError(f"The criteria must be given as FIELD=VALUE (not {term}).")
+
+            name = self._field(name)
+            setattr(criteria, name, None)
+            if name in _BOOL_FIELDS:
+                apply_bool_criteria(criteria, name, value)
+            else:
+                apply_criteria(criteria, name, value, escaped=name in _ESCAPED_FIELDS)
+
+        return criteria
+
+    @staticmethod
+    def _field(name: str) -> str:
+        name = _ALIASES.get(name.lower(), name.lower())
+        if name not in _FIELDS:
+            raise ValueError(f"Unknown criteria field: {name} (must be one of {', '.join(_FIELDS)}).")
+        return name
+
+    def _search(self, criteria: SpellCriteria) -> None:
+        started = time.perf_counter()
+        spells, narrowed = self._database.refine(criteria, self._sort_by)
+        elapsed = time.perf_counter() - started
+
+        self._criteria = criteria
+        self._spells = spells
+
+        self._display(spells[:_PAGE_SIZE])
+        self._console.print(self._summary(len(spells), narrowed, elapsed), style="blue", highlight=False)
+
+    def _display(self, spells: List[Spell]) -> None:
+        if spells:
+            display_results(self._console, spells, self._columns)
+
+    @staticmethod
+    def _summary(count: int, narrowed: bool, elapsed: float) -> str:
+        details: Tuple[str, ...] = (f"{elapsed * 1000:.1f} ms",)
+        if narrowed:
+            details = ("narrowed",) + details
+        more = f" - the first {_PAGE_SIZE} are listed (list shows them all)" if count > _PAGE_SIZE else ""
+        return f"{count} spells match ({', '.join(details)}){more}."
@@ -0,0 +1,53 @@
+"""
+Command used to write a snapshot of the database, to be restored later (see the `restore` command).
+"""
+import os
+import time
+from typing import Optional
+
+import click
+from rich.console import Console
+
+from pycana.services.database import resolve_db_path, snapshot_db
+
+
+@click.command()
+@click.option("--db-file", default=None, help="The file to be used for the database, if not using the default.")
+@click.option(
+    "--output",
+    required=True,
+    help="The file the snapshot is written to - compressed if it ends with .gz.",
+)
+@click.option(
+    "--parallel-compression",
+    is_flag=True,
+    default=False,
+    help="Compresses the snapshot in independent blocks on multiple threads.",
+)
+@click.option(
+    "--compression-level",
+    type=click.IntRange(1, 9),
+    default=9,
+    help="The compression level (1-9) used for the snapshot, trading size for speed.",
+)
+def snapshot(db_file: Optional[str], output: str, parallel_compression: bool, compression_level: int) -> None:
+    """
+    Writes a compact copy of the database (with its indexes and query statistics) to a snapshot file, which can be
+    restored in place of a database much faster than installing the spells again.
+    """
+    console = Console()
+    db_path = resolve_db_path(db_file)
+
+    if not os.path.exists(db_path):
+        raise click.UsageError(f"The database {db_path} does not exist.")
+
+    console.print(f"Writing a snapshot of the database ({db_path})...", style="blue")
+
+    started = time.perf_counter()
+    snapshot_db(db_path, output, compression_level=compression_level, parallel_compression=parallel_compression)
+
+    console.print(
+        f"Wrote {output} ({os.path.getsize(output) / 1024:.1f} KiB, from {os.path.getsize(db_path) / 1024:.1f} KiB) "
+        f"in {time.perf_counter() - started:.2f} s.",
+        style="green b",
+    )
@@ -3,7 +3,7 @@ The main entry point for the pycana command line application.
 """
 import click
 
-from .commands import install, clean, find, info, convert
+from .commands import install, clean, find, info, convert, listing, shell, loadtest, snapshot, restore
 
 
 @click.version_option()
@@ -17,6 +17,11 @@ main.add_command(clean.clean)
 main.add_command(find.find)
 main.add_command(info.info)
 main.add_command(convert.convert)
+main.add_command(listing.listing)
+main.add_command(shell.shell)
+main.add_command(loadtest.loadtest)
+main.add_command(snapshot.snapshot)
+main.add_command(restore.restore)
 
 if __name__ == "__main__":  # pragma: no cover
     main()
@@ -3,10 +3,11 @@ The shared models for the application.
 """
 from __future__ import annotations
 
+import ast
 import json
-from dataclasses import dataclass
+from dataclasses import dataclass, field, fields
 from enum import Enum, unique, auto
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Any
 
 
 @unique
@@ -57,6 +58,30 @@ class Caster(Enum):
         return ",".join(list(map(lambda cst: cst.name, casters)))
 
 
+class _LazyText:
+    """
+    A text field which may be given a deferred value (e.g. a compressed description read from the database), only
+    converted to its text (with `str`) when the field is first read.
+    """
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._attr = f"_{name}"
+
+    def __get__(self, instance: Any, owner: Any = None) -> str:
+        if instance is None:
+            raise AttributeError(self._name)
+
+        value = getattr(instance, self._attr)
+        if not isinstance(value, str):
+            value = str(value)
+            setattr(instance, self._attr, value)
+        return value
+
+    def __set__(self, instance: Any, value: object) -> None:
+        setattr(instance, self._attr, value)
+
+
 @dataclass
 class Spell:
     book: str
@@ -72,10 +97,30 @@ class Spell:
     description: str
     casters: List[Caster]
     components: List[Dict[str, str]]
+    # the display strings precomputed when the spell was stored (None when not loaded from the database)
+    casters_display: Optional[str] = field(default=None, compare=False, repr=False)
+    components_display: Optional[str] = field(default=None, compare=False, repr=False)
 
     def __str__(self):
         return f"{self.book} ({self.level}): {self.name}"
 
+    def display_casters(self) -> str:
+        if self.casters_display is not None:
+            return self.casters_display
+        return ", ".join(map(str, self.casters))
+
+    def display_components(self, details: bool = False) -> str:
+        if self.components_display is not None and not details:
+            return self.components_display
+
+        comps = []
+        for comp in self.components:
+            if comp["type"] == "material":
+                comps.append(f"M{' (' + comp['details'] + ')' if details and comp['details'] else ''}")
+            else:
+                comps.append(comp["type"][0].upper())
+        return ", ".join(comps)
+
     def to_row(self) -> Tuple:
         return (
             self.book,
@@ -93,6 +138,33 @@ class Spell:
             json.dumps(self.components),
         )
 
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "book": self.book,
+            "name": self.name,
+            "level": self.level,
+            "school": self.school.name,
+            "ritual": self.ritual,
+            "guild": self.guild,
+            "category": self.category,
+            "range": self.range,
+            "duration": self.duration,
+            "casting_time": self.casting_time,
+            "description": self.description,
+            "casters": [caster.name for caster in self.casters],
+            "components": self.components,
+        }
+
+    @staticmethod
+    def from_dict(values: Dict[str, Any]) -> Spell:
+        return Spell(
+            **{
+                **values,
+                "school": School.from_str(values["school"]),
+                "casters": [Caster.from_str(caster) for caster in values["casters"]],
+            }
+        )
+
     @staticmethod
     def from_row(row) -> Spell:
         return Spell(
@@ -109,9 +181,15 @@ class Spell:
             description=row[10],
             casters=list(map(Caster.from_str, str(row[11]).split(","))),
             components=json.loads(row[12]),
+            casters_display=row[13] if len(row) > 13 else None,
+            components_display=row[14] if len(row) > 14 else None,
         )
 
 
+# the descriptions read from the database may still be compressed - they are only decompressed when used
+setattr(Spell, "description", _LazyText("description"))
+
+
 @dataclass()
 class SpellCriteria:
     book: Optional[str] = None
@@ -129,26 +207,57 @@ class SpellCriteria:
     general: Optional[str] = None
 
     def where(self) -> str:
+        predicate = self.predicate()
+        return f"WHERE {predicate}" if predicate else ""
+
+    def narrows(self, other: SpellCriteria) -> bool:
+        """
+        Returns: Whether every spell matching these criteria is sure to also match the `other` criteria - each of the
+        other criteria is either unchanged, or made stricter here (e.g. a text value extended, or an empty field set).
+        """
+        for item in fields(self):
+            mine, theirs = getattr(self, item.name), getattr(other, item.name)
+            if theirs is None or theirs == "" or mine == theirs:
+                continue
+            if item.name == "level" or not isinstance(mine, str) or not self._narrower_text(mine, theirs):
+                return False
+        return True
+
+    @staticmethod
+    def _narrower_text(value: str, other: str) -> bool:
+        # whether the (single) "contains" value only matches text that the other value matches - the comparison
+        # ignores case like the columns, which only fold ASCII letters
+        if value.startswith("(") or other.startswith("("):
+            return False
+
+        value, other = (value.lower(), other.lower()) if value.isascii() and other.isascii() else (value, other)
+        if other.startswith("^"):
+            return value.startswith(other)
+        return other in value.lstrip("^")
+
+    def predicate(self) -> str:
+        """
+        Returns: The SQL boolean expression matching the criteria (without the WHERE keyword), or an empty string if
+        there are no criteria.
+        """
         clauses: List[str] = []
 
-        if self.empty():
-            return ""
-        else:
+        if not self.empty():
             self._apply_clause(clauses, "book", self.book)
-            self._apply_clause(clauses, "name", self.name)
+            self._apply_clause(clauses, "search_key", self.name.casefold() if self.name else None)
             self._apply_clause(clauses, "category", self.category)
             self._apply_clause(clauses, "range", self.range)
             self._apply_clause(clauses, "duration", self.duration)
             self._apply_clause(clauses, "casting_time", self.casting_time)
-            self._apply_clause(clauses, "description", self.description)
+            self._apply_description_clause(clauses, self.description)
             self._apply_int_clause(clauses, "level", self.level)
             self._apply_bool_clause(clauses, "ritual", self.ritual)
             self._apply_bool_clause(clauses, "guild", self.guild)
-            self._apply_clause(clauses, "school", self.school)
+            self._apply_school_clause(clauses, "school", self.school)
             self._apply_clause(clauses, "casters", self.caster)
             self._apply_general_clause(clauses, self.general)
 
-        return f"WHERE {' AND '.join(clauses)}" if len(clauses) > 0 else ""
+        return " AND ".join(clauses)
 
     @staticmethod
     def _apply_general_clause(clauses: List[str], value: Optional[str]) -> None:
@@ -156,12 +265,12 @@ class SpellCriteria:
 
         if SpellCriteria._not_empty(value):
             SpellCriteria._apply_clause(general_clauses, "book", value)
-            SpellCriteria._apply_clause(general_clauses, "name", value)
+            SpellCriteria._apply_clause(general_clauses, "search_key", value.casefold() if value else None)
             SpellCriteria._apply_clause(general_clauses, "category", value)
             SpellCriteria._apply_clause(general_clauses, "range", value)
             SpellCriteria._apply_clause(general_clauses, "duration", value)
             SpellCriteria._apply_clause(general_clauses, "casting_time", value)
-            SpellCriteria._apply_clause(general_clauses, "description", value)
+            SpellCriteria._apply_description_clause(general_clauses, value)
             SpellCriteria._apply_clause(general_clauses, "school", value)
             SpellCriteria._apply_clause(general_clauses, "casters", value)
 
@@ -172,12 +281,20 @@ class SpellCriteria:
 
     @staticmethod
     def _apply_clause(clauses: List[str], name: str, value: Optional[str]) -> None:
-        if SpellCriteria._not_empty(value):
-            if value and value.startswith("(") and value.endswith(")"):
-                # pylint: disable=eval-used
-                clauses.append(SpellCriteria._or_values(name, eval(value)))
-            else:
-                clauses.append(SpellCriteria._like_contains(name, value))
+        values = SpellCriteria._values(value)
+        if values:
+            clauses.append(SpellCriteria._or_values(name, values))
+
+    @staticmethod
+    def _apply_description_clause(clauses: List[str], value: Optional[str]) -> None:
+        # the descriptions are searched through the spell_text view, which may be backed by a text index (or by
+        # compressed descriptions), and they are matched to the spells by their content hash
+        values = SpellCriteria._values(value)
+        if values:
+            clauses.append(
+                "content_hash IN (SELECT content_hash FROM spell_text WHERE "
+                f"{SpellCriteria._or_values('description', values, lean=True)})"
+            )
 
     @staticmethod
     def _apply_bool_clause(clauses: List[str], name: str, value: Optional[bool]) -> None:
@@ -186,27 +303,96 @@ class SpellCriteria:
 
     @staticmethod
     def _apply_int_clause(clauses: List[str], name: str, value: Optional[str]) -> None:
-        if SpellCriteria._not_empty(value):
-            if value and value.startswith("(") and value.endswith(")"):
-                # pylint: disable=eval-used
-                items = map(lambda x: SpellCriteria._value_eq(name, x), eval(value))
-                clauses.append(f"({' OR '.join(items)})")
+        exact: List[int] = []
+        terms: List[str] = []
+
+        for item in SpellCriteria._values(value):
+            low, separator, high = item.partition("-")
+            if separator and low.strip() and high.strip():
+                terms.append(
+                    f"{name} BETWEEN {SpellCriteria._number(name, low)} AND {SpellCriteria._number(name, high)}"
+                )
+            elif SpellCriteria._number(name, item) not in exact:
+                exact.append(SpellCriteria._number(name, item))
+
+        if len(exact) > 1:
+            terms.insert(0, f"{name} IN ({', '.join(map(str, exact))})")
+        elif exact:
+            terms.insert(0, f"{name} = {exact[0]}")
+
+        if len(terms) > 1:
+            clauses.append(f"({' OR '.join(terms)})")
+        elif terms:
+            clauses.append(terms[0])
+
+    @staticmethod
+    def _number(name: str, item: str) -> int:
+        try:
+            return int(item)
+        except ValueError as ex:
+            raise ValueError(
+                f"Invalid {name} criteria: {item} (must be a number, a range like 1-3, or several like (1, 3))"
+            ) from ex
+
+    @staticmethod
+    def _apply_school_clause(clauses: List[str], name: str, value: Optional[str]) -> None:
+        values = SpellCriteria._values(value)
+
+        # full school names are matched exactly, so that the school index can be used
+        if values and all(item.upper() in School.__members__ for item in values):
+            schools = list(dict.fromkeys(item.upper() for item in values))
+            if len(schools) > 1:
+                clauses.append(f"{name} IN ({', '.join(map(SpellCriteria._quoted, schools))})")
             else:
-                clauses.append(SpellCriteria._value_eq(name, value))
+                clauses.append(f"{name} = {SpellCriteria._quoted(schools[0])}")
+        elif values:
+            clauses.append(SpellCriteria._or_values(name, values))
+
+    @staticmethod
+    def _values(value: Optional[str]) -> List[str]:
+        # the distinct values of a single- or multi-value criteria field (compared ignoring case, like the columns)
+        if not value:
+            return []
+
+        if value.startswith("(") and value.endswith(")"):
+            try:
+                parsed = ast.literal_eval(value)
+            except (ValueError, SyntaxError) as ex:
+                raise ValueError(f"Invalid multi-value criteria: {value}") from ex
+            items = parsed if isinstance(parsed, tuple) else (parsed,)
+        else:
+            items = (value,)
+
+        distinct: Dict[str, str] = {}
+        for item in map(str, items):
+            if item:
+                distinct.setdefault(item.casefold(), item)
+        return list(distinct.values())
+
+    @staticmethod
+    def _like_contains(name: str, value: str, lean: bool = False) -> str:
+        # the columns compare case-insensitively (NOCASE) - a leading "^" anchors the match to the start of the value,
+        # which the planner can resolve with an index. A lean match leaves out the ESCAPE clause when there is nothing
+        # to escape, as SQLite never hands a LIKE having one to a (text index) virtual table.
+        text = value[1:] if value.startswith("^") else value
+        escaped = SpellCriteria._like_escaped(text)
+        pattern = f"{escaped}%" if value.startswith("^") else f"%{escaped}%"
+        escape = "" if lean and escaped == text else " ESCAPE '\\'"
+        return f"{name} LIKE {SpellCriteria._quoted(pattern)}{escape}"
 
     @staticmethod
-    def _value_eq(name: str, value: Optional[str], quoted: Optional[bool] = False):
-        used_value = f"'{value}'" if quoted else value
-        return f"{name} = {used_value}"
+    def _like_escaped(value: str) -> str:
+        return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
 
     @staticmethod
-    def _like_contains(name: str, value: Optional[str]) -> str:
-        # TODO: better None-handling
-        return f"LOWER({name}) like '%{value.lower() if value else ''}%'"
+    def _quoted(value: str) -> str:
+        return "'" + value.replace("'", "''") + "'"
 
     @staticmethod
-    def _or_values(name: str, values: Tuple[str]) -> str:
-        return f"({' OR '.join(map(lambda x: SpellCriteria._like_contains(name, x), values))})"
+    def _or_values(name: str, values: List[str], lean: bool = False) -> str:
+        if len(values) == 1:
+            return SpellCriteria._like_contains(name, values[0], lean)
+        return f"({' OR '.join(map(lambda x: SpellCriteria._like_contains(name, x, lean), values))})"
 
     def empty(self) -> bool:
         return all(
@@ -220,8 +406,8 @@ class SpellCriteria:
                 self._empty(self.casting_time),
                 self._empty(self.description),
                 self._empty(self.level),
-                self.ritual is not None,
-                self.guild is not None,
+                self.ritual is None,
+                self.guild is None,
                 self._empty(self.school),
                 self._empty(self.caster),
             ]
@@ -0,0 +1,214 @@
+"""
+An asyncio-friendly access to the database, for embedding the spell searches in async applications (e.g. chat bots).
+"""
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+import threading
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Final, Optional, List, Dict, Callable, TypeVar, AsyncIterator
+
+from pycana.models import Spell, SpellCriteria
+from pycana.services.database import ConnectionSettings, connect, execute_find, query_info
+
+_DEFAULT_WORKERS: Final[int] = 4
+
+_DEFAULT_BATCH_SIZE: Final[int] = 256
+
+_T = TypeVar("_T")
+
+
+class AsyncDatabase:
+    """
+    Provides async versions of the database searches. The (blocking) queries are run on a dedicated, bounded thread
+    pool, using a pool of reused read-only connections (at most one per worker - the calls beyond it wait for a free
+    connection), so they never stall the event loop.
+
+    Every call accepts an optional timeout (in seconds). When a call times out, or its task is cancelled, the running
+    query is interrupted (`sqlite3.Connection.interrupt`), so a slow scan does not keep holding a worker thread.
+
+    It should be closed when no longer needed (or used as an `async with` context manager).
+
+    Args:
+        db_path: the path to the database file.
+        settings: the connection settings (read-only connections by default).
+        max_workers: the maximum number of queries run at the same time.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        settings: Optional[ConnectionSettings] = None,
+        max_workers: int = _DEFAULT_WORKERS,
+    ) -> None:
+        self._db_path = db_path
+        self._settings = settings or ConnectionSettings(read_only=True)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pycana-db")
+        self._max_workers = max_workers
+        # (created in the event loop, on first use)
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._idle: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    async def __aenter__(self) -> AsyncDatabase:
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def find_spells(
+        self,
+        criteria: Optional[SpellCriteria] = None,
+        limit: Optional[int] = None,
+        sort_by: Optional[str] = None,
+        with_description: bool = True,
+        timeout: Optional[float] = None,
+    ) -> List[Spell]:
+        """
+        Finds the spells matching the given criteria (see `pycana.services.database.find_spells`).
+
+        Args:
+            criteria: the search criteria (all spells if `None`).
+            limit: the maximum number of spells returned (unlimited if `None`).
+            sort_by: the sort clause (e.g. "level desc").
+            with_description: whether the descriptions are loaded.
+            timeout: the maximum time (in seconds) the search may take (unlimited if `None`).
+
+        Returns: The list of matching spells.
+
+        Raises:
+            asyncio.TimeoutError: if the search did not complete in time.
+        """
+        async with self._connection() as conn:
+            return await self._run(
+                conn,
+                lambda: [Spell.from_row(row) for row in execute_find(conn, criteria, limit, sort_by, with_description)],
+                timeout,
+            )
+
+    async def db_info(self, timeout: Optional[float] = None) -> Dict[str, Dict[str, int]]:
+        """
+        Retrieves the statistical information about the contents of the database (see
+        `pycana.services.database.db_info`).
+
+        Args:
+            timeout: the maximum time (in seconds) the queries may take (unlimited if `None`).
+
+        Returns: A dictionary containing the statistical information (counts by type).
+
+        Raises:
+            asyncio.TimeoutError: if the queries did not complete in time.
+        """
+        async with self._connection() as conn:
+            return await self._run(conn, lambda: query_info(conn), timeout)
+
+    async def iter_spells(
+        self,
+        criteria: Optional[SpellCriteria] = None,
+        limit: Optional[int] = None,
+        sort_by: Optional[str] = None,
+        with_description: bool = True,
+        batch_size: int = _DEFAULT_BATCH_SIZE,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[Spell]:
+        """
+        Streams the spells matching the given criteria, fetching them from the database in batches, so that large
+        results are never held in memory at once.
+
+        Args:
+            criteria: the search criteria (all spells if `None`).
+            limit: the maximum number of spells returned (unlimited if `None`).
+            sort_by: the sort clause (e.g. "level desc").
+            with_description: whether the descriptions are loaded.
+            batch_size: the number of rows fetched from the database at a time.
+            timeout: the maximum time (in seconds) each batch may take to be fetched (unlimited if `None`).
+
+        Returns: An async iterator over the matching spells.
+
+        Raises:
+            asyncio.TimeoutError: if a batch was not fetched in time.
+        """
+        async with self._connection() as conn:
+            cursor = await self._run(
+                conn, lambda: execute_find(conn, criteria, limit, sort_by, with_description), timeout
+            )
+            try:
+                while rows := await self._run(conn, lambda: cursor.fetchmany(batch_size), timeout):
+                    for row in rows:
+                        yield Spell.from_row(row)
+            finally:
+                cursor.close()
+
+    async def close(self) -> None:
+        """
+        Waits for the running queries to complete, and closes the pooled connections.
+        """
+        self._closed = True
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+        with self._lock:
+            for conn in self._idle:
+                conn.close()
+            self._idle.clear()
+
+    @asynccontextmanager
+    async def _connection(self) -> AsyncIterator[sqlite3.Connection]:
+        # lends a pooled connection for the duration of the block, returning it to the pool afterwards - no more
+        # connections than workers are ever lent (or opened), the other callers wait for one to be returned
+        if self._closed:
+            raise RuntimeError("The database has been closed.")
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._max_workers)
+
+        async with self._slots:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+
+            if conn is None:
+                # opened on a worker thread, as opening may block (e.g. on a slow file system)
+                conn = await asyncio.get_running_loop().run_in_executor(self._executor, self._open)
+
+            try:
+                yield conn
+            finally:
+                with self._lock:
+                    if self._closed:
+                        conn.close()
+                    else:
+                        self._idle.append(conn)
+
+    def _open(self) -> sqlite3.Connection:
+        # the pooled connections are used by whichever worker thread runs the query, but never concurrently
+        return connect(self._db_path, self._settings, check_same_thread=False)
+
+    async def _run(self, conn: sqlite3.Connection, func: Callable[[], _T], timeout: Optional[float]) -> _T:
+        job = self._executor.submit(func)
+        waiter = asyncio.wrap_future(job)
+
+        try:
+            done, _ = await asyncio.wait({waiter}, timeout=timeout)
+        except asyncio.CancelledError:
+            await _abort(conn, job, waiter)
+            raise
+
+        if not done:
+            await _abort(conn, job, waiter)
+            raise asyncio.TimeoutError(f"The query did not complete within {timeout} seconds.")
+
+        return waiter.result()
+
+
+async def _abort(conn: sqlite3.Connection, job: Future, waiter: asyncio.Future) -> None:
+    if job.cancel():
+        return
+
+    # the query is already running - interrupt it, and wait for it to stop, so the connection is idle when reused
+    conn.interrupt()
+    await asyncio.wait({waiter})
+
+    if not waiter.cancelled():
+        waiter.exception()
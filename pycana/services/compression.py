@@ -0,0 +1,265 @@
+"""
+Functions and classes used to read and write compressed files.
+"""
+from __future__ import annotations
+
+import gzip
+import io
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass
+from typing import Final, Optional, Deque, TextIO, BinaryIO, Union, Callable, Dict, List
+
+# the optional codecs are only registered when the runtime's standard library provides them
+try:
+    import bz2
+except ImportError:  # pragma: no cover
+    bz2 = None  # type: ignore[assignment]
+
+try:
+    import lzma
+except ImportError:  # pragma: no cover
+    lzma = None  # type: ignore[assignment]
+
+try:
+    from compression import zstd  # type: ignore[import-not-found]  # python 3.14+
+except ImportError:  # pragma: no cover
+    zstd = None
+
+_DEFAULT_BLOCK_SIZE: Final[int] = 1024 * 1024
+
+_DEFAULT_LEVEL: Final[int] = 9
+
+_READ_BUFFER_SIZE: Final[int] = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class Codec:
+    """
+    A compression codec used to read files having the given suffix. The `opener` wraps an open binary file with a
+    decompressing binary stream.
+    """
+
+    name: str
+    suffix: str
+    opener: Callable[[BinaryIO], io.BufferedIOBase]
+
+
+_CODECS: Dict[str, Codec] = {}
+
+
+def register_codec(codec: Codec) -> None:
+    """
+    Registers a compression codec, replacing any codec already registered for the same suffix.
+
+    Args:
+        codec: the codec to be registered.
+    """
+    _CODECS[codec.suffix] = codec
+
+
+def find_codec(path: Union[str, os.PathLike]) -> Optional[Codec]:
+    """
+    Finds the registered compression codec for the given file path, based on its suffix.
+
+    Args:
+        path: the path of the file.
+
+    Returns: The codec for the file, or `None` if the file is not a known compressed type.
+    """
+    return _CODECS.get(os.path.splitext(str(path))[1].lower())
+
+
+def compressed_suffixes() -> List[str]:
+    """
+    Returns: The suffixes (e.g. ".gz") of all the registered compression codecs.
+    """
+    return list(_CODECS.keys())
+
+
+def open_binary(path: Union[str, os.PathLike], buffer_size: int = _READ_BUFFER_SIZE) -> BinaryIO:
+    """
+    Opens the file for binary reading through a large buffer, transparently decompressing it when its suffix
+    matches a registered codec.
+
+    Args:
+        path: the path of the file to be read.
+        buffer_size: the size of the read buffers (in bytes).
+
+    Returns: A readable binary stream of the (decompressed) file content.
+    """
+    file = open(path, "rb", buffering=buffer_size)  # pylint: disable=consider-using-with
+
+    codec = find_codec(path)
+    if codec is None:
+        return file  # type: ignore[return-value]
+
+    try:
+        return _CodecReader(codec.opener(file), file, buffer_size)  # type: ignore[return-value]
+    except Exception:
+        file.close()
+        raise
+
+
+class _CodecReader(io.BufferedReader):
+    """
+    A buffered reader over a decompressing stream, which also closes the underlying compressed file (the codec
+    streams do not close file objects they were given).
+    """
+
+    def __init__(self, stream, source: BinaryIO, buffer_size: int) -> None:
+        super().__init__(stream, buffer_size=buffer_size)
+        self._source = source
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            self._source.close()
+
+
+class ParallelGzipWriter(io.BufferedIOBase):
+    """
+    A binary writer producing a multi-member gzip stream, where each block of written data is compressed as an
+    independent gzip member on a thread pool (zlib releases the GIL while compressing). The members are written to
+    the underlying file in order, so the result is a valid `.gz` stream readable by any gzip decoder.
+
+    Args:
+        file: the binary file (or path) the compressed data will be written to.
+        level: the compression level (1-9), trading size for speed.
+        threads: the number of compression threads (the CPU count by default).
+        block_size: the size (in bytes) of the uncompressed blocks compressed as independent members.
+    """
+
+    def __init__(
+        self,
+        file: Union[str, os.PathLike, BinaryIO],
+        level: int = _DEFAULT_LEVEL,
+        threads: Optional[int] = None,
+        block_size: int = _DEFAULT_BLOCK_SIZE,
+    ) -> None:
+        super().__init__()
+
+        if not 0 <= level <= 9:
+            raise ValueError(f"The compression level ({level}) must be between 0 and 9.")
+
+        self._owns_file = isinstance(file, (str, os.PathLike))
+        # pylint: disable=consider-using-with
+        self._file: BinaryIO = open(file, "wb") if self._owns_file else file  # type: ignore[arg-type,assignment]
+        self._level = level
+        self._threads = threads if threads else (os.cpu_count() or 1)
+        self._block_size = block_size
+        self._buffer = bytearray()
+        self._submitted = False
+        self._pending: Deque[Future] = deque()
+        self._executor = ThreadPoolExecutor(max_workers=self._threads, thread_name_prefix="pycana-gzip")
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:  # type: ignore[override]
+        if self.closed:
+            raise ValueError("Write to a closed ParallelGzipWriter.")
+
+        self._buffer += data
+
+        while len(self._buffer) >= self._block_size:
+            self._submit(bytes(self._buffer[: self._block_size]))
+            del self._buffer[: self._block_size]
+
+        return len(data)
+
+    def flush(self) -> None:
+        if not self._file.closed:
+            self._file.flush()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+
+        try:
+            # an empty stream is still a single (empty) member, as an empty file is not a valid gzip file
+            if self._buffer or not self._submitted:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+
+            while self._pending:
+                self._file.write(self._pending.popleft().result())
+
+            self._file.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+            if self._owns_file:
+                self._file.close()
+            super().close()
+
+    def _submit(self, block: bytes) -> None:
+        self._submitted = True
+        self._pending.append(self._executor.submit(gzip.compress, block, self._level, mtime=0))
+
+        # keep a bounded number of blocks in flight, writing completed members in order
+        while len(self._pending) > self._threads * 2:
+            self._file.write(self._pending.popleft().result())
+
+
+def open_gzip_text(
+    path: Union[str, os.PathLike],
+    level: int = _DEFAULT_LEVEL,
+    parallel: bool = False,
+    threads: Optional[int] = None,
+) -> TextIO:
+    """
+    Opens a gzip file for writing utf-8 text, either with the standard single-threaded `gzip` writer or the
+    block-parallel `ParallelGzipWriter`.
+
+    Args:
+        path: the path of the file to be written.
+        level: the compression level (1-9).
+        parallel: whether the block-parallel writer should be used.
+        threads: the number of compression threads used by the parallel writer (CPU count by default).
+
+    Returns: A writable text stream - it must be closed to complete the file.
+    """
+    if parallel:
+        writer = ParallelGzipWriter(path, level=level, threads=threads)
+        return io.TextIOWrapper(writer, encoding="utf-8")  # type: ignore[type-var]
+    else:
+        return gzip.open(path, "wt", encoding="utf-8", compresslevel=level)  # type: ignore[return-value]
+
+
+def open_gzip_binary(
+    path: Union[str, os.PathLike],
+    level: int = _DEFAULT_LEVEL,
+    parallel: bool = False,
+    threads: Optional[int] = None,
+) -> BinaryIO:
+    """
+    Opens a gzip file for writing binary data, either with the standard single-threaded `gzip` writer or the
+    block-parallel `ParallelGzipWriter` (see `open_gzip_text`).
+
+    Args:
+        path: the path of the file to be written.
+        level: the compression level (1-9).
+        parallel: whether the block-parallel writer should be used.
+        threads: the number of compression threads used by the parallel writer (CPU count by default).
+
+    Returns: A writable binary stream - it must be closed to complete the file.
+    """
+    if parallel:
+        return ParallelGzipWriter(path, level=level, threads=threads)  # type: ignore[return-value]
+    else:
+        return gzip.open(path, "wb", compresslevel=level)  # type: ignore[return-value]
+
+
+register_codec(Codec("gzip", ".gz", lambda file: gzip.GzipFile(fileobj=file, mode="rb")))
+
+if bz2 is not None:
+    register_codec(Codec("bz2", ".bz2", lambda file: bz2.BZ2File(file, mode="rb")))
+
+if lzma is not None:
+    register_codec(Codec("xz", ".xz", lambda file: lzma.LZMAFile(file, mode="rb")))
+    register_codec(Codec("lzma", ".lzma", lambda file: lzma.LZMAFile(file, mode="rb")))
+
+if zstd is not None:
+    register_codec(Codec("zstd", ".zst", lambda file: zstd.ZstdFile(file, mode="rb")))
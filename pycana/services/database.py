@@ -1,35 +1,155 @@
 """
 Functions providing access to the database.
 """
+# pylint: disable=too-many-lines
+import hashlib
+import html
 import os
+import shutil
 import sqlite3
+import tempfile
+from contextlib import closing
+from dataclasses import dataclass, replace
 from pathlib import Path
-from typing import Final, Dict, List, Any, Optional
+from typing import Final, Dict, List, Any, Optional, Iterable, Iterator, Tuple, Callable, Union
 
 from rich.console import Console
 
 from pycana.models import Spell, SpellCriteria, Caster
+from pycana.services.compression import open_binary, open_gzip_binary
+from pycana.services.description_storage import (
+    PLAIN,
+    ZDICT,
+    COMPRESSED_TYPE,
+    DESCRIPTION_STORAGES,
+    compress_description,
+    description_text,
+    register_dictionary,
+    train_dictionary,
+)
+from pycana.services.fuzzy import fuzzy_key, trigrams, similarity
+from pycana.services.query_metrics import MeteredConnection, QueryMetrics
+from pycana.services.related import nearest_neighbours
 
 # noinspection SqlNoDataSourceInspection
 _CREATE_SQL: Final[
     str
 ] = """
+    -- the text columns compare ignoring case, so that the criteria need no LOWER() calls, and can use the indexes
     CREATE TABLE IF NOT EXISTS spells (
-        book TEXT not null,
-        name TEXT not null, 
+        book TEXT NOT NULL COLLATE NOCASE,
+        name TEXT NOT NULL COLLATE NOCASE,
         level INTEGER not null,
-        school TEXT not null,
+        school TEXT NOT NULL COLLATE NOCASE,
         ritual INTEGER not null default 0,
         guild INTEGER NOT NULL DEFAULT 0,
-        category TEXT,
-        range TEXT NOT NULL,
-        duration TEXT NOT NULL,
-        casting_time TEXT NOT NULL,
-        description TEXT NOT NULL,
-        casters TEXT NOT NULL,
+        category TEXT COLLATE NOCASE,
+        range TEXT NOT NULL COLLATE NOCASE,
+        duration TEXT NOT NULL COLLATE NOCASE,
+        casting_time TEXT NOT NULL COLLATE NOCASE,
+        casters TEXT NOT NULL COLLATE NOCASE,
         components TEXT NOT NULL,
+        -- precomputed at install time, so that finding and displaying spells does no per-row text work
+        search_key TEXT NOT NULL COLLATE NOCASE,
+        casters_display TEXT NOT NULL,
+        components_display TEXT NOT NULL,
+        content_hash BLOB NOT NULL,
         PRIMARY KEY (book, name)
-    )
+    );
+
+    -- covers all the short columns, in listing order, so table views never read the descriptions
+    CREATE INDEX IF NOT EXISTS spells_listing ON spells (
+        level, name, book, school, ritual, guild, category, range, duration, casting_time, casters, components,
+        casters_display, components_display, search_key
+    );
+
+    -- used by the (exact) school criteria, the (start-anchored) name criteria, and the description criteria
+    CREATE INDEX IF NOT EXISTS spells_school ON spells (school);
+    CREATE INDEX IF NOT EXISTS spells_search_key ON spells (search_key);
+    CREATE INDEX IF NOT EXISTS spells_content ON spells (content_hash);
+
+    CREATE VIEW IF NOT EXISTS full_spells AS
+        SELECT
+            book, name, level, school, ritual, guild, category, range, duration, casting_time,
+            description, casters, components, casters_display, components_display, search_key, content_hash
+        FROM spells JOIN spell_content USING (content_hash);
+
+    -- how the database was built (e.g. how the descriptions are stored)
+    CREATE TABLE IF NOT EXISTS db_meta (
+        key TEXT NOT NULL PRIMARY KEY,
+        value
+    );
+
+    CREATE TABLE IF NOT EXISTS spell_trigrams (
+        trigram TEXT NOT NULL,
+        field TEXT NOT NULL,
+        book TEXT NOT NULL COLLATE NOCASE,
+        name TEXT NOT NULL COLLATE NOCASE,
+        PRIMARY KEY (trigram, field, book, name)
+    ) WITHOUT ROWID;
+
+    -- the spells most similar to each spell (by their descriptions), computed at install time
+    CREATE TABLE IF NOT EXISTS related_spells (
+        book TEXT NOT NULL COLLATE NOCASE,
+        name TEXT NOT NULL COLLATE NOCASE,
+        rank INTEGER NOT NULL,
+        related_book TEXT NOT NULL COLLATE NOCASE,
+        related_name TEXT NOT NULL COLLATE NOCASE,
+        score REAL NOT NULL,
+        PRIMARY KEY (book, name, rank)
+    ) WITHOUT ROWID;
+    """
+
+# the (long) descriptions are kept apart, and only read when they are needed - they are addressed by the hash of their
+# content, so that a description re-published in several books is stored once. The description criteria search the
+# spell_text view.
+# noinspection SqlNoDataSourceInspection
+_CREATE_PLAIN_CONTENT_SQL: Final[
+    str
+] = """
+    CREATE TABLE IF NOT EXISTS spell_content (
+        content_hash BLOB NOT NULL PRIMARY KEY,
+        description TEXT NOT NULL COLLATE NOCASE
+    );
+
+    CREATE VIEW IF NOT EXISTS spell_text AS SELECT content_hash, description FROM spell_content;
+    """
+
+# the compressed descriptions are searched through a trigram index of their text - its content is only decompressed
+# (by the description_text function) to confirm the candidate matches of the index
+# noinspection SqlNoDataSourceInspection
+_CREATE_COMPRESSED_CONTENT_SQL: Final[
+    str
+] = f"""
+    CREATE TABLE IF NOT EXISTS spell_content (
+        content_hash BLOB NOT NULL PRIMARY KEY,
+        description {COMPRESSED_TYPE} NOT NULL
+    );
+
+    CREATE VIEW IF NOT EXISTS spell_plain_text AS
+        SELECT rowid AS content_id, description_text(description) AS description FROM spell_content;
+
+    CREATE VIRTUAL TABLE IF NOT EXISTS spell_search USING fts5 (
+        description, content = 'spell_plain_text', content_rowid = 'content_id', tokenize = 'trigram'
+    );
+
+    CREATE VIEW IF NOT EXISTS spell_text AS
+        SELECT content_hash, spell_search.description
+        FROM spell_search JOIN spell_content ON spell_content.rowid = spell_search.rowid;
+    """
+
+# without the trigram tokenizer (SQLite before 3.34, or built without FTS5), the compressed descriptions are scanned
+# noinspection SqlNoDataSourceInspection
+_CREATE_COMPRESSED_UNINDEXED_CONTENT_SQL: Final[
+    str
+] = f"""
+    CREATE TABLE IF NOT EXISTS spell_content (
+        content_hash BLOB NOT NULL PRIMARY KEY,
+        description {COMPRESSED_TYPE} NOT NULL
+    );
+
+    CREATE VIEW IF NOT EXISTS spell_text AS
+        SELECT content_hash, description_text(description) AS description FROM spell_content;
     """
 
 # noinspection SqlNoDataSourceInspection
@@ -38,24 +158,113 @@ _SAVE_SQL: Final[
 ] = """
     INSERT INTO spells
         (
-            book, name, level, school, ritual, guild, category, range, duration, 
-            casting_time, description, casters, components
+            book, name, level, school, ritual, guild, category, range, duration,
+            casting_time, casters, components, search_key, casters_display, components_display, content_hash
         )
-    VALUES 
-        (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    VALUES
+        (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
 """
 
 # noinspection SqlNoDataSourceInspection
-_CLEAR_SQL: Final[str] = "DELETE FROM spells"
+_SAVE_CONTENT_SQL: Final[str] = "INSERT OR IGNORE INTO spell_content (content_hash, description) VALUES (?, ?)"
+
+# noinspection SqlNoDataSourceInspection
+_SAVE_SEARCH_SQL: Final[str] = "INSERT INTO spell_search (rowid, description) VALUES (?, ?)"
+
+# noinspection SqlNoDataSourceInspection
+_SAVE_META_SQL: Final[str] = "INSERT OR REPLACE INTO db_meta (key, value) VALUES (?, ?)"
+
+# noinspection SqlNoDataSourceInspection
+_FIND_META_SQL: Final[str] = "SELECT key, value FROM {}.db_meta"
+
+# noinspection SqlNoDataSourceInspection
+_CLEAR_SEARCH_SQL: Final[str] = "INSERT INTO spell_search (spell_search) VALUES ('delete-all')"
+
+# the metadata keys: how the descriptions are stored, and the dictionary they were compressed with
+_STORAGE_KEY: Final[str] = "description_storage"
+
+_DICTIONARY_KEY: Final[str] = "description_dictionary"
+
+# noinspection SqlNoDataSourceInspection
+_SAVE_TRIGRAM_SQL: Final[str] = "INSERT INTO spell_trigrams (trigram, field, book, name) VALUES (?, ?, ?, ?)"
+
+# noinspection SqlNoDataSourceInspection
+_RELATED_SOURCE_SQL: Final[str] = "SELECT book, name, description FROM full_spells ORDER BY book, name"
 
 # noinspection SqlNoDataSourceInspection
-_FIND_SQL = """
-    SELECT
-        book, name, level, school, ritual, guild, category, range, duration, casting_time, 
-        description, casters, components
-    FROM spells
+_SAVE_RELATED_SQL: Final[
+    str
+] = "INSERT INTO related_spells (book, name, rank, related_book, related_name, score) VALUES (?, ?, ?, ?, ?, ?)"
+
+# noinspection SqlNoDataSourceInspection
+_FIND_RELATED_SQL: Final[
+    str
+] = "SELECT related_book, related_name FROM related_spells WHERE book = ? AND name = ? ORDER BY rank"
+
+# noinspection SqlNoDataSourceInspection
+_CLEAR_SQL: Final[str] = (
+    "DELETE FROM spells; DELETE FROM spell_content; DELETE FROM spell_trigrams; DELETE FROM related_spells; "
+    f"DELETE FROM db_meta WHERE key = '{_DICTIONARY_KEY}';"
+)
+
+# the size of the chunks copied when writing or restoring a snapshot
+_COPY_BUFFER_SIZE: Final[int] = 1024 * 1024
+
+# the fields of the spells indexed by trigram, for fuzzy searching
+_FUZZY_FIELDS: Final[List[str]] = ["name", "category"]
+
+# noinspection SqlNoDataSourceInspection
+_FUZZY_CANDIDATES_SQL: Final[
+    str
+] = """
+    SELECT book, name, count(*) AS shared FROM spell_trigrams
+    WHERE field = ? AND trigram IN ({}) {}
+    GROUP BY book, name
+    ORDER BY shared DESC
+    LIMIT ?
+"""
+
+# the minimum number of fuzzy candidates ranked (at least 5 times the limit)
+_FUZZY_MIN_CANDIDATES: Final[int] = 100
+
+# the minimum similarity score of a fuzzy match
+_FUZZY_THRESHOLD: Final[float] = 0.3
+
+# the columns of the spells, in the layout of `Spell.to_row()`
+_FIND_COLUMNS: Final[
+    str
+] = """
+    book, name, level, school, ritual, guild, category, range, duration, casting_time,
+    description, casters, components
 """
 
+# the columns used to build `Spell` objects - the row layout, followed by the precomputed display columns
+_SPELL_COLUMNS: Final[str] = f"{_FIND_COLUMNS}, casters_display, components_display"
+
+_SPELL_COLUMN_COUNT: Final[int] = 15
+
+# the columns of the spells without their descriptions (left empty), as used by the table views
+_LISTING_COLUMNS: Final[
+    str
+] = """
+    book, name, level, school, ritual, guild, category, range, duration, casting_time,
+    '' AS description, casters, components, casters_display, components_display
+"""
+
+# noinspection SqlNoDataSourceInspection
+_FACETS_SQL: Final[
+    str
+] = "SELECT book, level, school, casters, count(*) FROM spells {} GROUP BY book, level, school, casters"
+
+# noinspection SqlNoDataSourceInspection
+_FIND_DESCRIPTION_SQL: Final[str] = "SELECT description FROM full_spells WHERE book = ? AND name = ?"
+
+# the number of searches combined into a single grouped scan by find_spells_many
+_BATCH_SCAN_SIZE: Final[int] = 32
+
+# the maximum number of databases attached to the main database for a federated search (the SQLite default)
+_MAX_ATTACHED: Final[int] = 10
+
 # noinspection SqlNoDataSourceInspection
 _INFO_TOTAL: Final[str] = "select count(*) from spells"
 
@@ -69,7 +278,212 @@ _INFO_LEVELS: Final[str] = "select level,count(*) from spells group by level"
 _INFO_SCHOOLS: Final[str] = "select school, count(*) from spells group by school"
 
 # noinspection SqlNoDataSourceInspection
-_INFO_CASTERS: Final[str] = "select count(*) from spells where lower(casters) like"
+_INFO_CASTERS: Final[str] = "select count(*) from spells where casters like"
+
+
+@dataclass(frozen=True)
+class ConnectionSettings:
+    """
+    Settings used when opening database connections.
+
+    Attributes:
+        read_only: opens the database with a `mode=ro` URI, so the connection can never write or create the file.
+        immutable: opens the database with `immutable=1`, skipping all locking and change detection - only safe for
+            database files that are never modified while in use (implies read-only).
+        mmap_size: the maximum number of bytes of the database file to memory-map (the SQLite default if `None`).
+        cache_size: the page cache size - pages if positive, KiB if negative (the SQLite default if `None`).
+        metrics: the recorder of the statements executed on the connections (none are recorded if `None`) - see
+            `pycana.services.query_metrics`.
+    """
+
+    read_only: bool = False
+    immutable: bool = False
+    mmap_size: Optional[int] = None
+    cache_size: Optional[int] = None
+    metrics: Optional[QueryMetrics] = None
+
+
+_READ_ONLY: Final[ConnectionSettings] = ConnectionSettings(read_only=True)
+
+
+@dataclass(frozen=True)
+class LoadStats:
+    """
+    Statistics about the spells stored in the database.
+
+    Attributes:
+        stored: the number of spells stored.
+        duplicates: the number of spells whose description was already stored (e.g. for the same spell re-published
+            in another book) - each distinct description is stored once, and shared by all of its spells.
+        text_size: the size (in bytes) of the distinct descriptions stored.
+        stored_size: the size (in bytes) the distinct descriptions take in the database (smaller than their text when
+            they are compressed).
+    """
+
+    stored: int = 0
+    duplicates: int = 0
+    text_size: int = 0
+    stored_size: int = 0
+
+
+def connect(
+    db_path: str,
+    settings: Optional[ConnectionSettings] = None,
+    check_same_thread: bool = True,
+) -> sqlite3.Connection:
+    """
+    Opens a connection to the database with the given settings. The caller is responsible for closing it.
+
+    Compressed descriptions are read as `CompressedText` values, which are only decompressed when used.
+
+    Args:
+        db_path: the path to the database file.
+        settings: the connection settings (a default read-write connection if `None`).
+        check_same_thread: whether the connection may only be used by the thread which opened it - disabled for
+            connections shared by the threads of a pool (which must not use them concurrently).
+
+    Returns: The open database connection.
+    """
+    metrics = settings.metrics if settings is not None else None
+
+    if settings is not None and (settings.read_only or settings.immutable):
+        conn = _sqlite_connect(_read_only_uri(db_path, settings), check_same_thread, metrics, uri=True)
+    else:
+        conn = _sqlite_connect(db_path, check_same_thread, metrics)
+
+    _configure(conn)
+
+    if settings is not None:
+        if settings.mmap_size is not None:
+            conn.execute(f"PRAGMA mmap_size = {int(settings.mmap_size)}")
+        if settings.cache_size is not None:
+            conn.execute(f"PRAGMA cache_size = {int(settings.cache_size)}")
+
+    return conn
+
+
+def copy_to_memory(
+    source: sqlite3.Connection, check_same_thread: bool = True, metrics: Optional[QueryMetrics] = None
+) -> sqlite3.Connection:
+    """
+    Copies an open database into a new in-memory database, with the SQLite backup API. The copy is configured like the
+    connections opened by `connect`. The caller is responsible for closing it.
+
+    Args:
+        source: the connection to the database to be copied.
+        check_same_thread: whether the in-memory connection may only be used by the thread which opened it.
+        metrics: the recorder of the statements executed on the in-memory connection (none are recorded if `None`).
+
+    Returns: The connection to the in-memory copy.
+    """
+    memory = _sqlite_connect(":memory:", check_same_thread, metrics)
+    try:
+        source.backup(memory)
+    except BaseException:
+        memory.close()
+        raise
+
+    _configure(memory)
+    return memory
+
+
+def _sqlite_connect(
+    database: str, check_same_thread: bool, metrics: Optional[QueryMetrics], uri: bool = False
+) -> sqlite3.Connection:
+    if metrics is None:
+        return sqlite3.connect(
+            database, uri=uri, check_same_thread=check_same_thread, detect_types=sqlite3.PARSE_DECLTYPES
+        )
+
+    conn = sqlite3.connect(
+        database,
+        uri=uri,
+        check_same_thread=check_same_thread,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        factory=MeteredConnection,
+    )
+    conn.metrics = metrics  # type: ignore[attr-defined]
+    return conn
+
+
+def _configure(conn: sqlite3.Connection) -> None:
+    conn.create_function("description_text", 1, description_text, deterministic=True)
+    _register_dictionary(conn, "main")
+
+
+def _read_meta(conn: sqlite3.Connection, schema: str) -> Dict[str, Any]:
+    try:
+        return dict(conn.execute(_FIND_META_SQL.format(schema)).fetchall())
+    except sqlite3.OperationalError:
+        # a database not created yet
+        return {}
+
+
+def _register_dictionary(conn: sqlite3.Connection, schema: str) -> None:
+    dictionary = _read_meta(conn, schema).get(_DICTIONARY_KEY)
+    if dictionary:
+        register_dictionary(dictionary)
+
+
+def _read_only_uri(db_path: str, settings: ConnectionSettings) -> str:
+    return f"{Path(db_path).absolute().as_uri()}?mode=ro{'&immutable=1' if settings.immutable else ''}"
+
+
+def connect_all(
+    db_paths: List[str], settings: Optional[ConnectionSettings] = None
+) -> Tuple[sqlite3.Connection, List[str]]:
+    """
+    Opens a connection to the first of the databases, and attaches the others to it, so that they can be queried
+    together. The caller is responsible for closing the connection.
+
+    Args:
+        db_paths: the paths to the database files (at least one).
+        settings: the connection settings, applied to all the databases (a default read-write connection if `None`).
+
+    Returns: The open connection, and the schema names of the databases (in the order of their paths).
+
+    Raises:
+        ValueError: if no paths, or more paths than can be attached are given.
+    """
+    if not db_paths or len(db_paths) > _MAX_ATTACHED + 1:
+        raise ValueError(f"Between 1 and {_MAX_ATTACHED + 1} database files may be searched together.")
+
+    conn = connect(db_paths[0], settings)
+    schemas = ["main"]
+
+    try:
+        for idx, db_path in enumerate(db_paths[1:], start=1):
+            # the attached databases are opened the same way as the main database
+            if settings is not None and (settings.read_only or settings.immutable):
+                conn.execute(f"ATTACH DATABASE ? AS db{idx}", (_read_only_uri(db_path, settings),))
+            else:
+                conn.execute(f"ATTACH DATABASE ? AS db{idx}", (db_path,))
+            _register_dictionary(conn, f"db{idx}")
+            schemas.append(f"db{idx}")
+
+        # the description criteria search all the databases - the descriptions are addressed by their content, so a
+        # match in any database is a match for every spell having the same content hash
+        conn.execute(
+            "CREATE TEMP VIEW spell_text AS "
+            f"{' UNION ALL '.join(f'SELECT content_hash, description FROM {schema}.spell_text' for schema in schemas)}"
+        )
+    except BaseException:
+        conn.close()
+        raise
+
+    return conn, schemas
+
+
+def resolve_db_paths(specified_paths: Iterable[str]) -> List[str]:
+    """
+    Used to resolve the paths to multiple database files (see `resolve_db_path`).
+
+    Args:
+        specified_paths: the specified paths to the database files - the default database is used if there are none.
+
+    Returns: The list of the resolved database file paths.
+    """
+    return [resolve_db_path(path) for path in specified_paths] or [resolve_db_path(None)]
 
 
 def resolve_db_path(specified_path: Optional[str], fallback_directory: Optional[str] = os.path.expanduser("~")) -> str:
@@ -98,42 +512,342 @@ def resolve_db_path(specified_path: Optional[str], fallback_directory: Optional[
         return str(Path(pycana_dir, "pycana.db"))
 
 
-def create_db(db_path: str) -> None:
-    with sqlite3.connect(db_path) as conn:
+def create_db(db_path: str, description_storage: str = PLAIN) -> None:
+    """
+    Creates the database tables (if they do not exist).
+
+    Args:
+        db_path: the path to the database file.
+        description_storage: how the descriptions are stored (one of `DESCRIPTION_STORAGES`) - plain text, or
+            compressed (searched through a trigram text index, when SQLite provides one).
+    """
+    if description_storage not in DESCRIPTION_STORAGES:
+        raise ValueError(
+            f"The description storage ({description_storage}) must be one of {', '.join(DESCRIPTION_STORAGES)}."
+        )
+
+    with closing(connect(db_path)) as conn:
         cursor = conn.cursor()
-        cursor.execute(_CREATE_SQL)
+        cursor.executescript(_CREATE_SQL)
+
+        if description_storage == PLAIN:
+            cursor.executescript(_CREATE_PLAIN_CONTENT_SQL)
+        elif _has_trigram_search(conn):
+            cursor.executescript(_CREATE_COMPRESSED_CONTENT_SQL)
+        else:
+            cursor.executescript(_CREATE_COMPRESSED_UNINDEXED_CONTENT_SQL)
+
+        cursor.execute(_SAVE_META_SQL, (_STORAGE_KEY, description_storage))
         cursor.close()
         conn.commit()
 
 
-def load_db(console: Console, db_path: str, spells: List[Spell], verbose: bool = False) -> None:
+def _has_trigram_search(conn: sqlite3.Connection) -> bool:
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.trigram_probe USING fts5 (text, tokenize = 'trigram')")
+        conn.execute("DROP TABLE temp.trigram_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+# pylint: disable=too-many-locals
+def load_db(
+    console: Console, db_path: str, spells: List[Spell], verbose: bool = False, related: bool = True
+) -> LoadStats:
+    """
+    Stores the spells in the database (in addition to the spells already stored).
+
+    Args:
+        console: the output console.
+        db_path: the path to the database file.
+        spells: the spells to be stored.
+        verbose: whether more detailed output should be written to the console.
+        related: whether the related spells of each spell are computed again (see `find_related`) - all the spells of
+            the database are compared by their descriptions, which dominates the load time of large databases
+            (especially without NumPy, where the comparison is quadratic in the spells sharing words). When skipped,
+            the related spells stored before are kept.
+
+    Returns: The statistics of the stored spells.
+    """
     stored_count = 0
+    duplicate_count = 0
+    text_size = 0
+    stored_size = 0
 
     if verbose:
         console.print(f"Loading {len(spells)} spells...", style="yellow")
 
-    with sqlite3.connect(db_path) as conn:
+    with closing(connect(db_path)) as conn:
         cursor = conn.cursor()
+        encode = _description_encoder(conn, spells)
+        searched = _has_search_index(conn)
+
+        for spell in map(_stored_spell, spells):
+            content_hash = hashlib.sha256(spell.description.encode("utf-8")).digest()
+            _save_spell(cursor, spell, content_hash)
 
-        for spell in spells:
-            cursor.execute(_SAVE_SQL, spell.to_row())
+            size = _save_content(cursor, content_hash, spell.description, encode, searched)
+            if size:
+                text_size += len(spell.description.encode("utf-8"))
+                stored_size += size
+            else:
+                duplicate_count += 1
 
             if verbose:
-                console.print(f"\u2714 Stored: {spell}", style="green i")
+                console.print(f"\u2714 Stored: {spell}{'' if size else ' (shared description)'}", style="green i")
 
             stored_count += 1
 
+        if related:
+            _save_related(cursor)
         cursor.close()
         conn.commit()
 
         if verbose:
-            console.print(f"Stored all {stored_count} spells.", style="blue b")
+            console.print(
+                f"Stored all {stored_count} spells{' (and the related spells of each)' if related else ''}.",
+                style="blue b",
+            )
+
+    return LoadStats(stored=stored_count, duplicates=duplicate_count, text_size=text_size, stored_size=stored_size)
+
+
+def _save_spell(cursor: sqlite3.Cursor, spell: Spell, content_hash: bytes) -> None:
+    row = spell.to_row()
+    cursor.execute(
+        _SAVE_SQL,
+        row[0:10]
+        + row[11:]
+        + (spell.name.casefold(), spell.display_casters(), spell.display_components(), content_hash),
+    )
+    cursor.executemany(_SAVE_TRIGRAM_SQL, _spell_trigrams(spell))
+
+
+def _save_content(
+    cursor: sqlite3.Cursor,
+    content_hash: bytes,
+    text: str,
+    encode: Callable[[str], Union[str, bytes]],
+    searched: bool,
+) -> int:
+    # the content is only inserted if it was not already stored - returns its stored size (0 if it was not inserted)
+    stored = encode(text)
+    if cursor.execute(_SAVE_CONTENT_SQL, (content_hash, stored)).rowcount == 0:
+        return 0
+
+    if searched:
+        cursor.execute(_SAVE_SEARCH_SQL, (cursor.lastrowid, text))
+
+    return len(stored.encode("utf-8") if isinstance(stored, str) else stored)
+
+
+def _save_related(cursor: sqlite3.Cursor) -> None:
+    # all the spells of the database are related again, as the spells loaded before are related to the new ones
+    rows = [(book, name, str(description)) for book, name, description in cursor.execute(_RELATED_SOURCE_SQL)]
+    neighbours = nearest_neighbours(
+        [f"{name} {description}" for _, name, description in rows], [name.lower() for _, name, _ in rows]
+    )
+
+    cursor.execute("DELETE FROM related_spells")
+    cursor.executemany(
+        _SAVE_RELATED_SQL,
+        (
+            (book, name, rank, rows[other][0], rows[other][1], score)
+            for (book, name, _), related in zip(rows, neighbours)
+            for rank, (other, score) in enumerate(related, start=1)
+        ),
+    )
+
+
+def _description_encoder(conn: sqlite3.Connection, spells: List[Spell]) -> Callable[[str], Union[str, bytes]]:
+    # how the descriptions are stored was chosen when the database was created
+    meta = _read_meta(conn, "main")
+    storage = meta.get(_STORAGE_KEY, PLAIN)
+
+    if storage == PLAIN:
+        return lambda text: text
+
+    dictionary = meta.get(_DICTIONARY_KEY) if storage == ZDICT else None
+    if storage == ZDICT and not dictionary:
+        # trained on the first spells loaded, and then shared by all the spells loaded later
+        dictionary = train_dictionary(spell.description for spell in spells)
+        conn.execute(_SAVE_META_SQL, (_DICTIONARY_KEY, dictionary))
+        register_dictionary(dictionary)
+
+    return lambda text: compress_description(text, dictionary)
+
+
+def _has_search_index(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT count(*) FROM sqlite_master WHERE name = 'spell_search'").fetchone()[0] > 0
+
+
+def rebuild_db(
+    console: Console,
+    db_path: str,
+    spells: List[Spell],
+    verbose: bool = False,
+    description_storage: str = PLAIN,
+    related: bool = True,
+) -> LoadStats:
+    """
+    Builds a fresh database containing the given spells in a temporary file beside the database file, and then
+    atomically renames it into place. Readers never see an empty or partially-loaded database: connections opened
+    before the swap keep serving the previous snapshot, while those opened afterwards see the new one.
+
+    Args:
+        console: the output console.
+        db_path: the path to the database file (it need not exist yet).
+        spells: the spells to be stored in the new database.
+        verbose: whether more detailed output should be written to the console.
+        description_storage: how the descriptions are stored (see `create_db`).
+        related: whether the related spells of each spell are computed (see `load_db`).
+
+    Returns: The statistics of the stored spells.
+    """
+    staging_path = _staging_file(db_path)
+    try:
+        create_db(staging_path, description_storage)
+        stats = load_db(console, staging_path, spells, verbose=verbose, related=related)
+        _swap_into_place(staging_path, db_path)
+        return stats
+    except BaseException:
+        Path(staging_path).unlink(missing_ok=True)
+        raise
+
+
+def _stored_spell(spell: Spell) -> Spell:
+    # the bundles may carry html-escaped text, which is unescaped once here rather than on every display
+    return replace(spell, book=html.unescape(spell.book), name=html.unescape(spell.name))
+
+
+def _swap_into_place(source_path: str, db_path: str) -> None:
+    # the rename is atomic on the same file system; syncing the directory makes it durable
+    os.replace(source_path, db_path)
+
+    if hasattr(os, "O_DIRECTORY"):
+        dir_handle = os.open(Path(db_path).absolute().parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_handle)
+        finally:
+            os.close(dir_handle)
+
+
+def _staging_file(path: str) -> str:
+    # an empty temporary file beside the given one (on the same file system, so that it can be renamed into place)
+    target_dir = Path(path).absolute().parent
+    target_dir.mkdir(parents=True, exist_ok=True)
+
+    handle, staging_path = tempfile.mkstemp(prefix=f".{Path(path).name}.", suffix=".staging", dir=target_dir)
+    os.close(handle)
+
+    # the temporary file is private by default, the file put in place should keep the usual permissions
+    try:
+        if Path(path).exists():
+            shutil.copymode(path, staging_path)
+        else:
+            os.chmod(staging_path, 0o644)
+    except BaseException:
+        Path(staging_path).unlink(missing_ok=True)
+        raise
+
+    return staging_path
+
+
+def snapshot_db(
+    db_path: str, snapshot_path: str, compression_level: int = 9, parallel_compression: bool = False
+) -> None:
+    """
+    Writes a compact copy of the database (with its indexes) to a snapshot file, which can later be restored in place
+    of a database with `restore_db` - much faster than reinstalling the spells. The copy is made with `VACUUM INTO`
+    (from a read-only connection, so the database can be in use), and then analyzed so that it also carries the query
+    planner statistics. The snapshot is only put in place once complete.
+
+    Args:
+        db_path: the path to the database file.
+        snapshot_path: the path to the snapshot file - it will be gzip compressed if the path ends with ".gz".
+        compression_level: the gzip compression level (1-9).
+        parallel_compression: whether the snapshot should be compressed in parallel blocks on multiple threads.
+    """
+    compressed = snapshot_path.lower().endswith(".gz")
+    copy_path = _staging_file(snapshot_path)
+    try:
+        with closing(connect(db_path, _READ_ONLY)) as conn:
+            conn.execute("VACUUM INTO ?", (copy_path,))
+
+        with closing(connect(copy_path)) as conn:
+            conn.execute("ANALYZE")
+            conn.commit()
+
+        if compressed:
+            staging_path = _staging_file(snapshot_path)
+            try:
+                with open(copy_path, "rb") as source, open_gzip_binary(
+                    staging_path, level=compression_level, parallel=parallel_compression
+                ) as target:
+                    shutil.copyfileobj(source, target, _COPY_BUFFER_SIZE)
+                os.replace(staging_path, snapshot_path)
+            except BaseException:
+                Path(staging_path).unlink(missing_ok=True)
+                raise
+        else:
+            os.replace(copy_path, snapshot_path)
+    finally:
+        Path(copy_path).unlink(missing_ok=True)
+
+
+def restore_db(snapshot_path: str, db_path: str) -> None:
+    """
+    Restores a snapshot (see `snapshot_db`) in place of the database. The snapshot is decompressed (if its suffix
+    matches a registered codec) and checked in a temporary file beside the database file, and then atomically renamed
+    into place - like `rebuild_db`, readers never see a partially restored database.
+
+    Args:
+        snapshot_path: the path to the snapshot file.
+        db_path: the path to the database file (it need not exist yet).
+
+    Raises:
+        ValueError: if the snapshot is not a spell database (the database is then left untouched).
+    """
+    staging_path = _staging_file(db_path)
+    try:
+        with open_binary(snapshot_path) as source, open(staging_path, "wb") as target:
+            shutil.copyfileobj(source, target, _COPY_BUFFER_SIZE)
+            target.flush()
+            os.fsync(target.fileno())
+
+        try:
+            with closing(connect(staging_path, _READ_ONLY)) as conn:
+                problems = [row[0] for row in conn.execute("PRAGMA quick_check")]
+                if problems != ["ok"] or not _has_table(conn, "spells"):
+                    raise ValueError(f"{snapshot_path} is not a valid spell database snapshot.")
+        except sqlite3.DatabaseError as error:
+            raise ValueError(f"{snapshot_path} is not a valid spell database snapshot ({error}).") from error
+
+        _swap_into_place(staging_path, db_path)
+    except BaseException:
+        Path(staging_path).unlink(missing_ok=True)
+        raise
+
+
+def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+    return (
+        conn.execute("SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()[0] > 0
+    )
+
+
+def _spell_trigrams(spell: Spell) -> Iterator[Tuple[str, str, str, str]]:
+    for field in _FUZZY_FIELDS:
+        for trigram in trigrams(fuzzy_key(getattr(spell, field) or "")):
+            yield trigram, field, spell.book, spell.name
 
 
 def clear_db(db_path: str) -> None:
-    with sqlite3.connect(db_path) as conn:
+    with closing(connect(db_path)) as conn:
         cursor = conn.cursor()
-        cursor.execute(_CLEAR_SQL)
+        if _has_search_index(conn):
+            cursor.execute(_CLEAR_SEARCH_SQL)
+        cursor.executescript(_CLEAR_SQL)
         cursor.close()
         conn.commit()
 
@@ -143,21 +857,508 @@ def find_spells(
     criteria: Optional[SpellCriteria] = None,
     limit: Optional[int] = None,
     sort_by: Optional[str] = None,
+    settings: Optional[ConnectionSettings] = None,
+    with_description: bool = True,
 ) -> List[Spell]:
-    spells = []
+    """
+    Finds the spells matching the given criteria.
 
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            f"{_FIND_SQL} {_apply_where(criteria)} {_apply_order(sort_by)} {_apply_limit(limit)}",
+    Args:
+        db_path: the path to the database file.
+        criteria: the search criteria (all spells if `None`).
+        limit: the maximum number of spells returned (unlimited if `None`).
+        sort_by: the sort clause (e.g. "level desc").
+        settings: the connection settings (a read-only connection by default).
+        with_description: whether the descriptions are loaded - when `False` they are left empty, and the (separately
+            stored) descriptions are not read at all, unless the criteria filter on them.
+
+    Returns: The list of matching spells.
+    """
+    with closing(connect(db_path, settings or _READ_ONLY)) as conn:
+        return [Spell.from_row(row) for row in execute_find(conn, criteria, limit, sort_by, with_description)]
+
+
+def execute_find(
+    conn: sqlite3.Connection,
+    criteria: Optional[SpellCriteria] = None,
+    limit: Optional[int] = None,
+    sort_by: Optional[str] = None,
+    with_description: bool = True,
+    within: Optional[str] = None,
+) -> sqlite3.Cursor:
+    """
+    Executes the search for the spells matching the given criteria on an open connection (see `find_spells`).
+
+    Args:
+        conn: the open database connection.
+        criteria: the search criteria (all spells if `None`).
+        limit: the maximum number of spells returned (unlimited if `None`).
+        sort_by: the sort clause (e.g. "level desc").
+        with_description: whether the descriptions are loaded.
+        within: the name of a table of spell keys (book and name columns) - only the spells it lists are searched,
+            looked up by their key (all spells if `None`).
+
+    Returns: The cursor over the matching rows, each of which is read with `Spell.from_row`.
+    """
+    where = _apply_where(criteria)
+    if within:
+        keys = f"(book, name) IN (SELECT book, name FROM {within})"
+        where = f"{where} AND {keys}" if where else f"WHERE {keys}"
+
+    return conn.execute(f"{_find_sql(with_description)} {where} {_apply_order(sort_by)} {_apply_limit(limit)}")
+
+
+def find_description(db_path: str, book: str, name: str, settings: Optional[ConnectionSettings] = None) -> str:
+    """
+    Retrieves the description of a single spell, for spells found without their descriptions.
+
+    Args:
+        db_path: the path to the database file.
+        book: the book containing the spell.
+        name: the name of the spell.
+        settings: the connection settings (a read-only connection by default).
+
+    Returns: The description of the spell (empty if the spell does not exist).
+    """
+    with closing(connect(db_path, settings or _READ_ONLY)) as conn:
+        return query_description(conn, book, name)
+
+
+def query_description(conn: sqlite3.Connection, book: str, name: str) -> str:
+    """
+    Retrieves the description of a single spell on an open connection (see `find_description`).
+
+    Args:
+        conn: the open database connection.
+        book: the book containing the spell.
+        name: the name of the spell.
+
+    Returns: The description of the spell (empty if the spell does not exist).
+    """
+    row = conn.execute(_FIND_DESCRIPTION_SQL, (book, name)).fetchone()
+    return str(row[0]) if row else ""
+
+
+def find_related(
+    db_path: str, book: str, name: str, settings: Optional[ConnectionSettings] = None
+) -> List[Tuple[str, str]]:
+    """
+    Retrieves the spells related to a spell (those with the most similar descriptions), as computed at install time.
+
+    Args:
+        db_path: the path to the database file.
+        book: the book containing the spell.
+        name: the name of the spell.
+        settings: the connection settings (a read-only connection by default).
+
+    Returns: The books and names of the related spells, the most similar first (empty if the spell does not exist).
+    """
+    with closing(connect(db_path, settings or _READ_ONLY)) as conn:
+        return query_related(conn, book, name)
+
+
+def query_related(conn: sqlite3.Connection, book: str, name: str) -> List[Tuple[str, str]]:
+    """
+    Retrieves the spells related to a spell on an open connection (see `find_related`).
+
+    Args:
+        conn: the open database connection.
+        book: the book containing the spell.
+        name: the name of the spell.
+
+    Returns: The books and names of the related spells, the most similar first (empty if the spell does not exist).
+    """
+    try:
+        return [(row[0], row[1]) for row in conn.execute(_FIND_RELATED_SQL, (book, name))]
+    except sqlite3.OperationalError:
+        # a database installed before the related spells were computed
+        return []
+
+
+def _find_sql(with_description: bool, schema: Optional[str] = None) -> str:
+    prefix = f"{schema}." if schema else ""
+
+    if with_description:
+        return f"SELECT {_SPELL_COLUMNS} FROM {prefix}full_spells"
+    else:
+        # the description criteria search the descriptions apart, so they are never joined to the listing
+        return f"SELECT {_LISTING_COLUMNS} FROM {prefix}spells"
+
+
+def count_spells(
+    db_path: str,
+    criteria: Optional[SpellCriteria] = None,
+    settings: Optional[ConnectionSettings] = None,
+) -> int:
+    """
+    Counts the spells matching the given criteria, without loading them.
+
+    Args:
+        db_path: the path to the database file.
+        criteria: the search criteria (all spells if `None`).
+        settings: the connection settings (a read-only connection by default).
+
+    Returns: The number of matching spells.
+    """
+    with closing(connect(db_path, settings or _READ_ONLY)) as conn:
+        return query_count(conn, criteria)
+
+
+def query_count(conn: sqlite3.Connection, criteria: Optional[SpellCriteria] = None) -> int:
+    """
+    Counts the spells matching the given criteria on an open connection (see `count_spells`).
+
+    Args:
+        conn: the open database connection.
+        criteria: the search criteria (all spells if `None`).
+
+    Returns: The number of matching spells.
+    """
+    return conn.execute(f"SELECT count(*) FROM spells {_apply_where(criteria)}").fetchone()[0]
+
+
+def spell_facets(
+    db_path: str,
+    criteria: Optional[SpellCriteria] = None,
+    settings: Optional[ConnectionSettings] = None,
+) -> Dict[str, Dict[Any, int]]:
+    """
+    Breaks the spells matching the given criteria down by book, level, school and caster, without loading them.
+
+    The counts of all the facets are computed by a single grouped query (a single pass over the matching spells),
+    which is then folded into the facets.
+
+    Args:
+        db_path: the path to the database file.
+        criteria: the search criteria (all spells if `None`).
+        settings: the connection settings (a read-only connection by default).
+
+    Returns: The counts by facet value, in the same layout as `db_info`.
+    """
+    with closing(connect(db_path, settings or _READ_ONLY)) as conn:
+        return query_facets(conn, criteria)
+
+
+def query_facets(conn: sqlite3.Connection, criteria: Optional[SpellCriteria] = None) -> Dict[str, Dict[Any, int]]:
+    """
+    Breaks the spells matching the given criteria down on an open connection (see `spell_facets`).
+
+    Args:
+        conn: the open database connection.
+        criteria: the search criteria (all spells if `None`).
+
+    Returns: The counts by facet value, in the same layout as `db_info`.
+    """
+    facets: Dict[str, Dict[Any, int]] = {"meta": {"total": 0}, "books": {}, "levels": {}, "schools": {}, "casters": {}}
+
+    for book, level, school, casters, count in conn.execute(_FACETS_SQL.format(_apply_where(criteria))):
+        facets["meta"]["total"] += count
+        facets["books"][book] = facets["books"].get(book, 0) + count
+        facets["levels"][level] = facets["levels"].get(level, 0) + count
+        facets["schools"][school] = facets["schools"].get(school, 0) + count
+        for caster in casters.split(","):
+            facets["casters"][caster] = facets["casters"].get(caster, 0) + count
+
+    return {group: dict(sorted(counts.items())) for group, counts in facets.items()}
+
+
+def find_spells_across(
+    db_paths: List[str],
+    criteria: Optional[SpellCriteria] = None,
+    limit: Optional[int] = None,
+    sort_by: Optional[str] = None,
+    settings: Optional[ConnectionSettings] = None,
+    with_description: bool = True,
+) -> List[Spell]:
+    """
+    Finds the spells matching the given criteria in multiple databases, which are attached to a single connection.
+
+    The criteria, sorting and limit are pushed down to the query of each database, and their (sorted) results are
+    combined by a `UNION ALL` ordered by the same terms, which SQLite evaluates as a k-way merge - so at most `limit`
+    rows are read from each database, and the merge stops once `limit` rows have been produced.
+
+    Args:
+        db_paths: the paths to the database files.
+        criteria: the search criteria (all spells if `None`).
+        limit: the maximum number of spells returned (unlimited if `None`).
+        sort_by: the sort clause (e.g. "level desc") - its terms must be columns or expressions of the spell columns.
+        settings: the connection settings (read-only connections by default).
+        with_description: whether the descriptions are loaded.
+
+    Returns: The list of matching spells, from all the databases.
+    """
+    if len(db_paths) == 1:
+        return find_spells(db_paths[0], criteria, limit, sort_by, settings, with_description)
+
+    conn, schemas = connect_all(db_paths, settings or _READ_ONLY)
+    with closing(conn):
+        terms = _sort_terms(sort_by)
+        sort_columns = "".join(f", {term} AS _sort{idx}" for idx, (term, _) in enumerate(terms))
+        order = ", ".join(f"_sort{idx}{' DESC' if desc else ''}" for idx, (_, desc) in enumerate(terms))
+
+        # each database is filtered, sorted and limited on its own - the outer ordering merges them
+        arms = [
+            f"SELECT *{sort_columns} FROM ({_find_sql(with_description, schema)} {_apply_where(criteria)} "
+            f"{_apply_order(sort_by) if limit else ''} {_apply_limit(limit)})"
+            for schema in schemas
+        ]
+
+        cursor = conn.execute(f"{' UNION ALL '.join(arms)} {_apply_order(order)} {_apply_limit(limit)}")
+        return [Spell.from_row(row) for row in cursor]
+
+
+def _sort_terms(sort_by: Optional[str]) -> List[Tuple[str, bool]]:
+    # splits the sort clause into its terms, and whether each is descending
+    terms = []
+    for term in (sort_by or "").split(","):
+        words = term.strip().rsplit(None, 1)
+        if len(words) == 2 and words[1].lower() in ("asc", "desc"):
+            terms.append((words[0], words[1].lower() == "desc"))
+        elif term.strip():
+            terms.append((term.strip(), False))
+    return terms
+
+
+def iter_spell_rows(
+    db_path: str,
+    criteria: Optional[SpellCriteria] = None,
+    limit: Optional[int] = None,
+    sort_by: Optional[str] = None,
+    settings: Optional[ConnectionSettings] = None,
+) -> Iterator[Tuple]:
+    """
+    Streams the raw rows of the spells matching the given criteria straight from the database cursor, without
+    building `Spell` objects - the rows have the same layout as `Spell.to_row()` (with the descriptions decompressed).
+
+    Args:
+        db_path: the path to the database file.
+        criteria: the search criteria (all spells if `None`).
+        limit: the maximum number of rows returned (unlimited if `None`).
+        sort_by: the sort clause (e.g. "level desc").
+        settings: the connection settings (a read-only connection by default).
+
+    Returns: An iterator over the matching rows.
+    """
+    with closing(connect(db_path, settings or _READ_ONLY)) as conn:
+        cursor = conn.execute(
+            f"SELECT {_FIND_COLUMNS} FROM full_spells {_apply_where(criteria)} {_apply_order(sort_by)} "
+            f"{_apply_limit(limit)}",
         )
-        results = cursor.fetchall()
-        for row in results:
-            spells.append(Spell.from_row(row))
-        cursor.close()
-        conn.commit()
+        cursor.arraysize = 256
+
+        while rows := cursor.fetchmany():
+            for row in rows:
+                yield row if isinstance(row[10], str) else row[:10] + (str(row[10]),) + row[11:]
+
+
+def find_spells_fuzzy(
+    db_path: str,
+    text: str,
+    criteria: Optional[SpellCriteria] = None,
+    limit: Optional[int] = None,
+    field: str = "name",
+    settings: Optional[ConnectionSettings] = None,
+    with_description: bool = True,
+) -> List[Spell]:
+    """
+    Finds the spells whose name (or category) is similar to the given text, tolerating typos, spacing and case
+    differences ("fireball" finds "Fire Ball"). The candidates are selected by the trigram index built when the spells
+    were loaded, and are then ranked by their trigram similarity and edit distance.
+
+    Args:
+        db_path: the path to the database file.
+        text: the text to be matched.
+        criteria: additional criteria the spells must match.
+        limit: the maximum number of spells returned (unlimited if `None`).
+        field: the indexed field to be matched ("name" or "category").
+        settings: the connection settings (a read-only connection by default).
+        with_description: whether the descriptions are loaded (see `find_spells`).
+
+    Returns: The matching spells, most similar first.
+    """
+    if field not in _FUZZY_FIELDS:
+        raise ValueError(f"The field ({field}) is not fuzzy-searchable - must be one of {', '.join(_FUZZY_FIELDS)}.")
+
+    query_key = fuzzy_key(text)
+    query_trigrams = sorted(trigrams(query_key))
+    if not query_trigrams:
+        return []
+
+    # the criteria filter the candidates before they are cut, so that no matching spell is cut in favor of others
+    predicate = criteria.predicate() if criteria else ""
+    criteria_filter = f"AND (book, name) IN (SELECT book, name FROM spells WHERE {predicate})" if predicate else ""
+
+    with closing(connect(db_path, settings or _READ_ONLY)) as conn:
+        candidates = conn.execute(
+            _FUZZY_CANDIDATES_SQL.format(", ".join("?" * len(query_trigrams)), criteria_filter),
+            (field, *query_trigrams, max((limit or 0) * 5, _FUZZY_MIN_CANDIDATES)),
+        ).fetchall()
+
+        spells = {
+            (spell.book, spell.name): spell for spell in _find_by_keys(conn, candidates, criteria, with_description)
+        }
+
+    return _rank_fuzzy(query_key, field, candidates, spells)[: limit or None]
+
+
+def _rank_fuzzy(query_key: str, field: str, candidates: List[Tuple], spells: Dict[Tuple, Spell]) -> List[Spell]:
+    ranked = []
+    for book, name, shared in candidates:
+        spell = spells.get((book, name))
+        if spell is not None:
+            score = similarity(query_key, fuzzy_key(getattr(spell, field) or ""), shared)
+            if score >= _FUZZY_THRESHOLD:
+                ranked.append((score, spell))
+
+    ranked.sort(key=lambda scored: (-scored[0], scored[1].name, scored[1].book))
+
+    return [spell for _, spell in ranked]
 
-    return spells
+
+def _find_by_keys(
+    conn: sqlite3.Connection,
+    keys: List[Tuple],
+    criteria: Optional[SpellCriteria],
+    with_description: bool,
+) -> List[Spell]:
+    if not keys:
+        return []
+
+    predicate = criteria.predicate() if criteria else ""
+    key_values = ", ".join("(?, ?)" for _ in keys)
+    cursor = conn.execute(
+        f"{_find_sql(with_description)} WHERE (book, name) IN (VALUES {key_values}) "
+        f"{f'AND ({predicate})' if predicate else ''}",
+        [value for key in keys for value in key[0:2]],
+    )
+
+    return [Spell.from_row(row) for row in cursor]
+
+
+def find_spells_many(
+    db_path: str,
+    criteria_list: Iterable[Optional[SpellCriteria]],
+    limit: Optional[int] = None,
+    sort_by: Optional[str] = None,
+    settings: Optional[ConnectionSettings] = None,
+) -> Iterator[List[Spell]]:
+    """
+    Finds the spells matching each of the given criteria, over a single connection. The searches are run in groups,
+    each group answered by one scan of the spells table: every row matching any search in the group is read once,
+    and then distributed to each search it matches. Searches with identical criteria share their evaluation.
+
+    Args:
+        db_path: the path to the database file.
+        criteria_list: the search criteria (`None` matches all spells).
+        limit: the maximum number of spells returned for each search (unlimited if `None`).
+        sort_by: the sort clause (e.g. "level desc") applied to every search.
+        settings: the connection settings (a read-only connection by default).
+
+    Returns: An iterator over the matching spells of each search, in the order of the criteria - the results of each
+    group are yielded as soon as its scan completes.
+    """
+    limit = limit if limit else None
+
+    with closing(connect(db_path, settings or _READ_ONLY)) as conn:
+        group: List[Optional[SpellCriteria]] = []
+        for criteria in criteria_list:
+            group.append(criteria)
+            if len(group) == _BATCH_SCAN_SIZE:
+                yield from _find_grouped(conn, group, limit, sort_by)
+                group = []
+
+        if group:
+            yield from _find_grouped(conn, group, limit, sort_by)
+
+
+def _find_grouped(
+    conn: sqlite3.Connection,
+    group: List[Optional[SpellCriteria]],
+    limit: Optional[int],
+    sort_by: Optional[str],
+) -> List[List[Spell]]:
+    predicates, slots = _distinct_predicates(group)
+
+    matches = ", ".join(f"({predicate})" for predicate in predicates)
+    where = "" if "1" in predicates else f"WHERE {' OR '.join(f'({predicate})' for predicate in predicates)}"
+
+    results: List[List[Spell]] = [[] for _ in predicates]
+    open_count = len(predicates)
+
+    for row in conn.execute(f"SELECT {_SPELL_COLUMNS}, {matches} FROM full_spells {where} {_apply_order(sort_by)}"):
+        spell: Optional[Spell] = None
+
+        for idx, matched in enumerate(row[_SPELL_COLUMN_COUNT:]):
+            if matched and (limit is None or len(results[idx]) < limit):
+                spell = spell if spell else Spell.from_row(row)
+                results[idx].append(spell)
+
+                if limit is not None and len(results[idx]) == limit:
+                    open_count -= 1
+
+        if open_count == 0:
+            break
+
+    return [list(results[slot]) for slot in slots]
+
+
+def _distinct_predicates(group: List[Optional[SpellCriteria]]) -> Tuple[List[str], List[int]]:
+    # identical predicates are only evaluated once, an empty predicate matches everything
+    predicates: List[str] = []
+    slots: List[int] = []
+
+    for criteria in group:
+        predicate = (criteria.predicate() if criteria else "") or "1"
+        if predicate not in predicates:
+            predicates.append(predicate)
+        slots.append(predicates.index(predicate))
+
+    return predicates, slots
+
+
+def spell_listing(
+    db_path: str,
+    casters: Optional[List[Caster]] = None,
+    criteria: Optional[SpellCriteria] = None,
+    number: Optional[int] = None,
+    settings: Optional[ConnectionSettings] = None,
+    with_description: bool = False,
+) -> Dict[Caster, Dict[int, List[Spell]]]:
+    """
+    Builds the spell lists of each caster, by spell level, from a single scan of the spells ordered by level and
+    name - each spell is read once and added to the list of every (requested) caster who can cast it.
+
+    Args:
+        db_path: the path to the database file.
+        casters: the casters whose lists are built (all casters if `None`).
+        criteria: additional criteria the listed spells must match (e.g. level, school, or category).
+        number: the maximum number of spells in each caster/level list (unlimited if `None`).
+        settings: the connection settings (a read-only connection by default).
+        with_description: whether the descriptions are loaded (e.g. for exporting the lists) - the lists are otherwise
+            built from the covering listing index alone.
+
+    Returns: The spell lists by caster, and then by level - only the casters and levels having spells are present.
+    """
+    listed_casters = casters if casters else list(Caster)
+    caster_names = ", ".join(f"'{caster.name}'" for caster in listed_casters)
+
+    listing_criteria = replace(criteria) if criteria else SpellCriteria()
+    listing_criteria.caster = f"({caster_names},)"
+
+    listing: Dict[Caster, Dict[int, List[Spell]]] = {caster: {} for caster in listed_casters}
+
+    with closing(connect(db_path, settings or _READ_ONLY)) as conn:
+        sql = f"{_find_sql(with_description)} {listing_criteria.where()} order by level, name, book"
+        for row in conn.execute(sql):
+            spell = Spell.from_row(row)
+
+            for caster in spell.casters:
+                if caster in listing:
+                    cell = listing[caster].setdefault(spell.level, [])
+                    if number is None or len(cell) < number:
+                        cell.append(spell)
+
+    return {caster: levels for caster, levels in listing.items() if levels}
 
 
 def _apply_order(order_by: Optional[str] = None) -> str:
@@ -172,16 +1373,52 @@ def _apply_limit(limit: Optional[int] = None) -> str:
     return f"limit {limit}" if limit else ""
 
 
-def db_info(db_path: str) -> Dict[str, Dict[str, int]]:
+def db_info(db_path: str, settings: Optional[ConnectionSettings] = None) -> Dict[str, Dict[str, int]]:
     """
     Used to retrieve statistical information about the contents of the spell database.
 
     :param db_path: the path to the database file
+    :param settings: the connection settings (a read-only connection by default)
+    :return: a dictionary containing the statistical information (counts by type)
+    """
+    with closing(connect(db_path, settings or _READ_ONLY)) as conn:
+        return query_info(conn)
+
+
+def db_info_across(db_paths: List[str], settings: Optional[ConnectionSettings] = None) -> Dict[str, Dict[str, int]]:
+    """
+    Retrieves the statistical information about the combined contents of multiple databases (see `db_info`).
+
+    The databases are attached to a single connection, where a temporary view unions their spells, so the counts are
+    computed by the same queries as for a single database.
+
+    :param db_paths: the paths to the database files
+    :param settings: the connection settings (read-only connections by default)
+    :return: a dictionary containing the statistical information (counts by type)
+    """
+    if len(db_paths) == 1:
+        return db_info(db_paths[0], settings)
+
+    conn, schemas = connect_all(db_paths, settings or _READ_ONLY)
+    with closing(conn):
+        # the temporary view takes precedence over the spells table of the main database
+        conn.execute(
+            f"CREATE TEMP VIEW spells AS {' UNION ALL '.join(f'SELECT * FROM {schema}.spells' for schema in schemas)}"
+        )
+        return query_info(conn)
+
+
+def query_info(conn: sqlite3.Connection) -> Dict[str, Dict[str, int]]:
+    """
+    Retrieves the statistical information about the contents of the spell database on an open connection (see
+    `db_info`).
+
+    :param conn: the open database connection
     :return: a dictionary containing the statistical information (counts by type)
     """
     info: Dict[str, Dict[str, int]] = {
         "meta": {
-            "total": _query(db_path, _INFO_TOTAL)[0][0],
+            "total": _query(conn, _INFO_TOTAL)[0][0],
         },
         "books": {},
         "levels": {},
@@ -189,32 +1426,21 @@ def db_info(db_path: str) -> Dict[str, Dict[str, int]]:
         "casters": {},
     }
 
-    for book in _query(db_path, _INFO_BOOKS):
+    for book in _query(conn, _INFO_BOOKS):
         info["books"][book[0]] = book[1]
 
-    for level in _query(db_path, _INFO_LEVELS):
+    for level in _query(conn, _INFO_LEVELS):
         info["levels"][level[0]] = level[1]
 
-    for school in _query(db_path, _INFO_SCHOOLS):
+    for school in _query(conn, _INFO_SCHOOLS):
         info["schools"][school[0]] = school[1]
 
     for caster in Caster.__members__.values():
-        for casters in _query(db_path, f"{_INFO_CASTERS} '%{caster.name.lower()}%'"):
+        for casters in _query(conn, f"{_INFO_CASTERS} '%{caster.name.lower()}%'"):
             info["casters"][caster.name] = casters[0]
 
     return info
 
 
-def _query(db_path: str, sql: str) -> List[Any]:
-    query_results = []
-
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-        cursor.execute(sql)
-        results = cursor.fetchall()
-        for row in results:
-            query_results.append(row)
-        cursor.close()
-        conn.commit()
-
-    return query_results
+def _query(conn: sqlite3.Connection, sql: str) -> List[Any]:
+    return conn.execute(sql).fetchall()
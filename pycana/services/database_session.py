@@ -0,0 +1,290 @@
+"""
+A long-lived handle on the database, for hosts running many searches (e.g. an interactive session, or a server).
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import time
+from dataclasses import dataclass, replace
+from typing import Final, Optional, List, Dict, Any, Tuple
+
+from pycana.models import Spell, SpellCriteria
+from pycana.services.database import (
+    ConnectionSettings,
+    connect,
+    copy_to_memory,
+    execute_find,
+    query_count,
+    query_description,
+    query_facets,
+    query_info,
+    query_related,
+)
+
+# the keys of the spells found by the latest refined search, which the next one may be narrowed within
+# noinspection SqlNoDataSourceInspection
+_CREATE_REFINED_SQL: Final[
+    str
+] = """
+    CREATE TEMP TABLE IF NOT EXISTS refined_spells (
+        book TEXT NOT NULL COLLATE NOCASE,
+        name TEXT NOT NULL COLLATE NOCASE,
+        PRIMARY KEY (book, name)
+    ) WITHOUT ROWID
+"""
+
+# noinspection SqlNoDataSourceInspection
+_CLEAR_REFINED_SQL: Final[str] = "DELETE FROM temp.refined_spells"
+
+# noinspection SqlNoDataSourceInspection
+_SAVE_REFINED_SQL: Final[str] = "INSERT INTO temp.refined_spells (book, name) VALUES (?, ?)"
+
+
+@dataclass(frozen=True)
+class LoadCost:
+    """
+    The cost of copying the database into memory.
+
+    Attributes:
+        seconds: the time taken by the copy.
+        size: the size of the copied database, in bytes.
+    """
+
+    seconds: float
+    size: int
+
+
+class Database:
+    """
+    Serves the searches from a single connection which is kept open between them, instead of opening one for each
+    search. With `in_memory`, the database is copied into memory once (with the SQLite backup API), and all the
+    searches are then served from RAM.
+
+    The database file is checked before each search: when it has been replaced (e.g. by a new install) or modified
+    (its SQLite data version changed), it is reopened (or copied again), so the searches always see its current
+    contents.
+
+    A `Database` must only be used by one thread at a time. It should be closed when no longer needed (or used as a
+    context manager).
+
+    Args:
+        db_path: the path to the database file.
+        in_memory: whether the database is copied into memory.
+        settings: the connection settings (a read-only connection by default).
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        in_memory: bool = False,
+        settings: Optional[ConnectionSettings] = None,
+    ) -> None:
+        self._db_path = db_path
+        self._in_memory = in_memory
+        self._settings = settings or ConnectionSettings(read_only=True)
+        self._source: Optional[sqlite3.Connection] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._file_state: Optional[Tuple[int, ...]] = None
+        self._data_version = 0
+        self._load_cost: Optional[LoadCost] = None
+        self._refined: Optional[SpellCriteria] = None
+        self._closed = False
+        self._open()
+
+    def __enter__(self) -> Database:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def load_cost(self) -> Optional[LoadCost]:
+        """
+        The cost of the latest copy of the database into memory (`None` if the database is not in memory).
+        """
+        return self._load_cost
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """
+        The open connection serving the searches - reopened first if the database file changed.
+        """
+        if self._closed:
+            raise RuntimeError("The database has been closed.")
+
+        if self._conn is None or self._changed():
+            self._close_connections()
+            return self._open()
+
+        return self._conn
+
+    def find_spells(
+        self,
+        criteria: Optional[SpellCriteria] = None,
+        limit: Optional[int] = None,
+        sort_by: Optional[str] = None,
+        with_description: bool = True,
+    ) -> List[Spell]:
+        """
+        Finds the spells matching the given criteria (see `pycana.services.database.find_spells`).
+
+        Args:
+            criteria: the search criteria (all spells if `None`).
+            limit: the maximum number of spells returned (unlimited if `None`).
+            sort_by: the sort clause (e.g. "level desc").
+            with_description: whether the descriptions are loaded.
+
+        Returns: The list of matching spells.
+        """
+        return [
+            Spell.from_row(row) for row in execute_find(self.connection, criteria, limit, sort_by, with_description)
+        ]
+
+    def refine(
+        self,
+        criteria: SpellCriteria,
+        sort_by: Optional[str] = None,
+        with_description: bool = False,
+    ) -> Tuple[List[Spell], bool]:
+        """
+        Finds the spells matching the given criteria, as a refinement of the previous refined search: when the
+        criteria are stricter than the previous ones (see `SpellCriteria.narrows`), only the spells it found are
+        searched (by key), instead of all the spells.
+
+        Args:
+            criteria: the search criteria.
+            sort_by: the sort clause (e.g. "level desc").
+            with_description: whether the descriptions are loaded.
+
+        Returns: The list of matching spells, and whether the search was narrowed within the previous results.
+        """
+        conn = self.connection
+        narrowed = self._refined is not None and criteria.narrows(self._refined)
+
+        cursor = execute_find(
+            conn, criteria, None, sort_by, with_description, within="temp.refined_spells" if narrowed else None
+        )
+        spells = [Spell.from_row(row) for row in cursor]
+
+        conn.execute(_CLEAR_REFINED_SQL)
+        conn.executemany(_SAVE_REFINED_SQL, ((spell.book, spell.name) for spell in spells))
+        conn.commit()
+        self._refined = replace(criteria)
+
+        return spells, narrowed
+
+    def find_description(self, book: str, name: str) -> str:
+        """
+        Retrieves the description of a single spell (see `pycana.services.database.find_description`).
+
+        Args:
+            book: the book containing the spell.
+            name: the name of the spell.
+
+        Returns: The description of the spell (empty if the spell does not exist).
+        """
+        return query_description(self.connection, book, name)
+
+    def find_related(self, book: str, name: str) -> List[Tuple[str, str]]:
+        """
+        Retrieves the spells related to a spell (see `pycana.services.database.find_related`).
+
+        Args:
+            book: the book containing the spell.
+            name: the name of the spell.
+
+        Returns: The books and names of the related spells, the most similar first.
+        """
+        return query_related(self.connection, book, name)
+
+    def count_spells(self, criteria: Optional[SpellCriteria] = None) -> int:
+        """
+        Counts the spells matching the given criteria (see `pycana.services.database.count_spells`).
+
+        Args:
+            criteria: the search criteria (all spells if `None`).
+
+        Returns: The number of matching spells.
+        """
+        return query_count(self.connection, criteria)
+
+    def spell_facets(self, criteria: Optional[SpellCriteria] = None) -> Dict[str, Dict[Any, int]]:
+        """
+        Breaks the spells matching the given criteria down (see `pycana.services.database.spell_facets`).
+
+        Args:
+            criteria: the search criteria (all spells if `None`).
+
+        Returns: The counts by facet value, in the same layout as `db_info`.
+        """
+        return query_facets(self.connection, criteria)
+
+    def db_info(self) -> Dict[str, Dict[str, int]]:
+        """
+        Retrieves the statistical information about the contents of the database (see
+        `pycana.services.database.db_info`).
+
+        Returns: A dictionary containing the statistical information (counts by type).
+        """
+        return query_info(self.connection)
+
+    def close(self) -> None:
+        """
+        Closes the connections to the database.
+        """
+        self._closed = True
+        self._close_connections()
+
+    def _open(self) -> sqlite3.Connection:
+        # the file state is read first, so a change made while opening is caught by the next check
+        self._file_state = _file_state(self._db_path)
+        self._source = connect(self._db_path, self._settings)
+
+        try:
+            self._data_version = _data_version(self._source)
+
+            if self._in_memory:
+                started = time.perf_counter()
+                conn = copy_to_memory(self._source, metrics=self._settings.metrics)
+                self._load_cost = LoadCost(seconds=time.perf_counter() - started, size=_database_size(conn))
+            else:
+                conn = self._source
+            # a reopened database starts the refined searches over
+            conn.execute(_CREATE_REFINED_SQL)
+            self._refined = None
+        except BaseException:
+            self._close_connections()
+            raise
+
+        self._conn = conn
+        return conn
+
+    def _changed(self) -> bool:
+        # a replaced file is only noticed by its state - connections still open on it keep seeing the previous file
+        if self._file_state != _file_state(self._db_path):
+            return True
+        return self._source is not None and self._data_version != _data_version(self._source)
+
+    def _close_connections(self) -> None:
+        for conn in {id(conn): conn for conn in (self._conn, self._source) if conn is not None}.values():
+            conn.close()
+        self._conn = None
+        self._source = None
+
+
+def _file_state(db_path: str) -> Optional[Tuple[int, ...]]:
+    try:
+        stat = os.stat(db_path)
+    except FileNotFoundError:
+        return None
+    return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def _data_version(conn: sqlite3.Connection) -> int:
+    # changes when another connection commits changes to the database
+    return conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def _database_size(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
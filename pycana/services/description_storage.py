@@ -0,0 +1,157 @@
+"""
+Functions and classes used to store the spell descriptions compressed in the database.
+
+The descriptions are compressed one by one with zlib, either on their own ("zlib"), or primed with a preset dictionary
+trained on the descriptions being stored ("zdict") - the phrases shared by many descriptions (e.g. "At Higher Levels",
+"a creature of your choice") then cost a short back-reference even in the first occurrence within a description.
+"""
+from __future__ import annotations
+
+import sqlite3
+import zlib
+from collections import Counter
+from typing import Final, List, Dict, Iterable, Optional, Union
+
+PLAIN: Final[str] = "plain"
+
+ZLIB: Final[str] = "zlib"
+
+ZDICT: Final[str] = "zdict"
+
+# the ways the descriptions can be stored, the first being the default
+DESCRIPTION_STORAGES: Final[List[str]] = [PLAIN, ZLIB, ZDICT]
+
+# the declared type of the compressed description columns, read back as `CompressedText` values
+COMPRESSED_TYPE: Final[str] = "ZTEXT"
+
+# zlib only looks back 32 KiB, so any larger dictionary would be partly unused
+_DICTIONARY_SIZE: Final[int] = 32 * 1024
+
+# the longest run of words considered for the dictionary
+_MAX_PHRASE_WORDS: Final[int] = 4
+
+_LEVEL: Final[int] = 9
+
+# the zlib header flag signalling that the stream was compressed with a preset dictionary (RFC 1950)
+_FDICT: Final[int] = 0x20
+
+# the known dictionaries, by their zlib identifier (the Adler-32 checksum recorded in the stream header)
+_DICTIONARIES: Dict[int, bytes] = {}
+
+
+class CompressedText:
+    """
+    A compressed description, as read from the database - it is only decompressed when converted to a string.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+
+    def __str__(self) -> str:
+        return decompress_description(self.data)
+
+    def __repr__(self) -> str:
+        return f"CompressedText({len(self.data)} bytes)"
+
+
+def train_dictionary(texts: Iterable[str], size: int = _DICTIONARY_SIZE) -> bytes:
+    """
+    Builds a preset dictionary from the phrases (runs of up to four words) repeated across the texts, favoring those
+    saving the most (frequent and long). The most valuable phrases are placed at the end of the dictionary, where
+    they are closest to the compressed data (and the cheapest to refer to).
+
+    Args:
+        texts: the sample texts (typically all the descriptions being stored).
+        size: the maximum size of the dictionary, in bytes.
+
+    Returns: The dictionary (empty if no phrase is repeated).
+    """
+    counts: Counter = Counter()
+    for text in texts:
+        words = text.split()
+        for length in range(1, _MAX_PHRASE_WORDS + 1):
+            counts.update(" ".join(words[idx : idx + length]) for idx in range(len(words) - length + 1))
+
+    ranked = sorted(
+        (phrase for phrase, count in counts.items() if count > 1),
+        key=lambda phrase: (counts[phrase] * len(phrase), phrase),
+        reverse=True,
+    )
+
+    chosen: List[bytes] = []
+    covered = bytearray()
+    for phrase in ranked:
+        encoded = f"{phrase} ".encode("utf-8")
+        if len(covered) + len(encoded) > size:
+            break
+
+        # a phrase contained in a more valuable one is already covered by it
+        if encoded not in covered:
+            chosen.append(encoded)
+            covered += encoded
+
+    return b"".join(reversed(chosen))
+
+
+def register_dictionary(dictionary: bytes) -> None:
+    """
+    Makes a dictionary known to `decompress_description` - the databases storing their descriptions with a dictionary
+    register it when they are opened.
+
+    Args:
+        dictionary: the preset dictionary.
+    """
+    _DICTIONARIES[zlib.adler32(dictionary)] = dictionary
+
+
+def compress_description(text: str, dictionary: Optional[bytes] = None) -> bytes:
+    """
+    Compresses a description, as a zlib stream.
+
+    Args:
+        text: the description.
+        dictionary: the preset dictionary (none if `None` or empty).
+
+    Returns: The compressed description.
+    """
+    compressor = zlib.compressobj(_LEVEL, zdict=dictionary) if dictionary else zlib.compressobj(_LEVEL)
+    return compressor.compress(text.encode("utf-8")) + compressor.flush()
+
+
+def decompress_description(data: bytes) -> str:
+    """
+    Decompresses a description compressed by `compress_description` - the dictionary it was compressed with (if any)
+    is identified by the stream header, and must have been registered.
+
+    Args:
+        data: the compressed description.
+
+    Returns: The description.
+
+    Raises:
+        ValueError: if the description was compressed with an unknown dictionary.
+    """
+    if len(data) > 6 and data[1] & _FDICT:
+        dictionary_id = int.from_bytes(data[2:6], "big")
+        if dictionary_id not in _DICTIONARIES:
+            raise ValueError(f"The description was compressed with an unknown dictionary ({dictionary_id:08x}).")
+
+        decompressor = zlib.decompressobj(zdict=_DICTIONARIES[dictionary_id])
+        return (decompressor.decompress(data) + decompressor.flush()).decode("utf-8")
+
+    return zlib.decompress(data).decode("utf-8")
+
+
+def description_text(value: Union[str, bytes, None]) -> Optional[str]:
+    """
+    Returns the text of a stored description, whether it is compressed or not - registered as an SQL function.
+    """
+    if value is None or isinstance(value, str):
+        return value
+    return decompress_description(value)
+
+
+# the compressed descriptions are wrapped when read (with `sqlite3.PARSE_DECLTYPES`), to be decompressed lazily
+sqlite3.register_converter(COMPRESSED_TYPE, CompressedText)
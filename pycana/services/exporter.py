@@ -0,0 +1,162 @@
+"""
+Functions used to export spell rows (as streamed from the database) to files.
+"""
+import csv
+import json
+from typing import Final, Iterable, Tuple, TextIO, Callable, Dict, List, Optional
+
+from pycana.services.compression import open_gzip_text
+
+EXPORT_FORMATS: Final[List[str]] = ["jsonl", "csv", "xml"]
+
+_FIELDS: Final[List[str]] = [
+    "book",
+    "name",
+    "level",
+    "school",
+    "ritual",
+    "guild",
+    "category",
+    "range",
+    "duration",
+    "casting_time",
+    "description",
+    "casters",
+    "components",
+]
+
+
+def export_rows(rows: Iterable[Tuple], file: TextIO, export_format: str) -> int:
+    """
+    Writes the spell rows to the file in the given format, one row at a time, so that exports run in constant
+    memory regardless of the number of rows.
+
+    The formats are:
+
+    - jsonl: one JSON object per spell (the same layout as `Spell.to_dict()`).
+    - csv: a header line followed by one line per spell.
+    - xml: the XML bundle format read by the `xml_loader` - a `library` of `tome` elements.
+
+    Args:
+        rows: the spell rows, in the layout of `Spell.to_row()`.
+        file: the text file to be written.
+        export_format: the export format ("jsonl", "csv" or "xml").
+
+    Returns: The number of spells written.
+    """
+    if export_format not in _EXPORTERS:
+        raise ValueError(f"Unsupported export format ({export_format}) - must be one of {', '.join(EXPORT_FORMATS)}.")
+
+    return _EXPORTERS[export_format](rows, file)
+
+
+def open_export_file(path: str, compression_level: int = 9, parallel_compression: bool = False) -> TextIO:
+    """
+    Opens the export file for writing - it will be gzip compressed if the path ends with ".gz".
+
+    Args:
+        path: the path of the export file.
+        compression_level: the gzip compression level (1-9).
+        parallel_compression: whether the file should be compressed in parallel blocks on multiple threads.
+
+    Returns: The writable text file - it must be closed to complete the export.
+    """
+    if path.lower().endswith(".gz"):
+        return open_gzip_text(path, level=compression_level, parallel=parallel_compression)
+    else:
+        return open(path, "w", encoding="utf-8", newline="")  # pylint: disable=consider-using-with
+
+
+def _export_jsonl(rows: Iterable[Tuple], file: TextIO) -> int:
+    count = 0
+
+    for row in rows:
+        record = dict(zip(_FIELDS, row))
+        record["ritual"] = row[4] == 1
+        record["guild"] = row[5] == 1
+        record["casters"] = str(row[11]).split(",")
+        record["components"] = json.loads(row[12])
+
+        file.write(json.dumps(record))
+        file.write("\n")
+        count += 1
+
+    return count
+
+
+def _export_csv(rows: Iterable[Tuple], file: TextIO) -> int:
+    count = 0
+
+    writer = csv.writer(file)
+    writer.writerow(_FIELDS)
+
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+
+    return count
+
+
+def _export_xml(rows: Iterable[Tuple], file: TextIO) -> int:
+    count = 0
+    current_book: Optional[str] = None
+
+    file.write('<?xml version="1.0" encoding="UTF-8" standalone="yes" ?>\n<library>\n')
+
+    for row in rows:
+        if row[0] != current_book:
+            if current_book is not None:
+                file.write("    </tome>\n")
+            current_book = row[0]
+            file.write(f'    <tome name="{_escape_attr(row[0])}">\n')
+
+        _write_xml_spell(file, row)
+        count += 1
+
+    if current_book is not None:
+        file.write("    </tome>\n")
+
+    file.write("</library>\n")
+
+    return count
+
+
+def _write_xml_spell(file: TextIO, row: Tuple) -> None:
+    ritual = "true" if row[4] == 1 else "false"
+    guild = "true" if row[5] == 1 else "false"
+    casters = "".join(f"<{caster.lower()}/>" for caster in str(row[11]).split(","))
+
+    components = []
+    for comp in json.loads(row[12]):
+        if comp["type"] == "material":
+            components.append(f"<material>{_cdata(comp.get('details', ''))}</material>")
+        else:
+            components.append(f"<{comp['type']}/>")
+
+    file.write(
+        f'        <spell level="{row[2]}" school="{str(row[3]).lower()}" ritual="{ritual}" guild="{guild}">\n'
+        f"            <category>{_cdata(row[6])}</category>\n"
+        f"            <name>{_cdata(row[1])}</name>\n"
+        f"            <casters>{casters}</casters>\n"
+        f"            <casting-time>{_cdata(row[9])}</casting-time>\n"
+        f"            <range>{_cdata(row[7])}</range>\n"
+        f"            <components>{''.join(components)}</components>\n"
+        f"            <duration>{_cdata(row[8])}</duration>\n"
+        f"            <description>{_cdata(row[10])}</description>\n"
+        "        </spell>\n"
+    )
+
+
+def _cdata(value: Optional[str]) -> str:
+    return f"<![CDATA[{value.replace(']]>', ']]]]><![CDATA[>')}]]>" if value else ""
+
+
+def _escape_attr(value: str) -> str:
+    return value.replace("&", "&amp;").replace('"', "&quot;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+_EXPORTERS: Final[Dict[str, Callable[[Iterable[Tuple], TextIO], int]]] = {
+    "jsonl": _export_jsonl,
+    "csv": _export_csv,
+    "xml": _export_xml,
+}
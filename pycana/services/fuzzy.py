@@ -0,0 +1,76 @@
+"""
+Functions used for typo-tolerant (fuzzy) text matching, based on trigrams and edit distance.
+"""
+import html
+from typing import Set
+
+
+def fuzzy_key(text: str) -> str:
+    """
+    Normalizes the text for fuzzy matching - it is unescaped and case-folded, and everything but letters and digits
+    is removed (so that "Fire Ball" and "fireball" have the same key).
+
+    Args:
+        text: the text to be normalized.
+
+    Returns: The normalized key.
+    """
+    return "".join(char for char in html.unescape(text).casefold() if char.isalnum())
+
+
+def trigrams(key: str) -> Set[str]:
+    """
+    Extracts the distinct trigrams of the (normalized) key, which is padded so that its start and end are weighted,
+    and so that even short keys have trigrams.
+
+    Args:
+        key: the normalized key (see `fuzzy_key`).
+
+    Returns: The set of trigrams (empty for an empty key).
+    """
+    if not key:
+        return set()
+
+    padded = f"  {key} "
+    return {padded[idx : idx + 3] for idx in range(len(padded) - 2)}
+
+
+def edit_distance(first: str, second: str) -> int:
+    """
+    Computes the Levenshtein edit distance between the two strings.
+    """
+    if len(first) < len(second):
+        first, second = second, first
+
+    previous = list(range(len(second) + 1))
+    for idx, first_char in enumerate(first, start=1):
+        current = [idx]
+        for jdx, second_char in enumerate(second, start=1):
+            current.append(
+                min(previous[jdx] + 1, current[jdx - 1] + 1, previous[jdx - 1] + (first_char != second_char))
+            )
+        previous = current
+
+    return previous[-1]
+
+
+def similarity(query_key: str, candidate_key: str, shared: int) -> float:
+    """
+    Scores the similarity of a candidate to the query (1.0 being identical), combining the trigram (Jaccard)
+    similarity and the edit distance of their keys.
+
+    Args:
+        query_key: the normalized query.
+        candidate_key: the normalized candidate.
+        shared: the number of trigrams shared by the query and the candidate.
+
+    Returns: The similarity score, between 0.0 and 1.0.
+    """
+    if not query_key or not candidate_key:
+        return 0.0
+
+    union = len(trigrams(query_key)) + len(trigrams(candidate_key)) - shared
+    jaccard = shared / union if union > 0 else 0.0
+    distance = edit_distance(query_key, candidate_key) / max(len(query_key), len(candidate_key))
+
+    return (jaccard + (1.0 - distance)) / 2.0
@@ -0,0 +1,243 @@
+"""
+Functions used to measure how the searches behave under load - many concurrent readers replaying a mix of criteria
+against a database, optionally while the database is being reinstalled.
+"""
+from __future__ import annotations
+
+import random
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Final, List, Optional, Tuple, Dict, Callable
+
+from rich.console import Console
+
+from pycana.models import Spell, SpellCriteria, Caster, School
+from pycana.services.database import ConnectionSettings, find_spells, rebuild_db
+
+# the kinds of searches replayed, with their relative weights - mostly names being typed, and single-field filters
+_SEARCH_KINDS: Final[List[Tuple[str, int]]] = [
+    ("name_prefix", 6),
+    ("name", 4),
+    ("level", 3),
+    ("level_range", 2),
+    ("caster", 3),
+    ("school", 2),
+    ("level_caster", 3),
+    ("description", 2),
+    ("general", 1),
+]
+
+# the words searched for in the descriptions (and in general)
+_DESCRIPTION_TERMS: Final[List[str]] = ["creature", "damage", "saving throw", "light", "heal", "fire", "range"]
+
+# builds the criteria of each kind of search, from a randomly chosen spell
+_CRITERIA_BUILDERS: Final[Dict[str, Callable[[random.Random, Spell], SpellCriteria]]] = {
+    "name_prefix": lambda chooser, spell: SpellCriteria(name=f"^{spell.name[:chooser.randint(1, 4)]}"),
+    "name": lambda chooser, spell: SpellCriteria(name=chooser.choice(spell.name.split())),
+    "level": lambda chooser, spell: SpellCriteria(level=str(spell.level)),
+    "level_range": lambda chooser, spell: SpellCriteria(level=f"{spell.level}-{chooser.randint(spell.level, 9)}"),
+    "caster": lambda chooser, spell: SpellCriteria(caster=chooser.choice(list(Caster)).name.lower()),
+    "school": lambda chooser, spell: SpellCriteria(school=chooser.choice(list(School)).name.lower()),
+    "level_caster": lambda chooser, spell: SpellCriteria(
+        level=str(spell.level), caster=chooser.choice(list(Caster)).name.lower()
+    ),
+    "description": lambda chooser, spell: SpellCriteria(description=chooser.choice(_DESCRIPTION_TERMS)),
+    "general": lambda chooser, spell: SpellCriteria(general=chooser.choice(_DESCRIPTION_TERMS)),
+}
+
+# the number of criteria in the replayed mix (if not given)
+_MIX_SIZE: Final[int] = 200
+
+
+@dataclass(frozen=True)
+class LoadTestResult:
+    """
+    The measures of a load test.
+
+    Attributes:
+        requests: the number of searches completed.
+        errors: the number of searches which failed.
+        seconds: the duration of the test.
+        latencies: the durations of the completed searches, in seconds (sorted).
+        reinstalls: the number of times the database was reinstalled during the test.
+    """
+
+    requests: int
+    errors: int
+    seconds: float
+    latencies: List[float]
+    reinstalls: int = 0
+
+    @property
+    def throughput(self) -> float:
+        """
+        The number of searches completed per second.
+        """
+        return self.requests / self.seconds if self.seconds > 0 else 0.0
+
+    def percentile(self, percent: float) -> float:
+        """
+        Returns: The latency (in seconds) under which the given percentage of the searches completed (nearest rank).
+        """
+        if not self.latencies:
+            return 0.0
+        rank = max(0, min(len(self.latencies) - 1, int(len(self.latencies) * percent / 100 + 0.5) - 1))
+        return self.latencies[rank]
+
+
+def criteria_mix(spells: List[Spell], size: int = _MIX_SIZE, seed: Optional[int] = None) -> List[SpellCriteria]:
+    """
+    Builds a realistic mix of search criteria from the spells of a database (e.g. the prefixes of their names, as they
+    are typed, or their levels combined with a caster).
+
+    Args:
+        spells: the spells the criteria are drawn from (at least one).
+        size: the number of criteria.
+        seed: the seed of the random choices (the mix is different on each call if `None`).
+
+    Returns: The criteria, in a random order.
+    """
+    chooser = random.Random(seed)
+    kinds, weights = zip(*_SEARCH_KINDS)
+
+    mix = []
+    for kind in chooser.choices(kinds, weights, k=size):
+        mix.append(_CRITERIA_BUILDERS[kind](chooser, chooser.choice(spells)))
+    return mix
+
+
+def run_load_test(
+    db_path: str,
+    mix: List[SpellCriteria],
+    workers: int = 4,
+    processes: bool = False,
+    duration: Optional[float] = None,
+    requests: Optional[int] = None,
+    settings: Optional[ConnectionSettings] = None,
+    install_spells: Optional[List[Spell]] = None,
+) -> LoadTestResult:
+    """
+    Replays the criteria against the database from concurrent workers (threads, or processes), each opening a
+    connection for each search like the `find` command, until the given duration has elapsed or the given number of
+    searches has been made.
+
+    With `install_spells`, the database is reinstalled with them over and over while the test runs (see `rebuild_db`) -
+    the searches must keep succeeding while the installs replace the database. A failed install fails the test, as its
+    measures would no longer be taken during the installs.
+
+    Args:
+        db_path: the path to the database file.
+        mix: the criteria replayed (in turn, each worker starting at a different place).
+        workers: the number of concurrent workers.
+        processes: whether the workers are processes rather than threads (the searches then run in parallel).
+        duration: the duration of the test, in seconds (used if `requests` is `None`).
+        requests: the total number of searches made.
+        settings: the connection settings (a read-only connection by default).
+        install_spells: the spells reinstalled during the test (no install if `None`).
+
+    Returns: The measures of the test.
+
+    Raises:
+        ValueError: if there are no criteria or no workers, neither a duration nor a number of requests, or no spells
+            to reinstall.
+        RuntimeError: if the database could not be reinstalled during the test.
+    """
+    if not mix or workers < 1:
+        raise ValueError("A load test needs criteria and at least one worker.")
+    if duration is None and requests is None:
+        raise ValueError("A load test needs a duration or a number of requests.")
+    if install_spells is not None and not install_spells:
+        raise ValueError("A load test during installs needs spells to reinstall.")
+
+    installer = _Installer(db_path, install_spells) if install_spells is not None else None
+
+    started = time.perf_counter()
+    # a wall-clock time, as the workers may be other processes
+    deadline = time.time() + duration if requests is None and duration is not None else float("inf")
+
+    executor: Executor = ProcessPoolExecutor(workers) if processes else ThreadPoolExecutor(workers)
+    with executor:
+        if installer is not None:
+            installer.start()
+        try:
+            futures = [
+                executor.submit(
+                    _replay,
+                    db_path,
+                    mix,
+                    len(mix) * idx // workers,
+                    None if requests is None else requests // workers + (idx < requests % workers),
+                    deadline,
+                    settings,
+                )
+                for idx in range(workers)
+            ]
+            outcomes = [future.result() for future in futures]
+        finally:
+            if installer is not None:
+                installer.stop()
+
+    if installer is not None and installer.error is not None:
+        raise RuntimeError(f"The database could not be reinstalled during the test: {installer.error}") from (
+            installer.error
+        )
+
+    latencies = sorted(latency for worker_latencies, _ in outcomes for latency in worker_latencies)
+    return LoadTestResult(
+        requests=len(latencies),
+        errors=sum(errors for _, errors in outcomes),
+        seconds=time.perf_counter() - started,
+        latencies=latencies,
+        reinstalls=installer.reinstalls if installer is not None else 0,
+    )
+
+
+def _replay(
+    db_path: str,
+    mix: List[SpellCriteria],
+    offset: int,
+    requests: Optional[int],
+    deadline: float,
+    settings: Optional[ConnectionSettings],
+) -> Tuple[List[float], int]:
+    latencies: List[float] = []
+    errors = 0
+
+    idx = offset
+    while time.time() < deadline and (requests is None or len(latencies) + errors < requests):
+        started = time.perf_counter()
+        try:
+            find_spells(db_path, mix[idx % len(mix)], settings=settings, with_description=False)
+            latencies.append(time.perf_counter() - started)
+        except Exception:  # pylint: disable=broad-except
+            # (the failures are counted, the test goes on)
+            errors += 1
+        idx += 1
+
+    return latencies, errors
+
+
+class _Installer(threading.Thread):
+    # reinstalls the database over and over, until stopped
+    def __init__(self, db_path: str, spells: List[Spell]) -> None:
+        super().__init__(daemon=True)
+        self.reinstalls = 0
+        self.error: Optional[Exception] = None
+        self._db_path = db_path
+        self._spells = spells
+        self._stopping = threading.Event()
+
+    def run(self) -> None:
+        try:
+            while not self._stopping.is_set():
+                rebuild_db(Console(quiet=True), self._db_path, self._spells)
+                self.reinstalls += 1
+        except Exception as ex:  # pylint: disable=broad-except
+            # (reported by the test once the searches are done)
+            self.error = ex
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self.join()
@@ -0,0 +1,177 @@
+"""
+A cache of the spells parsed from the spell book bundles, so that unchanged bundles are not parsed again by each
+install or conversion.
+
+Each parsed bundle is stored as a compressed JSON list of spells (see `Spell.to_dict`), named by the hash of the
+bundle content - a bundle copied or renamed is still found. An index remembers the size, modification time and content
+hash of each bundle path, so that an unchanged bundle is found without being read at all. The cache is capped in size,
+the least recently used bundles being evicted first.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import zlib
+from pathlib import Path
+from typing import Final, List, Dict, Optional, Callable, Any
+
+from pycana.models import Spell
+
+# the default cache directory (in the user home)
+DEFAULT_DIRECTORY: Final[str] = os.path.join("~", ".pycana", "cache")
+
+# the default maximum size of the cached bundles, in bytes
+DEFAULT_MAX_SIZE: Final[int] = 64 * 1024 * 1024
+
+# changed whenever the layout of the cached spells changes, so that the bundles cached before are parsed again
+_FORMAT_VERSION: Final[int] = 1
+
+_ENTRY_SUFFIX: Final[str] = f".v{_FORMAT_VERSION}.spells"
+
+_INDEX_NAME: Final[str] = "index.json"
+
+_HASH_CHUNK_SIZE: Final[int] = 1024 * 1024
+
+_LEVEL: Final[int] = 6
+
+
+class ParseCache:
+    """
+    The cache of the parsed bundles, in a directory (created when needed). A cache which cannot be read or written
+    (e.g. for lack of permission) is skipped - the bundles are then simply parsed.
+
+    Args:
+        directory: the cache directory (`~/.pycana/cache` by default).
+        max_size: the maximum size of the cached bundles, in bytes - the least recently used are evicted beyond it.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        self.directory = Path(os.path.expanduser(directory or DEFAULT_DIRECTORY))
+        self.max_size = max_size
+
+    def load(self, bundle_path: str, parse: Callable[[], List[Spell]]) -> List[Spell]:
+        """
+        Returns the spells of a bundle - from the cache if the bundle was cached, otherwise parsed (with the given
+        function) and cached.
+
+        Args:
+            bundle_path: the path to the bundle file.
+            parse: parses the spells of the bundle.
+
+        Returns: The spells of the bundle.
+        """
+        try:
+            entry = self._entry(bundle_path)
+        except OSError:
+            return parse()
+
+        spells = self._read(entry)
+        if spells is None:
+            spells = parse()
+            self._write(entry, spells)
+        return spells
+
+    def is_cached(self, bundle_path: str) -> bool:
+        """
+        Returns: Whether the spells of the bundle are cached.
+        """
+        try:
+            return self._entry(bundle_path).exists()
+        except OSError:
+            return False
+
+    def clear(self) -> None:
+        """
+        Removes all the cached bundles (and the index).
+        """
+        for path in self.directory.glob("*.spells"):
+            path.unlink(missing_ok=True)
+        Path(self.directory, _INDEX_NAME).unlink(missing_ok=True)
+
+    def _entry(self, bundle_path: str) -> Path:
+        # an unchanged bundle (same size and modification time) keeps its recorded hash
+        stat = os.stat(bundle_path)
+        key = str(Path(bundle_path).absolute())
+        index = self._read_index()
+
+        recorded = index.get(key)
+        if recorded is not None and recorded[:2] == [stat.st_size, stat.st_mtime_ns]:
+            content_hash = recorded[2]
+        else:
+            content_hash = _content_hash(bundle_path)
+            index[key] = [stat.st_size, stat.st_mtime_ns, content_hash]
+            self._write_index(index)
+
+        return Path(self.directory, f"{content_hash}{_ENTRY_SUFFIX}")
+
+    def _read(self, entry: Path) -> Optional[List[Spell]]:
+        try:
+            with open(entry, "rb") as file:
+                spells = [Spell.from_dict(values) for values in json.loads(zlib.decompress(file.read()))]
+            # the modification time of the entries records their last use, for the eviction
+            os.utime(entry)
+            return spells
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError, zlib.error):
+            # a damaged entry is replaced
+            entry.unlink(missing_ok=True)
+            return None
+
+    def _write(self, entry: Path, spells: List[Spell]) -> None:
+        content = zlib.compress(json.dumps([spell.to_dict() for spell in spells]).encode("utf-8"), _LEVEL)
+        try:
+            _write_atomically(entry, content)
+            self._evict()
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        entries = []
+        for path in self.directory.glob(f"*{_ENTRY_SUFFIX}"):
+            stat = path.stat()
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def _read_index(self) -> Dict[str, Any]:
+        try:
+            with open(Path(self.directory, _INDEX_NAME), "r", encoding="utf-8") as file:
+                index = json.load(file)
+            return index if isinstance(index, dict) else {}
+        except (OSError, ValueError):
+            # a missing (or damaged) index is started over
+            return {}
+
+    def _write_index(self, index: Dict[str, Any]) -> None:
+        # the bundles which no longer exist are forgotten
+        index = {key: value for key, value in index.items() if os.path.exists(key)}
+        _write_atomically(Path(self.directory, _INDEX_NAME), json.dumps(index).encode("utf-8"))
+
+
+def _content_hash(bundle_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(bundle_path, "rb") as file:
+        for chunk in iter(lambda: file.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_atomically(path: Path, content: bytes) -> None:
+    # concurrent installs never see a partially written file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    try:
+        with os.fdopen(handle, "wb") as file:
+            file.write(content)
+        os.replace(temp_path, path)
+    except BaseException:
+        Path(temp_path).unlink(missing_ok=True)
+        raise
@@ -0,0 +1,354 @@
+"""
+Classes and functions used to measure the statements executed on the database.
+
+The connections opened with a `QueryMetrics` recorder (see `ConnectionSettings.metrics`) record each statement they
+execute: its shape (the statement with its literal values stripped, so all the searches built the same way are
+aggregated together), the number of rows it returned (or changed), the time taken until its rows were all read, and
+whether its query plan scans a whole table. The statements slower than a threshold are appended to a slow-query log,
+and the aggregated histograms can be dumped as JSON or in the Prometheus text format.
+"""
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Final, List, Dict, Optional, Tuple, Any, Iterable
+
+# the upper bounds of the duration histogram buckets, in seconds
+DURATION_BUCKETS: Final[Tuple[float, ...]] = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# the statements taking longer than this are slow by default, in seconds
+SLOW_THRESHOLD: Final[float] = 0.1
+
+_STRING_LITERAL: Final[re.Pattern] = re.compile(r"'(?:[^']|'')*'")
+
+_NUMBER_LITERAL: Final[re.Pattern] = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+
+# lists of values (e.g. "IN (?, ?, ?)") have the same shape whatever their length
+_VALUE_LIST: Final[re.Pattern] = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+_WHITESPACE: Final[re.Pattern] = re.compile(r"\s+")
+
+# the statements whose query plan is explained (the others never scan)
+_QUERY_PREFIXES: Final[Tuple[str, ...]] = ("SELECT", "WITH")
+
+# the number of query plans remembered (by statement), so each distinct statement is explained once
+_PLAN_CACHE_SIZE: Final[int] = 256
+
+_METRIC_PREFIX: Final[str] = "pycana_query"
+
+
+def statement_shape(sql: str) -> str:
+    """
+    Reduces a statement to its shape - its string and number literals are replaced by "?" (as are lists of values),
+    and its whitespace is collapsed - so that the statements differing only by their values are aggregated together,
+    and no searched value is ever recorded.
+
+    Args:
+        sql: the statement.
+
+    Returns: The shape of the statement.
+    """
+    shape = _STRING_LITERAL.sub("?", sql)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _VALUE_LIST.sub("(?, ...)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+def is_full_scan(plan: Iterable[str]) -> bool:
+    """
+    Tells whether a query plan (the details of its `EXPLAIN QUERY PLAN` rows) scans a whole table or index - a scan of
+    a subquery or of a constant row, or a virtual table lookup, is not a full scan.
+
+    Args:
+        plan: the details of the query plan steps (e.g. "SCAN spells", "SEARCH spells USING INDEX ...").
+
+    Returns: Whether any step is a full scan.
+    """
+    return any(
+        detail.startswith("SCAN ")
+        and not detail.startswith(("SCAN (", "SCAN CONSTANT ROW", "SCAN CTE "))
+        and "VIRTUAL TABLE" not in detail
+        for detail in plan
+    )
+
+
+@dataclass
+class StatementStats:
+    """
+    The aggregated measures of the statements having the same shape.
+
+    Attributes:
+        count: the number of executions.
+        rows: the total number of rows returned (or changed).
+        seconds: the total time taken.
+        max_seconds: the longest time taken by a single execution.
+        full_scans: the number of executions whose query plan scans a whole table.
+        slow: the number of executions slower than the threshold.
+        buckets: the number of executions by duration bucket (not cumulative - see `DURATION_BUCKETS`, the last count
+            being for the executions longer than all the bounds).
+    """
+
+    count: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    full_scans: int = 0
+    slow: int = 0
+    buckets: List[int] = field(default_factory=lambda: [0] * (len(DURATION_BUCKETS) + 1))
+
+
+class QueryMetrics:
+    """
+    Records the measures of the statements executed by the connections opened with it. It may be shared by any number
+    of connections and threads.
+
+    Args:
+        slow_threshold: the duration (in seconds) from which a statement is slow.
+        slow_log_path: the file the slow statements are appended to (none are logged if `None`).
+    """
+
+    def __init__(self, slow_threshold: float = SLOW_THRESHOLD, slow_log_path: Optional[str] = None) -> None:
+        self.slow_threshold = slow_threshold
+        self.slow_log_path = slow_log_path
+        self._statements: Dict[str, StatementStats] = {}
+        self._plans: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+    def record(self, sql: str, rows: int, seconds: float, full_scan: bool = False) -> None:
+        """
+        Records an execution of a statement (and logs it if it is slow).
+
+        Args:
+            sql: the statement (only its shape is kept).
+            rows: the number of rows it returned (or changed).
+            seconds: the time it took.
+            full_scan: whether its query plan scans a whole table.
+        """
+        shape = statement_shape(sql)
+        slow = seconds >= self.slow_threshold
+        bucket = next((idx for idx, bound in enumerate(DURATION_BUCKETS) if seconds <= bound), len(DURATION_BUCKETS))
+
+        with self._lock:
+            stats = self._statements.setdefault(shape, StatementStats())
+            stats.count += 1
+            stats.rows += rows
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.full_scans += full_scan
+            stats.slow += slow
+            stats.buckets[bucket] += 1
+
+            if slow and self.slow_log_path:
+                with open(self.slow_log_path, "a", encoding="utf-8") as log:
+                    log.write(
+                        f"{datetime.now().isoformat(timespec='milliseconds')}\t{seconds * 1000:.1f} ms\t{rows} rows\t"
+                        f"{'full scan' if full_scan else 'indexed'}\t{shape}\n"
+                    )
+
+    def full_scan(self, conn: sqlite3.Connection, sql: str, parameters: Any = ()) -> bool:
+        """
+        Tells whether the query plan of a statement scans a whole table - the plan of each statement shape (see
+        `statement_shape`) is only explained once, as the searched values are written into the statements.
+
+        Args:
+            conn: the connection the statement is executed on.
+            sql: the statement.
+            parameters: the parameters of the statement.
+
+        Returns: Whether the statement is a query which scans a whole table.
+        """
+        if not sql.lstrip().upper().startswith(_QUERY_PREFIXES):
+            return False
+
+        shape = statement_shape(sql)
+        with self._lock:
+            if shape in self._plans:
+                return self._plans[shape]
+
+        try:
+            cursor = conn.cursor(sqlite3.Cursor)
+            plan = [row[-1] for row in cursor.execute(f"EXPLAIN QUERY PLAN {sql}", parameters)]
+        except sqlite3.Error:
+            # (the statement itself then fails the same way)
+            return False
+
+        full_scan = is_full_scan(plan)
+        with self._lock:
+            if len(self._plans) >= _PLAN_CACHE_SIZE:
+                self._plans.clear()
+            self._plans[shape] = full_scan
+
+        return full_scan
+
+    def statements(self) -> Dict[str, StatementStats]:
+        """
+        Returns: A copy of the measures recorded so far, by statement shape.
+        """
+        with self._lock:
+            return {shape: StatementStats(**asdict(stats)) for shape, stats in self._statements.items()}
+
+    def to_json(self) -> str:
+        """
+        Returns: The measures recorded so far as a JSON document, with the bucket bounds and the statements (sorted by
+        decreasing total time).
+        """
+        statements = sorted(self.statements().items(), key=lambda item: item[1].seconds, reverse=True)
+        return json.dumps(
+            {
+                "buckets": list(DURATION_BUCKETS),
+                "slow_threshold": self.slow_threshold,
+                "statements": [{"statement": shape, **asdict(stats)} for shape, stats in statements],
+            },
+            indent=2,
+        )
+
+    def to_prometheus(self) -> str:
+        """
+        Returns: The measures recorded so far in the Prometheus text exposition format - a duration histogram, and
+        counters of the rows, full scans and slow executions, all labelled by statement shape.
+        """
+        statements = sorted(self.statements().items())
+        lines = [
+            f"# HELP {_METRIC_PREFIX}_duration_seconds The time taken by the database statements.",
+            f"# TYPE {_METRIC_PREFIX}_duration_seconds histogram",
+        ]
+        for shape, stats in statements:
+            label = f'statement="{_escape_label(shape)}"'
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS + (float("inf"),), stats.buckets):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{_METRIC_PREFIX}_duration_seconds_bucket{{{label},le="{le}"}} {cumulative}')
+            lines.append(f"{_METRIC_PREFIX}_duration_seconds_sum{{{label}}} {stats.seconds!r}")
+            lines.append(f"{_METRIC_PREFIX}_duration_seconds_count{{{label}}} {stats.count}")
+
+        for name, attribute, description in [
+            ("rows_total", "rows", "The rows returned (or changed) by the database statements."),
+            ("full_scans_total", "full_scans", "The database statements executed with a full table scan."),
+            ("slow_total", "slow", "The database statements slower than the slow-query threshold."),
+        ]:
+            lines.append(f"# HELP {_METRIC_PREFIX}_{name} {description}")
+            lines.append(f"# TYPE {_METRIC_PREFIX}_{name} counter")
+            for shape, stats in statements:
+                lines.append(
+                    f'{_METRIC_PREFIX}_{name}{{statement="{_escape_label(shape)}"}} {getattr(stats, attribute)}'
+                )
+
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str) -> None:
+        """
+        Writes the measures recorded so far to a file - as JSON if its name ends with ".json", in the Prometheus text
+        format otherwise (e.g. a ".prom" file, for the node exporter textfile collector).
+
+        Args:
+            path: the path to the file.
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(self.to_json() if path.lower().endswith(".json") else self.to_prometheus())
+
+
+class MeteredConnection(sqlite3.Connection):
+    """
+    A connection recording the statements executed by its cursors into its `metrics` (see `ConnectionSettings.metrics`).
+    """
+
+    metrics: QueryMetrics
+
+    def cursor(self, factory: Any = None) -> Any:  # pylint: disable=arguments-differ
+        return super().cursor(factory or MeteredCursor)
+
+    def execute(self, sql: str, parameters: Any = ()) -> Any:  # pylint: disable=arguments-differ
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, parameters: Any) -> Any:  # pylint: disable=arguments-differ
+        return self.cursor().executemany(sql, parameters)
+
+
+class MeteredCursor(sqlite3.Cursor):
+    """
+    A cursor recording its statements once their rows have all been read (or the cursor is closed, reused or
+    discarded) - the time recorded covers the reading of the rows, as SQLite produces them as they are read.
+    """
+
+    _pending: Optional[Tuple[str, float, bool]] = None
+    _rows: int = 0
+
+    def execute(self, sql: str, parameters: Any = ()) -> Any:  # pylint: disable=arguments-differ
+        self._finish()
+        metrics = self.connection.metrics  # type: ignore[attr-defined]
+        full_scan = metrics.full_scan(self.connection, sql, parameters)
+
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+
+        if self.description is None:
+            # not a query - it is complete
+            metrics.record(sql, max(self.rowcount, 0), time.perf_counter() - started, full_scan)
+        else:
+            self._pending = (sql, started, full_scan)
+            self._rows = 0
+        return self
+
+    def executemany(self, sql: str, parameters: Any) -> Any:  # pylint: disable=arguments-differ
+        self._finish()
+        started = time.perf_counter()
+        super().executemany(sql, parameters)
+        self.connection.metrics.record(  # type: ignore[attr-defined]
+            sql, max(self.rowcount, 0), time.perf_counter() - started
+        )
+        return self
+
+    def __next__(self) -> Any:
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._finish()
+            raise
+        self._rows += 1
+        return row
+
+    def fetchone(self) -> Any:
+        row = super().fetchone()
+        if row is None:
+            self._finish()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size: Optional[int] = None) -> List[Any]:  # pylint: disable=arguments-differ
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._rows += len(rows)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self) -> List[Any]:
+        rows = super().fetchall()
+        self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def close(self) -> None:
+        self._finish()
+        super().close()
+
+    def __del__(self) -> None:
+        self._finish()
+
+    def _finish(self) -> None:
+        if self._pending is not None:
+            sql, started, full_scan = self._pending
+            self._pending = None
+            self.connection.metrics.record(  # type: ignore[attr-defined]
+                sql, self._rows, time.perf_counter() - started, full_scan
+            )
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,151 @@
+"""
+Functions used to find the spells related to each other by their descriptions.
+
+Each spell is represented by the TF-IDF vector of the words of its name and description, and its related spells are
+those whose vectors are the most similar (by cosine similarity). The similarities are computed at install time - with
+NumPy operations over the word postings (a block of spells at a time, so the memory used does not grow with the square
+of the spells) when NumPy is installed (the `related` extra), or with a sparse pure-Python computation otherwise, whose
+cost grows with the square of the number of spells sharing words. The similarities are rounded, so both computations
+agree unless two similarities differ only by the order in which their terms were summed.
+"""
+from __future__ import annotations
+
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Final, List, Dict, Tuple, Sequence, Any
+
+# NumPy is optional - without it, the similarities are computed in pure Python
+try:
+    import numpy  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover
+    numpy = None  # type: ignore[assignment]
+
+# the number of related spells stored for each spell
+RELATED_COUNT: Final[int] = 5
+
+_WORD: Final[re.Pattern] = re.compile(r"[a-z]+")
+
+_MIN_WORD_LENGTH: Final[int] = 3
+
+# the words too common to relate spells to each other
+_STOP_WORDS: Final[frozenset] = frozenset(
+    """
+    the and you for that are with this can your its has have not but any one which each within from into they
+    them their there than then when who what also may must more other such only
+    """.split()
+)
+
+# the similarities are rounded, so that the near-ties are broken the same way (by spell order) in both computations
+_SCORE_DIGITS: Final[int] = 4
+
+# the number of spells whose similarities to all the others are computed (and held) at a time with NumPy
+_BLOCK_SIZE: Final[int] = 256
+
+
+def nearest_neighbours(
+    texts: Sequence[str], groups: Sequence[str], count: int = RELATED_COUNT
+) -> List[List[Tuple[int, float]]]:
+    """
+    Finds the texts most similar to each of the texts, by the cosine similarity of their TF-IDF vectors (the words
+    found in a single text, which relate no texts, are left out).
+
+    Args:
+        texts: the texts (e.g. the names and descriptions of the spells).
+        groups: the group of each text - the texts of a group are never related to each other (e.g. the same spell
+            re-published in several books).
+        count: the maximum number of neighbours of each text.
+
+    Returns: The neighbours of each text - their indexes and similarities, the most similar first (ties in text
+    order). Texts sharing no word have no similarity, and are not neighbours.
+    """
+    vectors = _tfidf_vectors(texts)
+    if numpy is not None:
+        return _numpy_neighbours(vectors, groups, count)
+    return _sparse_neighbours(vectors, groups, count)
+
+
+def _tokens(text: str) -> List[str]:
+    return [word for word in _WORD.findall(text.lower()) if len(word) >= _MIN_WORD_LENGTH and word not in _STOP_WORDS]
+
+
+def _tfidf_vectors(texts: Sequence[str]) -> List[Dict[str, float]]:
+    counts = [Counter(_tokens(text)) for text in texts]
+    frequencies = Counter(word for text_counts in counts for word in text_counts)
+
+    # the smoothed inverse document frequency
+    idf = {word: math.log((1 + len(texts)) / (1 + frequency)) + 1 for word, frequency in frequencies.items()}
+
+    vectors = []
+    for text_counts in counts:
+        vector = {
+            word: (1 + math.log(count)) * idf[word] for word, count in text_counts.items() if frequencies[word] > 1
+        }
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        vectors.append({word: weight / norm for word, weight in vector.items()} if norm else {})
+    return vectors
+
+
+def _sparse_neighbours(
+    vectors: List[Dict[str, float]], groups: Sequence[str], count: int
+) -> List[List[Tuple[int, float]]]:
+    postings: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+    for idx, vector in enumerate(vectors):
+        for word, weight in vector.items():
+            postings[word].append((idx, weight))
+
+    neighbours = []
+    for idx, vector in enumerate(vectors):
+        scores: Dict[int, float] = defaultdict(float)
+        for word, weight in vector.items():
+            for other, other_weight in postings[word]:
+                scores[other] += weight * other_weight
+
+        ranked = sorted(
+            (-round(score, _SCORE_DIGITS), other)
+            for other, score in scores.items()
+            if groups[other] != groups[idx] and round(score, _SCORE_DIGITS) > 0
+        )
+        neighbours.append([(other, -score) for score, other in ranked[:count]])
+    return neighbours
+
+
+def _numpy_neighbours(
+    vectors: List[Dict[str, float]], groups: Sequence[str], count: int
+) -> List[List[Tuple[int, float]]]:
+    postings = _numpy_postings(vectors)
+    group_ids = {group: idx for idx, group in enumerate(dict.fromkeys(groups))}
+    grouping = numpy.array([group_ids[group] for group in groups])
+
+    neighbours = []
+    for start in range(0, len(vectors), _BLOCK_SIZE):
+        scores = numpy.round(_block_scores(vectors[start : start + _BLOCK_SIZE], postings, len(vectors)), _SCORE_DIGITS)
+        scores[grouping[start : start + _BLOCK_SIZE, None] == grouping[None, :]] = 0
+
+        # the stable sort keeps the ties in text order
+        ranked = numpy.argsort(-scores, axis=1, kind="stable")[:, :count]
+        for row, others in enumerate(ranked):
+            neighbours.append([(int(other), float(scores[row, other])) for other in others if scores[row, other] > 0])
+    return neighbours
+
+
+def _block_scores(block: List[Dict[str, float]], postings: Dict[str, Tuple[Any, Any]], total: int):
+    # the similarities of a block of texts to all the texts, accumulated word by word from the postings - only a block
+    # of scores is ever held, however many texts and words there are
+    scores = numpy.zeros((len(block), total))
+    for row, vector in enumerate(block):
+        for word, weight in vector.items():
+            others, weights = postings[word]
+            scores[row, others] += weight * weights
+    return scores
+
+
+def _numpy_postings(vectors: List[Dict[str, float]]) -> Dict[str, Tuple[Any, Any]]:
+    # the indexes of the texts containing each word, with the weights of the word in them
+    postings: Dict[str, Tuple[List[int], List[float]]] = defaultdict(lambda: ([], []))
+    for idx, vector in enumerate(vectors):
+        for word, weight in vector.items():
+            postings[word][0].append(idx)
+            postings[word][1].append(weight)
+
+    return {word: (numpy.array(others), numpy.array(weights)) for word, (others, weights) in postings.items()}
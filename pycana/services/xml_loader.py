@@ -1,19 +1,34 @@
 """
-Functions used to load Spell XML files (zipped or unzipped)
+Functions used to load Spell XML files (compressed or uncompressed)
 """
 from __future__ import annotations
 
-import gzip
+import mmap
 import os
 import time
 import xml.etree.ElementTree as ET
 from pathlib import Path
-from typing import List, cast, Optional
+from typing import List, cast, Optional, Tuple, Dict
 from xml.etree.ElementTree import Element
 
 from rich.console import Console
 
 from pycana.models import Spell, School, Caster
+from pycana.services.compression import open_binary, compressed_suffixes, find_codec
+from pycana.services.parse_cache import ParseCache
+
+
+def bundle_suffixes(compressed: bool = True) -> List[str]:
+    """
+    Resolves the file name suffixes of the spell book bundles, based on the registered compression codecs.
+
+    Args:
+        compressed: whether the suffixes of the compressed bundles (e.g. ".xml.gz", ".xml.bz2") or the uncompressed
+        bundles (".xml") are wanted.
+
+    Returns: The list of bundle file suffixes.
+    """
+    return [f".xml{suffix}" for suffix in compressed_suffixes()] if compressed else [".xml"]
 
 
 def load_all_spells(
@@ -21,25 +36,28 @@ def load_all_spells(
     spells_dir: str,
     name_filter: Optional[str] = ".xml.gz",
     verbose: Optional[bool] = False,
+    parse_cache: Optional[ParseCache] = None,
 ) -> List[Spell]:
     """
-    Loads all spells contained in the spell book files (.xml or .xml.gz) contained in the given directory (not
-    recursive). If a `name_filter` is provided, it will be used to match the file names as an "ends-with" check.
+    Loads all spells contained in the spell book files (.xml or compressed, e.g. .xml.gz) contained in the given
+    directory (not recursive). If a `name_filter` is provided, it will be used to match the file names as an
+    "ends-with" check.
 
     Args:
         console: the output console to be used
         spells_dir: the path to the directory containing the spell book files
-        name_filter: an optional (ends-with) name filter (.xml.gz will be used by default)
+        name_filter: an optional (ends-with) name filter (all compressed bundles will be used by default)
         verbose: an optional flag that will generate more detailed console output
+        parse_cache: the cache of the parsed files (not used if `None`) - see `load_spells`
 
     Returns: a list of spells from all of the loaded books.
     """
     overall_start_time = time.time()
-    used_filter: str = name_filter if name_filter is not None else ".xml.gz"
+    used_filters = (name_filter,) if name_filter is not None else tuple(bundle_suffixes(compressed=True))
 
     all_spells = []
-    for file in filter(lambda f: f.endswith(used_filter), os.listdir(spells_dir)):
-        all_spells += load_spells(console, str(Path(spells_dir, file)), verbose=verbose)
+    for file in _bundle_files(console, spells_dir, used_filters, verbose):
+        all_spells += load_spells(console, str(Path(spells_dir, file)), verbose=verbose, parse_cache=parse_cache)
 
     overall_elapsed = format(time.time() - overall_start_time, ".2f")
 
@@ -52,47 +70,88 @@ def load_all_spells(
     return all_spells
 
 
+def _bundle_files(console: Console, spells_dir: str, suffixes: Tuple[str, ...], verbose: Optional[bool]) -> List[str]:
+    # the same bundle compressed with several codecs (e.g. a.xml.gz and a.xml.bz2) is only loaded once, preferring
+    # the first matching suffix (the codecs in registration order)
+    matching = []
+    for file in os.listdir(spells_dir):
+        rank = next((idx for idx, suffix in enumerate(suffixes) if file.endswith(suffix)), None)
+        if rank is not None:
+            matching.append((rank, file))
+
+    files: Dict[str, str] = {}
+    for rank, file in sorted(matching):
+        stem = file[: -len(suffixes[rank])]
+        if stem in files:
+            if verbose:
+                console.print(f"Skipping {file} (already loading {files[stem]}).", style="yellow")
+        else:
+            files[stem] = file
+
+    return sorted(files.values())
+
+
 def load_spells(
     console: Console,
     xml_file: str,
     verbose: Optional[bool] = False,
+    use_mmap: bool = True,
+    parse_cache: Optional[ParseCache] = None,
 ) -> List[Spell]:
     """
-    Loads all the spells contained in the given spell book file (.xml.gz if zipped, otherwise .xml).
+    Loads all the spells contained in the given spell book file (.xml, or compressed with any registered codec,
+    such as .xml.gz, .xml.bz2, .xml.xz or .xml.zst) - the codec is selected by the file suffix.
+
+    Uncompressed files are memory-mapped by default, so the parser reads the bytes straight from the mapped pages,
+    rather than from a decoded copy of the whole file. With a `parse_cache`, an unchanged file is not parsed again:
+    its spells are read from the cache.
 
     Args:
         console: the output console
-        xml_file: the xml file to be read (.xml.gz or .xml)
+        xml_file: the xml file to be read (.xml or compressed)
         verbose: optional verbose flag - when True, it will write more information to the console
+        use_mmap: whether uncompressed files should be memory-mapped (True by default)
+        parse_cache: the cache of the parsed files (not used if `None`)
 
     Returns: a list of spells parsed from the file.
     """
-
-    zipped = xml_file.endswith(".xml.gz")
+    if parse_cache is not None:
+        cached = verbose and parse_cache.is_cached(xml_file)
+        spells = parse_cache.load(xml_file, lambda: load_spells(console, xml_file, verbose, use_mmap))
+        if cached:
+            console.print(f" \u221f Loaded {len(spells)} spells from {xml_file} (cached).", style="green i")
+        return spells
 
     if verbose:
         console.print(f"Loading {xml_file}...", style="yellow")
 
-    if zipped:
-        with gzip.open(xml_file, "rb") as f:
-            return _read_xml(console, xml_file, f, verbose)
-    else:
-        with open(xml_file, "r", encoding="utf-8") as f:
-            return _read_xml(console, xml_file, f, verbose)
+    if use_mmap and find_codec(xml_file) is None:
+        with open(xml_file, "rb") as f:
+            if os.fstat(f.fileno()).st_size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                    return _read_xml(console, xml_file, content, verbose)
+            else:
+                return _read_xml(console, xml_file, f.read(), verbose)
 
+    with open_binary(xml_file) as f:
+        return _read_xml(console, xml_file, f.read(), verbose)
 
-def _read_xml(console: Console, source: str, file, verbose: Optional[bool]) -> List[Spell]:
+
+def _read_xml(console: Console, source: str, content, verbose: Optional[bool]) -> List[Spell]:
     spells = []
 
     file_start_time = time.time()
-    tree = ET.ElementTree(ET.fromstring(file.read()))
-    root = tree.getroot()
+    root = ET.fromstring(content)
+
+    # a bundle is either a single "tome", or a "library" of them (as exported by the find command)
+    tomes = [root] if root.tag == "tome" else list(root.iter("tome"))
 
     spell_count = 0
-    for child in root.iter("spell"):
-        if root.get("name") is not None:
-            spells.append(_parse_spell(str(root.get("name")), child))
-            spell_count += 1
+    for tome in tomes:
+        for child in tome.iter("spell"):
+            if tome.get("name") is not None:
+                spells.append(_parse_spell(str(tome.get("name")), child))
+                spell_count += 1
 
     if verbose:
         file_elapsed_time = format(time.time() - file_start_time, ".2f")
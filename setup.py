@@ -20,4 +20,7 @@ setup(
         'click',
         'rich',
     ],
+    extras_require={
+        'related': ['numpy'],
+    },
 )
@@ -0,0 +1,38 @@
+import gzip
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from pycana.commands.convert import convert
+
+
+@pytest.mark.parametrize(
+    "options, file_name",
+    [
+        ([], "spells_a.sbk"),
+        (["--dest-compressed"], "spells_a.sbk.gz"),
+        (["--dest-compressed", "--parallel-compression", "--compression-level", "1"], "spells_a.sbk.gz"),
+    ],
+)
+def test_convert(tmp_path, options, file_name: str) -> None:
+    source_dir = str(Path(__file__).parent.parent.joinpath("resources"))
+    dest_dir = Path(tmp_path, "converted")
+
+    runner = CliRunner()
+    result = runner.invoke(
+        convert,
+        ["--source-directory", source_dir, "--source-compressed", "--dest-directory", str(dest_dir)] + options,
+    )
+
+    assert result.exit_code == 0
+
+    sbk_path = Path(dest_dir, file_name)
+    if file_name.endswith(".gz"):
+        with gzip.open(sbk_path, "rt", encoding="utf-8") as sbk_file:
+            content = sbk_file.read()
+    else:
+        content = sbk_path.read_text(encoding="utf-8")
+
+    assert content.startswith("book: OGL A\nguild: Y\n\n\nname: Acid Splash\n")
+    assert content.count("^^^") == 17
@@ -1,11 +1,18 @@
+import csv
+import gzip
+import io
+import json
+from pathlib import Path
 from typing import Callable, List
 
+import pytest
 from click.testing import CliRunner
 from rich.console import Console
 
+from pycana.commands.display import _rendered_description
 from pycana.commands.find import find
 from pycana.models import Spell
-from pycana.services.database import load_db
+from pycana.services.database import load_db, create_db
 
 
 # TODO: more testing
@@ -126,3 +133,380 @@ def test_find_with_caster_general(spells_db: str, spells_from: Callable[[str], L
     lines = result.output.splitlines()
     for line in lines:
         print(line)
+
+
+def test_find_batch(tmp_path, spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    spells = spells_from("spells_a.xml")
+    load_db(Console(), spells_db, spells)
+
+    batch_file = Path(tmp_path, "queries.jsonl")
+    batch_file.write_text('{"caster": "bard"}\n\n{"name": "animal", "level": "(1, 2)"}\n{"name": "gerbil"}\n')
+
+    runner = CliRunner()
+    result = runner.invoke(find, ["--db-file", spells_db, "--batch", str(batch_file), "--sort-by", "name"])
+
+    assert result.exit_code == 0
+
+    lines = [json.loads(line) for line in result.output.splitlines()]
+    assert [line["query"] for line in lines] == [
+        {"caster": "bard"},
+        {"name": "animal", "level": "(1, 2)"},
+        {"name": "gerbil"},
+    ]
+    assert [line["count"] for line in lines] == [4, 2, 0]
+    assert [spell["name"] for spell in lines[1]["spells"]] == ["Animal Friendship", "Animal Messenger"]
+
+
+def test_find_batch_json_values(tmp_path, spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+
+    batch_file = Path(tmp_path, "queries.jsonl")
+    batch_file.write_text('{"level": 1, "name": "^a"}\n{"ritual": false, "name": "^a"}\n{"ritual": true}\n')
+
+    runner = CliRunner()
+    result = runner.invoke(find, ["--db-file", spells_db, "--batch", str(batch_file), "--sort-by", "name"])
+
+    assert result.exit_code == 0
+    lines = [json.loads(line) for line in result.output.splitlines()]
+    assert [spell["level"] for spell in lines[0]["spells"]] == [1] * lines[0]["count"]
+    assert not any(spell["ritual"] for spell in lines[1]["spells"])
+    assert all(spell["ritual"] for spell in lines[2]["spells"])
+
+
+@pytest.mark.parametrize(
+    "invalid_search", ['{"wand": "elder"}', '{"ritual": "false"}', '{"name": 3}', '["bard"]', '{"level": "abc"}']
+)
+def test_find_batch_invalid(tmp_path, spells_db: str, invalid_search: str) -> None:
+    batch_file = Path(tmp_path, "queries.jsonl")
+    batch_file.write_text(f'{{"caster": "bard"}}\n{invalid_search}\n')
+
+    runner = CliRunner()
+    result = runner.invoke(find, ["--db-file", spells_db, "--batch", str(batch_file)])
+
+    assert result.exit_code == 2
+    assert "Invalid search on line 2" in result.output
+
+
+def test_find_export(tmp_path, spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    spells = spells_from("spells_a.xml")
+    load_db(Console(), spells_db, spells)
+
+    export_path = Path(tmp_path, "export.jsonl.gz")
+
+    runner = CliRunner()
+    result = runner.invoke(
+        find,
+        ["--db-file", spells_db, "--name", "augury", "--export", "jsonl", "--output", str(export_path)],
+    )
+
+    assert result.exit_code == 0
+    assert result.output.startswith("Exported 1 spells to ")
+
+    with gzip.open(export_path, "rt", encoding="utf-8") as export_file:
+        assert [json.loads(line)["name"] for line in export_file] == ["Augury"]
+
+
+def test_find_export_empty(tmp_path, spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+
+    export_path = Path(tmp_path, "export.jsonl.gz")
+
+    runner = CliRunner()
+    result = runner.invoke(
+        find,
+        ["--db-file", spells_db, "--name", "zzzz", "--export", "jsonl", "--output", str(export_path)]
+        + ["--parallel-compression"],
+    )
+
+    assert result.exit_code == 0
+    assert result.output.startswith("Exported 0 spells to ")
+
+    # a valid (empty) gzip stream, rather than an empty file
+    assert export_path.read_bytes()[:2] == b"\x1f\x8b"
+    with gzip.open(export_path, "rt", encoding="utf-8") as export_file:
+        assert export_file.read() == ""
+
+
+def test_find_export_new_directory(tmp_path, spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+
+    export_path = Path(tmp_path, "exports", "2024", "export.csv")
+
+    runner = CliRunner()
+    result = runner.invoke(
+        find, ["--db-file", spells_db, "--name", "augury", "--export", "csv", "--output", str(export_path)]
+    )
+
+    assert result.exit_code == 0
+    assert len(list(csv.reader(io.StringIO(export_path.read_text())))) == 2
+
+
+@pytest.mark.parametrize("option", [["--export", "jsonl"], ["--count"], ["--facets"]])
+def test_find_fuzzy_aggregates(spells_db: str, option: List[str]) -> None:
+    runner = CliRunner()
+    result = runner.invoke(find, ["--db-file", spells_db, "--name", "agury", "--fuzzy"] + option)
+
+    assert result.exit_code == 2
+    assert "The --fuzzy option cannot be used with --export, --count or --facets." in result.output
+
+
+def test_find_export_stdout(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    spells = spells_from("spells_a.xml")
+    load_db(Console(), spells_db, spells)
+
+    runner = CliRunner()
+    result = runner.invoke(find, ["--db-file", spells_db, "--name", "animal", "--export", "csv"])
+
+    assert result.exit_code == 0
+    assert result.output.startswith("book,name,level,")
+
+    rows = list(csv.reader(io.StringIO(result.output)))
+    assert len(rows) == 4
+    assert all(len(row) == 13 for row in rows)
+
+
+def test_find_fuzzy(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    spells = spells_from("spells_a.xml")
+    load_db(Console(), spells_db, spells)
+
+    runner = CliRunner()
+    result = runner.invoke(
+        find,
+        ["--db-file", spells_db, "--show-cols=name", "--no-selection", "--fuzzy", "--name", "animl frendship"],
+    )
+
+    assert result.exit_code == 0
+    assert result.output.splitlines()[3].strip() == "│ 1 │ Animal Friendship │"
+
+
+def test_find_selection(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    spells = spells_from("spells_a.xml")
+    load_db(Console(), spells_db, spells)
+
+    runner = CliRunner()
+    result = runner.invoke(find, ["--db-file", spells_db, "--name", "acid"], input="1\n")
+
+    assert result.exit_code == 0
+    assert "You hurl a bubble of acid." in result.output
+
+
+def test_find_format_plain(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    spells = spells_from("spells_a.xml")
+    load_db(Console(), spells_db, spells)
+
+    runner = CliRunner()
+    result = runner.invoke(
+        find,
+        ["--db-file", spells_db, "--no-selection", "--show-cols=name,level", "--format", "plain", "--name", "animal"],
+    )
+
+    assert result.exit_code == 0
+    assert result.output.splitlines() == [
+        "N  Name               Level",
+        "1  Animal Friendship  1",
+        "2  Animal Messenger   2",
+        "3  Animal Shapes      8",
+    ]
+
+
+def test_find_format_tsv(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    spells = spells_from("spells_a.xml")
+    load_db(Console(), spells_db, spells)
+
+    runner = CliRunner()
+    result = runner.invoke(
+        find,
+        ["--db-file", spells_db, "--no-selection", "--show-cols=name,description", "--format", "tsv", "--name", "acid"],
+    )
+
+    assert result.exit_code == 0
+
+    lines = result.output.splitlines()
+    assert len(lines) == 2
+    assert lines[0] == "name\tdescription"
+    assert lines[1].startswith("Acid Splash\tYou hurl a bubble of acid.  Choose one creature")
+
+
+def test_find_rendered_description_cached(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    spells = spells_from("spells_a.xml")
+    load_db(Console(), spells_db, spells)
+
+    _rendered_description.cache_clear()
+
+    runner = CliRunner()
+    for _ in range(3):
+        result = runner.invoke(find, ["--db-file", spells_db, "--name", "acid"], input="1\n")
+        assert result.exit_code == 0
+        assert "You hurl a bubble of acid." in result.output
+
+    assert _rendered_description.cache_info().misses == 1
+    assert _rendered_description.cache_info().hits == 2
+
+
+def test_find_multiple_databases(tmp_path, spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+
+    other_db = str(Path(tmp_path, "other.db"))
+    create_db(other_db)
+    load_db(Console(), other_db, spells_from("spells_b.xml"))
+
+    runner = CliRunner()
+    result = runner.invoke(
+        find,
+        [
+            "--db-file",
+            spells_db,
+            "--db-file",
+            other_db,
+            "--level",
+            "2",
+            "--sort-by",
+            "name",
+            "--limit",
+            "3",
+            "--format",
+            "plain",
+            "--show-cols=name",
+            "--no-selection",
+        ],
+    )
+
+    assert result.exit_code == 0
+    assert [line.split(maxsplit=1)[1] for line in result.output.splitlines()[1:]] == [
+        "Aid",
+        "Alter Self",
+        "Animal Messenger",
+    ]
+
+
+@pytest.mark.parametrize("level", ["abc", "1-x", "(1, 'two')"])
+def test_find_invalid_level(spells_db: str, level: str) -> None:
+    runner = CliRunner()
+    result = runner.invoke(find, ["--db-file", spells_db, "--level", level])
+
+    assert result.exit_code == 2
+    assert "Invalid value for --level" in result.output
+    assert "Invalid level criteria" in result.output
+
+
+def test_find_count(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+
+    runner = CliRunner()
+    result = runner.invoke(find, ["--db-file", spells_db, "--level", "(1, 2)", "--count", "--format", "tsv"])
+
+    assert result.exit_code == 0
+    assert result.output.strip() == "7"
+
+
+def test_find_facets(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+
+    runner = CliRunner()
+    result = runner.invoke(find, ["--db-file", spells_db, "--name", "^animal", "--facets", "--format", "tsv"])
+
+    assert result.exit_code == 0
+    assert result.output.splitlines() == [
+        "facet\tvalue\tcount",
+        "book\tOGL A\t3",
+        "school\tEnchantment\t2",
+        "school\tTransmutation\t1",
+        "caster\tBard\t2",
+        "caster\tDruid\t3",
+        "caster\tRanger\t2",
+        "level\t1\t1",
+        "level\t2\t1",
+        "level\t8\t1",
+    ]
+
+
+@pytest.mark.parametrize("output_format", ["table", "tsv"])
+def test_find_facets_no_match(spells_db: str, spells_from: Callable[[str], List[Spell]], output_format: str) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+
+    runner = CliRunner()
+    result = runner.invoke(find, ["--db-file", spells_db, "--name", "zzzz", "--facets", "--format", output_format])
+
+    assert result.exit_code == 0
+    if output_format == "tsv":
+        assert result.output.splitlines() == ["facet\tvalue\tcount"]
+    else:
+        assert "0 spells match your criteria." in result.output
+        assert "By Book" in result.output
+
+
+def test_find_in_memory(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+
+    runner = CliRunner()
+    result = runner.invoke(
+        find,
+        ["--db-file", spells_db, "--in-memory", "--show-cols=name,level", "--format", "plain", "--name", "animal"],
+        input="2\n",
+    )
+
+    assert result.exit_code == 0
+    assert result.stderr.startswith("Loaded the database into memory (")
+    assert result.stdout.splitlines()[0:4] == [
+        "N  Name               Level",
+        "1  Animal Friendship  1",
+        "2  Animal Messenger   2",
+        "3  Animal Shapes      8",
+    ]
+    # the description of the selected spell is read from the in-memory copy
+    assert "By means of this spell, you use an animal to deliver a message." in result.stdout
+
+    result = runner.invoke(
+        find, ["--db-file", spells_db, "--in-memory", "--level", "(1, 2)", "--count", "--format", "tsv"]
+    )
+
+    assert result.exit_code == 0
+    assert result.stdout.strip() == "7"
+
+
+def test_find_in_memory_invalid(spells_db: str) -> None:
+    runner = CliRunner()
+    result = runner.invoke(find, ["--db-file", spells_db, "--in-memory", "--fuzzy", "--name", "aid"])
+
+    assert result.exit_code == 2
+    assert "The --in-memory option cannot be used with --batch, --fuzzy or --export." in result.output
+
+
+def test_find_query_metrics(spells_db: str, spells_from: Callable[[str], List[Spell]], tmp_path: Path) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+    slow_log = Path(tmp_path, "slow.log")
+    metrics_file = Path(tmp_path, "metrics.prom")
+
+    runner = CliRunner()
+    result = runner.invoke(
+        find,
+        [
+            "--db-file",
+            spells_db,
+            "--no-selection",
+            "--range",
+            "feet",
+            "--slow-query-ms",
+            "0",
+            "--slow-query-log",
+            str(slow_log),
+            "--query-metrics",
+            str(metrics_file),
+        ],
+    )
+
+    assert result.exit_code == 0
+    logged = [line.split("\t") for line in slow_log.read_text(encoding="utf-8").splitlines()]
+    assert any(entry[3] == "full scan" and "range LIKE ?" in entry[4] for entry in logged)
+    assert "feet" not in slow_log.read_text(encoding="utf-8")
+    assert "# TYPE pycana_query_duration_seconds histogram" in metrics_file.read_text(encoding="utf-8")
+
+
+def test_find_shows_related(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+
+    runner = CliRunner()
+    result = runner.invoke(find, ["--db-file", spells_db, "--name", "alarm"], input="1\n")
+
+    assert result.exit_code == 0
+    assert "Related Spells: Arcane Lock, " in result.output
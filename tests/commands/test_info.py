@@ -1,3 +1,4 @@
+from pathlib import Path
 from typing import Callable, List
 
 from click.testing import CliRunner
@@ -5,7 +6,7 @@ from rich.console import Console
 
 from pycana.commands.info import info
 from pycana.models import Spell
-from pycana.services.database import load_db
+from pycana.services.database import load_db, create_db
 
 
 def test_info_without_spells(spells_db: str) -> None:
@@ -28,3 +29,49 @@ def test_info_with_spells(
 
     assert result.exit_code == 0
     assert result.output.splitlines(False)[0] == f"There are {len(spells)} spells in the database."
+
+
+def test_info_immutable(spells_db: str) -> None:
+    runner = CliRunner()
+    result = runner.invoke(info, ["--db-file", spells_db, "--immutable", "--mmap-size", "1048576"])
+
+    assert result.exit_code == 0
+    assert result.output.strip() == "There are 0 spells in the database."
+
+
+def test_info_multiple_databases(tmp_path, spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+
+    other_db = str(Path(tmp_path, "other.db"))
+    create_db(other_db)
+    load_db(Console(), other_db, spells_from("spells_b.xml"))
+
+    runner = CliRunner()
+    result = runner.invoke(info, ["--db-file", spells_db, "--db-file", other_db, "--show-table", "total"])
+
+    total = len(spells_from("spells_a.xml")) + len(spells_from("spells_b.xml"))
+    assert result.exit_code == 0
+    assert result.output.strip() == f"There are {total} spells in the database."
+
+
+def test_info_in_memory(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    spells = spells_from("spells_a.xml")
+    load_db(Console(), spells_db, spells)
+
+    runner = CliRunner()
+    result = runner.invoke(info, ["--db-file", spells_db, "--in-memory", "--show-table", "total"])
+
+    assert result.exit_code == 0
+    assert result.stdout.strip() == f"There are {len(spells)} spells in the database."
+    assert result.stderr.startswith("Loaded the database into memory (")
+
+
+def test_info_in_memory_multiple_databases(tmp_path, spells_db: str) -> None:
+    other_db = str(Path(tmp_path, "other.db"))
+    create_db(other_db)
+
+    runner = CliRunner()
+    result = runner.invoke(info, ["--db-file", spells_db, "--db-file", other_db, "--in-memory"])
+
+    assert result.exit_code == 2
+    assert "The --in-memory option applies to a single database." in result.output
@@ -1,9 +1,10 @@
+import os
 from pathlib import Path
 
 from click.testing import CliRunner
 
 from pycana.commands.install import install
-from pycana.services.database import db_info
+from pycana.services.database import db_info, find_related
 
 
 def test_install(tmp_path):
@@ -30,4 +31,66 @@ def test_install(tmp_path):
     assert db_info(db_file)["meta"]["total"] == 302
 
     assert result.output.splitlines()[0].startswith("Installing spells from ")
+    assert "Installed 302 spells." in result.output.splitlines()
     assert result.output.splitlines()[-1].endswith("Done.")
+
+
+def test_install_compressed(tmp_path):
+    source_dir = str(Path(__file__).parent.parent.joinpath("resources"))
+    db_file = str(Path(tmp_path, "compressed.db"))
+
+    runner = CliRunner()
+    result = runner.invoke(
+        install,
+        [
+            "--source-directory",
+            str(source_dir),
+            "--db-file",
+            db_file,
+            "--name-filter",
+            ".xml",
+            "--description-storage",
+            "zdict",
+        ],
+    )
+
+    assert result.exit_code == 0
+
+    assert db_info(db_file)["meta"]["total"] == 302
+    assert "Stored 248 KiB of descriptions in 85 KiB (zdict)." in result.output.splitlines()
+
+
+def test_install_parse_cache(tmp_path):
+    source_dir = str(Path(__file__).parent.parent.joinpath("resources"))
+    db_file = str(Path(tmp_path, "cached.db"))
+    cache_dir = Path(os.path.expanduser("~"), ".pycana", "cache")
+
+    runner = CliRunner()
+    arguments = ["--source-directory", source_dir, "--db-file", db_file, "--name-filter", ".xml"]
+
+    result = runner.invoke(install, arguments + ["--no-parse-cache"])
+    assert result.exit_code == 0
+    assert not cache_dir.exists()
+
+    result = runner.invoke(install, arguments)
+    assert result.exit_code == 0
+    assert len(list(cache_dir.glob("*.spells"))) == 4
+
+    result = runner.invoke(install, arguments + ["--verbose"])
+    assert result.exit_code == 0
+    assert db_info(db_file)["meta"]["total"] == 302
+    assert result.output.count("(cached).") == 4
+
+
+def test_install_without_related(tmp_path):
+    source_dir = str(Path(__file__).parent.parent.joinpath("resources"))
+    db_file = str(Path(tmp_path, "test.db"))
+
+    runner = CliRunner()
+    result = runner.invoke(
+        install, ["--source-directory", source_dir, "--db-file", db_file, "--name-filter", ".xml.gz", "--no-related"]
+    )
+
+    assert result.exit_code == 0
+    assert db_info(db_file)["meta"]["total"] == 17
+    assert find_related(db_file, "OGL A", "Alarm") == []
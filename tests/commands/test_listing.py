@@ -0,0 +1,68 @@
+import json
+from pathlib import Path
+from typing import Callable, List
+
+from click.testing import CliRunner
+from rich.console import Console
+
+from pycana.commands.listing import listing
+from pycana.models import Spell
+from pycana.services.database import load_db
+
+
+def test_listing(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+
+    runner = CliRunner()
+    result = runner.invoke(listing, ["--db-file", spells_db, "--caster", "('bard', 'warlock')"])
+
+    assert result.exit_code == 0
+
+    lines = [line.strip() for line in result.output.splitlines()]
+    assert lines[0] == "Bard Spells"
+    assert "Warlock Spells" in lines
+    assert "│ 2     │   1   │ Animal Messenger (R)    │" in lines
+    assert "│ 5     │   2   │ Animate Objects, Awaken │" in lines
+
+
+def test_listing_export(tmp_path, spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+
+    runner = CliRunner()
+    result = runner.invoke(
+        listing,
+        [
+            "--db-file",
+            spells_db,
+            "--spell-level",
+            "(8, 9)",
+            "--export",
+            "jsonl",
+            "--output-directory",
+            str(tmp_path),
+        ],
+    )
+
+    assert result.exit_code == 0
+    assert sorted(file.name for file in tmp_path.iterdir() if file.suffix == ".jsonl") == [
+        "cleric.jsonl",
+        "druid.jsonl",
+        "warlock.jsonl",
+        "wizard.jsonl",
+    ]
+
+    records = [json.loads(line) for line in Path(tmp_path, "wizard.jsonl").read_text().splitlines()]
+    assert [(record["level"], record["name"]) for record in records] == [
+        (8, "Antimagic Field"),
+        (8, "Antipathy or Sympathy"),
+        (9, "Astral Projection"),
+    ]
+    # the exported spells carry their descriptions
+    assert all(record["description"] for record in records)
+
+
+def test_listing_unknown_caster(spells_db: str) -> None:
+    runner = CliRunner()
+    result = runner.invoke(listing, ["--db-file", spells_db, "--caster", "necromancer"])
+
+    assert result.exit_code == 2
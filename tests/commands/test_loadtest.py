@@ -0,0 +1,66 @@
+import shutil
+from pathlib import Path
+from typing import Callable, List
+
+from click.testing import CliRunner
+from rich.console import Console
+
+from pycana.commands.loadtest import loadtest
+from pycana.models import Spell
+from pycana.services.database import load_db
+
+
+def test_loadtest(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+
+    runner = CliRunner()
+    result = runner.invoke(loadtest, ["--db-file", spells_db, "--workers", "2", "--requests", "20", "--seed", "3"])
+
+    assert result.exit_code == 0
+    assert "(20 searches)" in result.output
+    assert _measure(result.output, "Searches") == "20"
+    assert _measure(result.output, "Errors") == "0"
+    assert _measure(result.output, "p99").endswith(" ms")
+    assert "Reinstalls" not in result.output
+
+
+def test_loadtest_during_install(spells_db: str, spells_from: Callable[[str], List[Spell]], tmp_path: Path) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+    bundles = Path(tmp_path, "bundles")
+    bundles.mkdir()
+    shutil.copy(Path(__file__).parent.parent.joinpath("resources", "spells_a.xml.gz"), bundles)
+
+    runner = CliRunner()
+    result = runner.invoke(loadtest, ["--db-file", spells_db, "--duration", "0.5", "--during-install", str(bundles)])
+
+    assert result.exit_code == 0
+    assert _measure(result.output, "Errors") == "0"
+    assert int(_measure(result.output, "Reinstalls")) > 0
+
+
+def test_loadtest_empty(spells_db: str) -> None:
+    runner = CliRunner()
+    result = runner.invoke(loadtest, ["--db-file", spells_db, "--requests", "1"])
+
+    assert result.exit_code == 2
+    assert "The database contains no spells to draw the searches from." in result.output
+
+
+def test_loadtest_during_install_without_bundles(
+    spells_db: str, spells_from: Callable[[str], List[Spell]], tmp_path: Path
+) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+    Path(tmp_path, "empty").mkdir()
+
+    runner = CliRunner()
+    result = runner.invoke(
+        loadtest, ["--db-file", spells_db, "--requests", "5", "--during-install", str(Path(tmp_path, "empty"))]
+    )
+
+    assert result.exit_code == 2
+    assert "contains no spells to install" in result.output
+
+
+def _measure(output: str, name: str) -> str:
+    cells = next(line for line in output.splitlines() if line.startswith(f"│ {name} ")).split("│")
+    return cells[2].strip()
@@ -0,0 +1,55 @@
+import re
+from typing import Callable, List
+
+from click.testing import CliRunner
+from rich.console import Console
+
+from pycana.commands.shell import shell
+from pycana.models import Spell
+from pycana.services.database import load_db
+
+
+def test_shell(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+
+    commands = [
+        "find level=1-8",
+        "refine caster=druid",
+        "anim",
+        "criteria",
+        "view 1 3",
+        "drop name",
+        "refine bogus=1",
+        "view 9",
+        "quit",
+    ]
+
+    runner = CliRunner()
+    result = runner.invoke(shell, ["--db-file", spells_db], input="\n".join(commands) + "\n")
+
+    assert result.exit_code == 0
+
+    output = result.output
+    summaries = [re.sub(r"[0-9.]+ ms", "N ms", line) for line in output.splitlines() if " spells match (" in line]
+    assert summaries == [
+        "15 spells match (N ms).",
+        "6 spells match (narrowed, N ms).",
+        "3 spells match (narrowed, N ms).",
+        "6 spells match (N ms).",
+    ]
+    assert "name=anim level=1-8 caster=druid" in output
+    assert "This spell lets you convince a beast" in output
+    assert "Your magic turns others into beasts." in output
+    assert "Unknown criteria field: bogus" in output
+    assert "There is no result number 9." in output
+
+
+def test_shell_in_memory(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+
+    runner = CliRunner()
+    result = runner.invoke(shell, ["--db-file", spells_db, "--in-memory"], input="find name=aid\n")
+
+    assert result.exit_code == 0
+    assert result.stderr.startswith("Loaded the database into memory (")
+    assert "1 spells match (" in result.stdout
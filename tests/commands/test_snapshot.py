@@ -0,0 +1,59 @@
+from pathlib import Path
+from typing import Callable, List
+
+import pytest
+from click.testing import CliRunner
+from rich.console import Console
+
+from pycana.commands.restore import restore
+from pycana.commands.snapshot import snapshot
+from pycana.models import Spell
+from pycana.services.database import db_info, load_db
+
+
+@pytest.mark.parametrize("snapshot_name", ["spells.snapshot", "spells.snapshot.gz"])
+def test_snapshot_and_restore(
+    spells_db: str, spells_from: Callable[[str], List[Spell]], tmp_path: Path, snapshot_name: str
+) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+    snapshot_path = str(Path(tmp_path, snapshot_name))
+    restored_db = str(Path(tmp_path, "restored", "spells.db"))
+
+    runner = CliRunner()
+    result = runner.invoke(snapshot, ["--db-file", spells_db, "--output", snapshot_path])
+
+    assert result.exit_code == 0
+    assert "Wrote " in result.output
+    assert Path(snapshot_path).exists()
+
+    result = runner.invoke(restore, ["--db-file", restored_db, "--snapshot-file", snapshot_path])
+
+    assert result.exit_code == 0
+    assert "Restored 17 spells" in result.output
+    assert db_info(restored_db) == db_info(spells_db)
+
+
+def test_snapshot_missing_database(tmp_path: Path) -> None:
+    runner = CliRunner()
+    result = runner.invoke(
+        snapshot, ["--db-file", str(Path(tmp_path, "missing.db")), "--output", str(Path(tmp_path, "out"))]
+    )
+
+    assert result.exit_code == 2
+    assert "does not exist" in result.output
+    assert not Path(tmp_path, "out").exists()
+
+
+def test_restore_invalid_snapshot(spells_db: str, spells_from: Callable[[str], List[Spell]], tmp_path: Path) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+    invalid = Path(tmp_path, "invalid.snapshot")
+    invalid.write_text("not a database")
+
+    runner = CliRunner()
+    result = runner.invoke(restore, ["--db-file", spells_db, "--snapshot-file", str(invalid)])
+
+    assert result.exit_code == 1
+    assert "could not be restored" in result.output
+    # the database is left untouched
+    assert db_info(spells_db)["meta"]["total"] == 17
+    assert sorted(file.name for file in Path(spells_db).parent.iterdir() if file.name.startswith(".")) == []
@@ -12,6 +12,19 @@ from pycana.models import Spell
 from pycana.services.xml_loader import load_spells
 
 
+@pytest.fixture(autouse=True)
+def home_directory(tmp_path, monkeypatch) -> None:
+    """
+    Test fixture used to keep the files written in the user home (e.g. the parse cache) out of the real home
+    directory.
+
+    Args:
+        tmp_path: the temporary path used as the home directory.
+        monkeypatch: the fixture used to set the home directory.
+    """
+    monkeypatch.setenv("HOME", str(Path(tmp_path, "home")))
+
+
 @pytest.fixture
 def spells_db(tmp_path) -> str:
     """
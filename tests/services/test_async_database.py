@@ -0,0 +1,102 @@
+import asyncio
+import time
+from typing import Callable, List, Final
+
+import pytest
+from rich.console import Console
+
+from pycana.models import Spell, SpellCriteria
+from pycana.services.async_database import AsyncDatabase
+from pycana.services.database import load_db, find_spells, db_info
+
+# an ordering evaluating a long-running recursive count for every row
+_SLOW_SORT: Final[str] = (
+    "(WITH RECURSIVE cnt(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM cnt WHERE x < 100000000 + level) "
+    "SELECT count(*) FROM cnt)"
+)
+
+
+def test_find_spells(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+
+    async def _find() -> List[List[Spell]]:
+        async with AsyncDatabase(str(spells_db), max_workers=2) as database:
+            return await asyncio.gather(
+                database.find_spells(SpellCriteria(name="animal"), sort_by="name"),
+                database.find_spells(SpellCriteria(level="2"), sort_by="name", with_description=False),
+                database.find_spells(limit=3, sort_by="name"),
+            )
+
+    animals, level_two, limited = asyncio.run(_find())
+
+    assert animals == find_spells(spells_db, SpellCriteria(name="animal"), sort_by="name")
+    assert level_two == find_spells(spells_db, SpellCriteria(level="2"), sort_by="name", with_description=False)
+    assert [sp.name for sp in limited] == ["Acid Splash", "Aid", "Alarm"]
+
+
+def test_connections_bounded_by_workers(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+
+    async def _find() -> int:
+        async with AsyncDatabase(str(spells_db), max_workers=2) as database:
+            results = await asyncio.gather(*(database.find_spells(SpellCriteria(level="2")) for _ in range(10)))
+            assert all(len(spells) == len(results[0]) for spells in results)
+            return len(database._idle)
+
+    # the concurrent searches share the connections of the workers
+    assert asyncio.run(_find()) <= 2
+
+
+def test_db_info(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+
+    async def _info():
+        async with AsyncDatabase(str(spells_db)) as database:
+            return await database.db_info(timeout=10)
+
+    assert asyncio.run(_info()) == db_info(spells_db)
+
+
+def test_iter_spells(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+
+    async def _iterate() -> List[Spell]:
+        async with AsyncDatabase(str(spells_db)) as database:
+            return [spell async for spell in database.iter_spells(sort_by="name", batch_size=5)]
+
+    assert asyncio.run(_iterate()) == find_spells(spells_db, sort_by="name")
+
+
+def test_timeout_interrupts_query(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+
+    async def _timeout() -> List[Spell]:
+        async with AsyncDatabase(str(spells_db), max_workers=1) as database:
+            started = time.monotonic()
+            with pytest.raises(asyncio.TimeoutError):
+                await database.find_spells(sort_by=_SLOW_SORT, timeout=0.2)
+            assert time.monotonic() - started < 5
+
+            # the interrupted connection (and the single worker) are free to serve the next search
+            return await database.find_spells(SpellCriteria(name="aid"), timeout=5)
+
+    assert [sp.name for sp in asyncio.run(_timeout())] == ["Aid"]
+
+
+def test_cancel_interrupts_query(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+
+    async def _cancel() -> int:
+        async with AsyncDatabase(str(spells_db), max_workers=1) as database:
+            task = asyncio.create_task(database.find_spells(sort_by=_SLOW_SORT))
+            await asyncio.sleep(0.2)
+
+            started = time.monotonic()
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            assert time.monotonic() - started < 5
+
+            return (await database.db_info())["meta"]["total"]
+
+    assert asyncio.run(_cancel()) == 17
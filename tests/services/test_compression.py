@@ -0,0 +1,82 @@
+import bz2
+import gzip
+import lzma
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+from pycana.services.compression import ParallelGzipWriter, open_gzip_text, open_binary, find_codec
+
+
+@pytest.mark.parametrize("threads, block_size", [(1, 16), (4, 16), (4, 1024), (2, 7)])
+def test_parallel_gzip_writer(tmp_path, threads: int, block_size: int) -> None:
+    content = b"".join(f"line {i}: some spell text\n".encode("utf-8") for i in range(500))
+    gz_path = Path(tmp_path, "out.gz")
+
+    with ParallelGzipWriter(gz_path, level=6, threads=threads, block_size=block_size) as writer:
+        for i in range(0, len(content), 100):
+            writer.write(content[i : i + 100])
+
+    assert gzip.decompress(gz_path.read_bytes()) == content
+
+
+def test_parallel_gzip_writer_empty(tmp_path) -> None:
+    gz_path = Path(tmp_path, "empty.gz")
+
+    with ParallelGzipWriter(gz_path):
+        pass
+
+    # a single empty member, rather than an empty (invalid) file
+    assert gz_path.read_bytes() == gzip.compress(b"", mtime=0, compresslevel=9)
+    assert gzip.decompress(gz_path.read_bytes()) == b""
+
+
+def test_parallel_gzip_writer_invalid_level(tmp_path) -> None:
+    with pytest.raises(ValueError):
+        ParallelGzipWriter(Path(tmp_path, "bad.gz"), level=12)
+
+
+@pytest.mark.parametrize("parallel", [True, False])
+def test_open_gzip_text(tmp_path, parallel: bool) -> None:
+    gz_path = Path(tmp_path, "text.gz")
+
+    with open_gzip_text(gz_path, level=1, parallel=parallel) as file:
+        file.write("Fire Bolt\n")
+        file.write("Magic Missile ✔\n")
+
+    with gzip.open(gz_path, "rt", encoding="utf-8") as file:
+        assert file.read() == "Fire Bolt\nMagic Missile ✔\n"
+
+
+@pytest.mark.parametrize(
+    "suffix, compress",
+    [
+        (".gz", gzip.compress),
+        (".bz2", bz2.compress),
+        (".xz", lzma.compress),
+        ("", lambda data: data),
+    ],
+)
+def test_open_binary(tmp_path, suffix: str, compress) -> None:
+    content = b"<tome name='Test'></tome>" * 100
+    file_path = Path(tmp_path, f"bundle.xml{suffix}")
+    file_path.write_bytes(compress(content))
+
+    with open_binary(file_path, buffer_size=64) as file:
+        assert file.read() == content
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("spells.xml.gz", "gzip"),
+        ("spells.XML.GZ", "gzip"),
+        ("spells.xml.bz2", "bz2"),
+        ("spells.xml.xz", "xz"),
+        ("spells.xml", None),
+    ],
+)
+def test_find_codec(path: str, expected: Optional[str]) -> None:
+    codec = find_codec(path)
+    assert (codec.name if codec else None) == expected
@@ -1,3 +1,6 @@
+import sqlite3
+from contextlib import closing
+from dataclasses import replace
 from pathlib import Path
 from typing import List, Callable, Final
 
@@ -5,7 +8,24 @@ import pytest
 from rich.console import Console
 
 from pycana.models import Spell, School, Caster, SpellCriteria
-from pycana.services.database import db_info, load_db, find_spells, resolve_db_path
+from pycana.services.database import (
+    db_info,
+    load_db,
+    find_spells,
+    resolve_db_path,
+    connect,
+    ConnectionSettings,
+    rebuild_db,
+    find_description,
+    find_related,
+    iter_spell_rows,
+    create_db,
+    clear_db,
+    snapshot_db,
+    restore_db,
+    _find_sql,
+)
+from pycana.services.description_storage import CompressedText, DESCRIPTION_STORAGES, PLAIN
 
 _A_SPELL_NAMES: Final[List[str]] = [
     "Acid Splash",
@@ -141,6 +161,14 @@ def test_find_spells_mapper(spells_db: str, spells_from: Callable[[str], List[Sp
         (SpellCriteria(school="necromancy"), ["Animate Dead", "Astral Projection"]),
         (SpellCriteria(ritual=True), ["Alarm", "Animal Messenger", "Augury"]),
         (SpellCriteria(general="dead"), ["Animate Dead", "Antilife Shell"]),
+        (SpellCriteria(name="^an", level="1-2"), ["Animal Friendship", "Animal Messenger"]),
+        (
+            SpellCriteria(name="^AN", level="(2, 2, 8)"),
+            ["Animal Messenger", "Animal Shapes", "Antimagic Field", "Antipathy or Sympathy"],
+        ),
+        (SpellCriteria(name="^shell"), []),
+        (SpellCriteria(name="'s"), []),
+        (SpellCriteria(school="('Necromancy', 'NECROMANCY')"), ["Animate Dead", "Astral Projection"]),
     ],
 )
 def test_find_spells(
@@ -156,3 +184,286 @@ def test_find_spells(
 
     assert len(found_spells) == len(expected_results)
     assert set(map(lambda x: x.name, found_spells)) == set(expected_results)
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [
+        ConnectionSettings(read_only=True),
+        ConnectionSettings(immutable=True),
+        ConnectionSettings(read_only=True, mmap_size=1024 * 1024, cache_size=-4096),
+    ],
+)
+def test_connect_read_only(spells_db: str, settings: ConnectionSettings) -> None:
+    with closing(connect(str(spells_db), settings)) as conn:
+        assert conn.execute("select count(*) from spells").fetchone()[0] == 0
+
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM spells")
+
+
+def test_connect_read_only_missing_file(tmp_path) -> None:
+    db_path = Path(tmp_path, "missing.db")
+
+    with pytest.raises(sqlite3.OperationalError):
+        find_spells(str(db_path))
+
+    assert not db_path.exists()
+
+
+def test_rebuild_db(tmp_path, spells_from: Callable[[str], List[Spell]]) -> None:
+    db_path = str(Path(tmp_path, "data", "rebuilt.db"))
+
+    rebuild_db(Console(), db_path, spells_from("spells_a.xml"))
+    assert db_info(db_path)["meta"]["total"] == 17
+
+    with closing(connect(db_path, ConnectionSettings(read_only=True))) as reader:
+        reader.execute("BEGIN")
+        assert reader.execute("select count(*) from spells").fetchone()[0] == 17
+
+        rebuild_db(Console(), db_path, spells_from("spells_b.xml"))
+
+        # the open reader keeps its snapshot, while new connections see the new content
+        assert reader.execute("select count(*) from spells").fetchone()[0] == 17
+        assert db_info(db_path)["meta"]["total"] == 13
+
+    assert [file.name for file in Path(tmp_path, "data").iterdir()] == ["rebuilt.db"]
+
+
+def test_rebuild_db_permission_failure(tmp_path, spells_from: Callable[[str], List[Spell]], monkeypatch) -> None:
+    db_path = str(Path(tmp_path, "data", "rebuilt.db"))
+
+    def _failing_chmod(*_):
+        raise PermissionError("not permitted")
+
+    monkeypatch.setattr("os.chmod", _failing_chmod)
+
+    with pytest.raises(PermissionError):
+        rebuild_db(Console(), db_path, spells_from("spells_a.xml"))
+
+    # no staging file is left behind
+    assert list(Path(tmp_path, "data").iterdir()) == []
+
+
+def test_find_spells_without_description(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"), verbose=False)
+
+    found_spells = find_spells(spells_db, SpellCriteria(name="acid"), with_description=False)
+
+    assert len(found_spells) == 1
+    assert found_spells[0].description == ""
+    assert find_description(spells_db, "OGL A", "Acid Splash").startswith("You hurl a bubble of acid.")
+    assert find_description(spells_db, "OGL A", "Fireball") == ""
+
+    # description criteria are still applied
+    assert [sp.name for sp in find_spells(spells_db, SpellCriteria(description="bubble"), with_description=False)] == [
+        "Acid Splash"
+    ]
+
+
+def test_listing_uses_covering_index(spells_db: str) -> None:
+    with closing(connect(str(spells_db))) as conn:
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {_find_sql(False)} order by level, name, book").fetchall()
+
+    assert plan[0][3] == "SCAN spells USING COVERING INDEX spells_listing"
+
+
+def test_load_db_precomputes_display(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    escaped = replace(spells_from("spells_a.xml")[0], book="OGL &amp; More", name="Acid&#39;s Splash")
+    load_db(Console(), spells_db, [escaped], verbose=False)
+
+    found_spells = find_spells(spells_db, SpellCriteria(name="ACID"), with_description=False)
+
+    assert len(found_spells) == 1
+    assert found_spells[0].book == "OGL & More"
+    assert found_spells[0].name == "Acid's Splash"
+    assert found_spells[0].casters_display == "Sorcerer, Wizard"
+    assert found_spells[0].components_display == "V, S"
+    assert found_spells[0].display_components(details=True) == "V, S"
+
+
+@pytest.mark.parametrize(
+    "criteria, expected_plan",
+    [
+        (SpellCriteria(name="^anim"), "SEARCH spells USING INDEX spells_search_key (search_key>? AND search_key<?)"),
+        (SpellCriteria(level="(1, 3)"), "SEARCH spells USING COVERING INDEX spells_listing (level=?)"),
+        (SpellCriteria(level="1-3"), "SEARCH spells USING COVERING INDEX spells_listing (level>? AND level<?)"),
+        (SpellCriteria(school="('evocation', 'illusion')"), "SEARCH spells USING INDEX spells_school (school=?)"),
+    ],
+)
+def test_criteria_use_indexes(spells_db: str, criteria: SpellCriteria, expected_plan: str) -> None:
+    with closing(connect(str(spells_db))) as conn:
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {_find_sql(False)} {criteria.where()}").fetchall()
+
+    assert plan[0][3] == expected_plan
+
+
+def test_load_db_shares_duplicate_content(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    spells = spells_from("spells_a.xml")
+    reprinted = [replace(spell, book="OGL A Reprint") for spell in spells]
+
+    stats = load_db(Console(), spells_db, spells + reprinted, verbose=False)
+
+    assert stats.stored == 2 * len(spells)
+    assert stats.duplicates == len(spells)
+
+    with closing(connect(str(spells_db))) as conn:
+        assert conn.execute("select count(*) from spell_content").fetchone()[0] == len(spells)
+
+    found_spells = find_spells(spells_db, SpellCriteria(name="acid", description="bubble"), sort_by="book")
+    assert [sp.book for sp in found_spells] == ["OGL A", "OGL A Reprint"]
+    assert found_spells[0].description == found_spells[1].description == spells[0].description
+    assert find_description(spells_db, "OGL A Reprint", "Acid Splash") == spells[0].description
+
+
+@pytest.mark.parametrize("storage", DESCRIPTION_STORAGES)
+@pytest.mark.parametrize(
+    "criteria",
+    [
+        SpellCriteria(description="bubble"),
+        SpellCriteria(description="('ACID', 'spell attack')"),
+        SpellCriteria(description="^you"),
+        SpellCriteria(description="of"),
+        SpellCriteria(general="creature", level="0-5"),
+    ],
+)
+def test_description_storage(
+    tmp_path, spells_db: str, spells_from: Callable[[str], List[Spell]], storage: str, criteria: SpellCriteria
+) -> None:
+    spells = spells_from("spells_a.xml")
+    load_db(Console(), spells_db, spells)
+
+    db_path = str(Path(tmp_path, f"{storage}.db"))
+    create_db(db_path, storage)
+    stats = load_db(Console(), db_path, spells)
+
+    assert stats.text_size == sum(len(spell.description.encode("utf-8")) for spell in spells)
+    assert stats.stored_size == stats.text_size if storage == PLAIN else stats.stored_size < stats.text_size / 2
+
+    found_spells = find_spells(db_path, criteria, sort_by="name")
+    assert len(found_spells) > 0
+    assert found_spells == find_spells(spells_db, criteria, sort_by="name")
+    assert find_spells(db_path, criteria, sort_by="name", with_description=False) == find_spells(
+        spells_db, criteria, sort_by="name", with_description=False
+    )
+    assert find_description(db_path, "OGL A", "Aid") == find_description(spells_db, "OGL A", "Aid")
+    assert list(iter_spell_rows(db_path, criteria)) == list(iter_spell_rows(spells_db, criteria))
+
+
+@pytest.mark.parametrize("storage", DESCRIPTION_STORAGES[1:])
+def test_compressed_description_is_lazy(tmp_path, spells_from: Callable[[str], List[Spell]], storage: str) -> None:
+    db_path = str(Path(tmp_path, f"{storage}.db"))
+    create_db(db_path, storage)
+    load_db(Console(), db_path, spells_from("spells_a.xml"))
+
+    spell = find_spells(db_path, SpellCriteria(name="acid"))[0]
+
+    assert isinstance(vars(spell)["_description"], CompressedText)
+    assert spell.description.startswith("You hurl a bubble of acid.")
+    assert vars(spell)["_description"] == spell.description
+
+    clear_db(db_path)
+    assert find_spells(db_path, SpellCriteria(description="acid")) == []
+
+    load_db(Console(), db_path, spells_from("spells_b.xml"))
+    assert [sp.name for sp in find_spells(db_path, SpellCriteria(description="bubble"))] == []
+    assert len(find_spells(db_path, SpellCriteria(description="blind"))) > 0
+
+
+def test_invalid_description_storage(tmp_path) -> None:
+    with pytest.raises(ValueError, match="must be one of plain, zlib, zdict"):
+        create_db(str(Path(tmp_path, "invalid.db")), "lz4")
+
+
+def test_compressed_description_criteria_use_text_index(tmp_path, spells_from: Callable[[str], List[Spell]]) -> None:
+    db_path = str(Path(tmp_path, "zlib.db"))
+    create_db(db_path, "zlib")
+    load_db(Console(), db_path, spells_from("spells_a.xml"))
+
+    with closing(connect(db_path)) as conn:
+        plan = conn.execute(
+            f"EXPLAIN QUERY PLAN {_find_sql(False)} {SpellCriteria(description='bubble').where()}"
+        ).fetchall()
+
+    assert any(step[3].startswith("SCAN spell_search VIRTUAL TABLE INDEX 0:L") for step in plan)
+
+
+def test_related_spells(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    spells = spells_from("spells_a.xml")
+    load_db(Console(), spells_db, spells)
+
+    assert find_related(spells_db, "OGL A", "Alarm")[0] == ("OGL A", "Arcane Lock")
+    assert find_related(spells_db, "OGL A", "Animal Friendship")[0] == ("OGL A", "Animal Messenger")
+    assert len(find_related(spells_db, "OGL A", "Aid")) == 5
+    assert find_related(spells_db, "OGL A", "Missing") == []
+
+    # the spells loaded later are related to the earlier ones, but never the same spell from another book
+    load_db(Console(), spells_db, [replace(spell, book="OGL A Reprint") for spell in spells])
+
+    related = find_related(spells_db, "OGL A Reprint", "Alarm")
+    assert ("OGL A", "Arcane Lock") in related
+    assert all(name != "Alarm" for _, name in related)
+
+
+def test_related_spells_not_computed(tmp_path) -> None:
+    # a database from before the related spells
+    db_path = str(Path(tmp_path, "old.db"))
+    sqlite3.connect(db_path).close()
+
+    assert find_related(db_path, "OGL A", "Alarm") == []
+
+
+@pytest.mark.parametrize("snapshot_name", ["spells.snapshot", "spells.snapshot.gz"])
+def test_snapshot_and_restore(tmp_path, spells_from: Callable[[str], List[Spell]], snapshot_name: str) -> None:
+    db_path = str(Path(tmp_path, "spells.db"))
+    snapshot_path = str(Path(tmp_path, "snapshots", snapshot_name))
+    Path(snapshot_path).parent.mkdir()
+    rebuild_db(Console(), db_path, spells_from("spells_a.xml"))
+
+    snapshot_db(db_path, snapshot_path)
+    assert [file.name for file in Path(snapshot_path).parent.iterdir()] == [snapshot_name]
+
+    restored_path = str(Path(tmp_path, "restored.db"))
+    restore_db(snapshot_path, restored_path)
+    assert find_spells(restored_path) == find_spells(db_path)
+    assert find_related(restored_path, "OGL A", "Alarm") == find_related(db_path, "OGL A", "Alarm")
+
+    # the snapshot carries the query planner statistics
+    with closing(connect(restored_path, ConnectionSettings(read_only=True))) as conn:
+        assert conn.execute("SELECT count(*) FROM sqlite_stat1").fetchone()[0] > 0
+
+
+def test_restore_db_replaces_atomically(tmp_path, spells_from: Callable[[str], List[Spell]]) -> None:
+    db_path = str(Path(tmp_path, "data", "spells.db"))
+    snapshot_path = str(Path(tmp_path, "b.snapshot.gz"))
+    rebuild_db(Console(), db_path, spells_from("spells_b.xml"))
+    snapshot_db(db_path, snapshot_path)
+    rebuild_db(Console(), db_path, spells_from("spells_a.xml"))
+
+    with closing(connect(db_path, ConnectionSettings(read_only=True))) as reader:
+        reader.execute("BEGIN")
+        assert reader.execute("select count(*) from spells").fetchone()[0] == 17
+
+        restore_db(snapshot_path, db_path)
+
+        # the open reader keeps its snapshot, while new connections see the restored content
+        assert reader.execute("select count(*) from spells").fetchone()[0] == 17
+        assert db_info(db_path)["meta"]["total"] == 13
+
+    assert [file.name for file in Path(tmp_path, "data").iterdir()] == ["spells.db"]
+
+
+@pytest.mark.parametrize("content", [b"not a database", b""])
+def test_restore_db_rejects_invalid_snapshot(
+    tmp_path, spells_from: Callable[[str], List[Spell]], content: bytes
+) -> None:
+    db_path = str(Path(tmp_path, "data", "spells.db"))
+    rebuild_db(Console(), db_path, spells_from("spells_a.xml"))
+    snapshot_path = Path(tmp_path, "invalid.snapshot")
+    snapshot_path.write_bytes(content)
+
+    with pytest.raises(ValueError):
+        restore_db(str(snapshot_path), db_path)
+
+    assert db_info(db_path)["meta"]["total"] == 17
+    assert [file.name for file in Path(tmp_path, "data").iterdir()] == ["spells.db"]
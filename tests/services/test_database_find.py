@@ -1,10 +1,25 @@
-from typing import Callable, List
+from pathlib import Path
+from typing import Callable, List, Optional
 
 import pytest
 from rich.console import Console
 
-from pycana.models import Spell, SpellCriteria
-from pycana.services.database import load_db, find_spells
+from pycana.models import Spell, SpellCriteria, Caster
+from pycana.services import database
+from pycana.services.database import (
+    load_db,
+    find_spells,
+    find_spells_many,
+    spell_listing,
+    find_spells_fuzzy,
+    find_spells_across,
+    db_info_across,
+    create_db,
+    count_spells,
+    spell_facets,
+    db_info,
+)
+from pycana.services.description_storage import DESCRIPTION_STORAGES
 
 
 # TODO: more testing
@@ -126,3 +141,195 @@ def test_find_with_caster_general(
 
     assert len(found_spells) == len(expected_spells)
     assert set(map(lambda x: x.name, found_spells)) == set(expected_spells)
+
+
+@pytest.mark.parametrize("limit, sort_by", [(None, None), (2, "name desc"), (None, "level, name")])
+def test_find_spells_many(
+    spells_db: str,
+    spells_from: Callable[[str], List[Spell]],
+    limit: Optional[int],
+    sort_by: Optional[str],
+) -> None:
+    available_spells = spells_from("spells_a.xml") + spells_from("spells_b.xml") + spells_from("spells_c.xml")
+    load_db(Console(), spells_db, available_spells, verbose=False)
+
+    criteria_list = [SpellCriteria(caster=caster.name, level=str(level)) for caster in Caster for level in range(10)]
+    criteria_list += [None, SpellCriteria(), SpellCriteria(caster="wizard", level="0"), SpellCriteria(general="heal")]
+
+    found = list(find_spells_many(spells_db, criteria_list, limit=limit, sort_by=sort_by))
+
+    assert len(found) == len(criteria_list)
+    for criteria, spells in zip(criteria_list, found):
+        expected = find_spells(spells_db, criteria, limit=limit, sort_by=sort_by)
+        if sort_by:
+            assert spells == expected
+        else:
+            assert sorted(map(str, spells)) == sorted(map(str, expected))
+
+
+def test_spell_listing(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    available_spells = spells_from("spells_a.xml") + spells_from("spells_b.xml") + spells_from("spells_c.xml")
+    load_db(Console(), spells_db, available_spells, verbose=False)
+
+    listing = spell_listing(
+        spells_db, [Caster.WIZARD, Caster.CLERIC], SpellCriteria(school="('evocation', 'abjuration')")
+    )
+
+    assert list(listing.keys()) == [Caster.WIZARD, Caster.CLERIC]
+
+    # every cell matches the equivalent find query
+    for caster, levels in listing.items():
+        for level, spells in levels.items():
+            criteria = SpellCriteria(caster=caster.name, level=str(level), school="('evocation', 'abjuration')")
+            assert spells == find_spells(spells_db, criteria, sort_by="name, book", with_description=False)
+
+    limited = spell_listing(spells_db, number=1)
+    assert all(len(spells) == 1 for levels in limited.values() for spells in levels.values())
+
+
+@pytest.mark.parametrize(
+    "text, criteria, expected_first",
+    [
+        ("animate ded", None, "Animate Dead"),
+        ("AnimateDead", None, "Animate Dead"),
+        ("arcane i", None, "Arcane Eye"),
+        ("cone of colde", None, "Cone of Cold"),
+        ("conjure elementals", SpellCriteria(level="(5,)"), "Conjure Elemental"),
+        ("cure wunds", None, "Cure Wounds"),
+    ],
+)
+def test_find_spells_fuzzy(
+    spells_db: str,
+    spells_from: Callable[[str], List[Spell]],
+    text: str,
+    criteria: Optional[SpellCriteria],
+    expected_first: str,
+) -> None:
+    available_spells = spells_from("spells_a.xml") + spells_from("spells_b.xml") + spells_from("spells_c.xml")
+    load_db(Console(), spells_db, available_spells, verbose=False)
+
+    found_spells = find_spells_fuzzy(spells_db, text, criteria, limit=5)
+
+    assert 0 < len(found_spells) <= 5
+    assert found_spells[0].name == expected_first
+
+
+@pytest.mark.parametrize("criteria", [SpellCriteria(level="8"), SpellCriteria(level="(7, 8)", description="beast")])
+def test_find_spells_fuzzy_criteria_before_cut(
+    spells_db: str, spells_from: Callable[[str], List[Spell]], monkeypatch, criteria: SpellCriteria
+) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"), verbose=False)
+
+    # with a single candidate kept, it must be the one matching the criteria
+    monkeypatch.setattr(database, "_FUZZY_MIN_CANDIDATES", 1)
+
+    assert [spell.name for spell in find_spells_fuzzy(spells_db, "animal", criteria)] == ["Animal Shapes"]
+
+
+def test_find_spells_fuzzy_no_match(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"), verbose=False)
+
+    assert find_spells_fuzzy(spells_db, "xyzzy") == []
+    assert find_spells_fuzzy(spells_db, "  ") == []
+
+
+def _federated_dbs(tmp_path, spells_from: Callable[[str], List[Spell]]) -> List[str]:
+    # each database stores its descriptions differently
+    db_paths = []
+    for name, storage in zip(["spells_a.xml", "spells_b.xml", "spells_c.xml"], DESCRIPTION_STORAGES):
+        db_path = str(Path(tmp_path, f"{name}.db"))
+        create_db(db_path, storage)
+        load_db(Console(), db_path, spells_from(name))
+        db_paths.append(db_path)
+    return db_paths
+
+
+@pytest.mark.parametrize(
+    "criteria, limit, sort_by",
+    [
+        (None, None, "name"),
+        (None, 5, "name"),
+        (SpellCriteria(level="(1, 2)"), 7, "level desc, name"),
+        (SpellCriteria(caster="wizard"), 4, "length(name), name desc"),
+        (SpellCriteria(description="creature"), 10, "book, level, name"),
+        (SpellCriteria(general="('fire', 'acid')"), None, "name"),
+    ],
+)
+def test_find_spells_across(
+    tmp_path,
+    spells_from: Callable[[str], List[Spell]],
+    criteria: Optional[SpellCriteria],
+    limit: Optional[int],
+    sort_by: str,
+) -> None:
+    db_paths = _federated_dbs(tmp_path, spells_from)
+
+    # the same spells, as if they were all in one database
+    combined_db = str(Path(tmp_path, "combined.db"))
+    create_db(combined_db)
+    load_db(Console(), combined_db, [spell for name in ["a", "b", "c"] for spell in spells_from(f"spells_{name}.xml")])
+
+    found_spells = find_spells_across(db_paths, criteria, limit, sort_by, with_description=False)
+
+    assert found_spells == find_spells(combined_db, criteria, limit, sort_by, with_description=False)
+    assert limit is None or len(found_spells) == limit
+
+
+def test_find_spells_across_unsorted(tmp_path, spells_from: Callable[[str], List[Spell]]) -> None:
+    db_paths = _federated_dbs(tmp_path, spells_from)
+
+    found_spells = find_spells_across(db_paths, SpellCriteria(name="li"))
+
+    assert sorted(sp.name for sp in found_spells) == [
+        "Antilife Shell",
+        "Blight",
+        "Blindness or Deafness",
+        "Blink",
+        "Call Lightning",
+        "Chain Lightning",
+    ]
+    assert all(sp.description for sp in found_spells)
+
+
+def test_db_info_across(tmp_path, spells_from: Callable[[str], List[Spell]]) -> None:
+    db_paths = _federated_dbs(tmp_path, spells_from)
+
+    info = db_info_across(db_paths)
+
+    assert info["meta"]["total"] == sum(len(spells_from(f"spells_{name}.xml")) for name in ["a", "b", "c"])
+    assert sum(info["levels"].values()) == info["meta"]["total"]
+
+
+def test_find_spells_across_too_many(tmp_path) -> None:
+    with pytest.raises(ValueError, match="Between 1 and 11 database files"):
+        find_spells_across([str(Path(tmp_path, f"{idx}.db")) for idx in range(12)])
+
+
+@pytest.mark.parametrize(
+    "criteria",
+    [None, SpellCriteria(level="1-3"), SpellCriteria(caster="wizard", ritual=True), SpellCriteria(general="creature")],
+)
+def test_count_and_facets(
+    monkeypatch, spells_db: str, spells_from: Callable[[str], List[Spell]], criteria: Optional[SpellCriteria]
+) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+    spells = find_spells(spells_db, criteria)
+
+    # the aggregates never build spells
+    monkeypatch.setattr(Spell, "from_row", lambda row: pytest.fail("a spell was built"))
+
+    facets = spell_facets(spells_db, criteria)
+
+    assert count_spells(spells_db, criteria) == len(spells)
+    assert facets["meta"]["total"] == len(spells)
+    assert sum(facets["levels"].values()) == len(spells)
+    assert facets["schools"] == {
+        school: len([sp for sp in spells if sp.school.name == school]) for school in {sp.school.name for sp in spells}
+    }
+    assert facets["casters"] == {
+        caster.name: len([sp for sp in spells if caster in sp.casters])
+        for caster in {caster for sp in spells for caster in sp.casters}
+    }
+
+    if criteria is None:
+        assert facets == {group: dict(sorted(counts.items())) for group, counts in db_info(spells_db).items()}
@@ -0,0 +1,83 @@
+from pathlib import Path
+from typing import Callable, List
+
+import pytest
+from rich.console import Console
+
+from pycana.models import Spell, SpellCriteria
+from pycana.services.database import (
+    load_db,
+    find_spells,
+    find_description,
+    count_spells,
+    spell_facets,
+    db_info,
+    rebuild_db,
+)
+from pycana.services.database_session import Database
+
+
+@pytest.mark.parametrize("in_memory", [True, False])
+def test_database(spells_db: str, spells_from: Callable[[str], List[Spell]], in_memory: bool) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+    criteria = SpellCriteria(level="1-3", description="creature")
+
+    with Database(str(spells_db), in_memory=in_memory) as database:
+        assert database.find_spells(criteria, sort_by="name") == find_spells(spells_db, criteria, sort_by="name")
+        assert database.find_spells(limit=2, with_description=False) == find_spells(
+            spells_db, limit=2, with_description=False
+        )
+        assert database.find_description("OGL A", "Aid") == find_description(spells_db, "OGL A", "Aid")
+        assert database.count_spells(criteria) == count_spells(spells_db, criteria)
+        assert database.spell_facets(criteria) == spell_facets(spells_db, criteria)
+        assert database.db_info() == db_info(spells_db)
+
+        if in_memory:
+            assert database.load_cost is not None
+            assert database.load_cost.size >= Path(spells_db).stat().st_size
+        else:
+            assert database.load_cost is None
+
+    with pytest.raises(RuntimeError, match="has been closed"):
+        database.count_spells()
+
+
+@pytest.mark.parametrize("in_memory", [True, False])
+def test_database_reloads(tmp_path, spells_from: Callable[[str], List[Spell]], in_memory: bool) -> None:
+    db_path = str(Path(tmp_path, "spells.db"))
+    rebuild_db(Console(), db_path, spells_from("spells_a.xml"))
+
+    with Database(db_path, in_memory=in_memory) as database:
+        assert database.count_spells() == len(spells_from("spells_a.xml"))
+
+        # a new install replaces the file
+        rebuild_db(Console(), db_path, spells_from("spells_b.xml"))
+        assert database.count_spells() == len(spells_from("spells_b.xml"))
+
+        # and loading into the database modifies it in place
+        load_db(Console(), db_path, spells_from("spells_c.xml"))
+        assert database.count_spells() == len(spells_from("spells_b.xml")) + len(spells_from("spells_c.xml"))
+
+
+def test_database_refine(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+
+    refinements = [
+        (SpellCriteria(name="an"), False),
+        (SpellCriteria(name="ani"), True),
+        (SpellCriteria(name="ani", caster="druid"), True),
+        (SpellCriteria(name="anim", caster="druid", level="(1, 8)"), True),
+        (SpellCriteria(name="anim", level="(1, 8)"), False),
+        (SpellCriteria(name="anim", level="(1, 8)", description="animal"), True),
+    ]
+
+    with Database(str(spells_db)) as database:
+        for criteria, expected_narrowed in refinements:
+            spells, narrowed = database.refine(criteria, sort_by="name")
+
+            assert narrowed == expected_narrowed
+            assert spells == find_spells(spells_db, criteria, sort_by="name", with_description=False)
+
+        # a reloaded database starts over
+        load_db(Console(), spells_db, spells_from("spells_b.xml"))
+        assert database.refine(SpellCriteria(name="anim", level="1", description="animal"), sort_by="name")[1] is False
@@ -0,0 +1,55 @@
+import zlib
+
+import pytest
+
+from pycana.services.description_storage import (
+    CompressedText,
+    compress_description,
+    decompress_description,
+    description_text,
+    register_dictionary,
+    train_dictionary,
+)
+
+_TEXTS = [
+    "You hurl a bubble of acid. Choose one creature within range, or choose two creatures within range.",
+    "A creature of your choice that you can see within range must make a Wisdom saving throw.",
+    "Choose one creature within range. The creature must make a Constitution saving throw.",
+]
+
+
+def test_train_dictionary() -> None:
+    dictionary = train_dictionary(_TEXTS)
+
+    assert b"Choose one creature within" in dictionary
+    assert b"saving throw" in dictionary
+    assert b"bubble" not in dictionary
+    assert len(train_dictionary(_TEXTS, size=20)) <= 20
+    assert train_dictionary(["nothing is repeated here"]) == b""
+
+
+def test_compress_with_dictionary() -> None:
+    dictionary = train_dictionary(_TEXTS)
+    register_dictionary(dictionary)
+
+    for text in _TEXTS:
+        compressed = compress_description(text, dictionary)
+
+        assert len(compressed) < len(compress_description(text))
+        assert decompress_description(compressed) == text
+        assert str(CompressedText(compressed)) == text
+        assert description_text(compressed) == text
+
+
+def test_compress_without_dictionary() -> None:
+    compressed = compress_description(_TEXTS[0])
+
+    assert zlib.decompress(compressed).decode("utf-8") == _TEXTS[0]
+    assert decompress_description(compressed) == _TEXTS[0]
+    assert description_text(_TEXTS[0]) == _TEXTS[0]
+    assert description_text(None) is None
+
+
+def test_decompress_unknown_dictionary() -> None:
+    with pytest.raises(ValueError, match="unknown dictionary"):
+        decompress_description(compress_description(_TEXTS[0], b"an unregistered dictionary"))
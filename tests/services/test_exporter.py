@@ -0,0 +1,60 @@
+import csv
+import gzip
+import json
+from pathlib import Path
+from typing import Callable, List
+
+import pytest
+from rich.console import Console
+
+from pycana.models import Spell
+from pycana.services.database import load_db, iter_spell_rows, find_spells
+from pycana.services.exporter import export_rows, open_export_file
+from pycana.services.xml_loader import load_spells
+
+
+def test_export_jsonl(tmp_path, spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+    export_path = str(Path(tmp_path, "export.jsonl"))
+
+    with open_export_file(export_path) as export_file:
+        assert export_rows(iter_spell_rows(spells_db, sort_by="name"), export_file, "jsonl") == 17
+
+    with open(export_path, encoding="utf-8") as export_file:
+        records = [json.loads(line) for line in export_file]
+
+    assert records == [spell.to_dict() for spell in find_spells(spells_db, sort_by="name")]
+
+
+def test_export_csv(tmp_path, spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+    export_path = str(Path(tmp_path, "export.csv.gz"))
+
+    with open_export_file(export_path, compression_level=1, parallel_compression=True) as export_file:
+        assert export_rows(iter_spell_rows(spells_db), export_file, "csv") == 17
+
+    with gzip.open(export_path, "rt", encoding="utf-8", newline="") as export_file:
+        rows = list(csv.reader(export_file))
+
+    assert len(rows) == 18
+    assert rows[0][0:3] == ["book", "name", "level"]
+    assert rows[1][0:3] == ["OGL A", "Acid Splash", "0"]
+    assert rows[1][10].startswith("You hurl a bubble of acid.\n\nChoose one creature")
+
+
+def test_export_xml(tmp_path, spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    spells = spells_from("spells_a.xml") + spells_from("spells_b.xml")
+    spells[0].description += " Beware the ]]> sequence."
+    load_db(Console(), spells_db, spells)
+    export_path = str(Path(tmp_path, "export.xml"))
+
+    with open_export_file(export_path) as export_file:
+        assert export_rows(iter_spell_rows(spells_db, sort_by="book, name"), export_file, "xml") == 30
+
+    # the exported bundle can be loaded again
+    assert load_spells(Console(), export_path) == find_spells(spells_db, sort_by="book, name")
+
+
+def test_export_unsupported(tmp_path) -> None:
+    with pytest.raises(ValueError):
+        export_rows([], open_export_file(str(Path(tmp_path, "export.pdf"))), "pdf")
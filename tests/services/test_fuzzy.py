@@ -0,0 +1,41 @@
+import pytest
+
+from pycana.services.fuzzy import fuzzy_key, trigrams, edit_distance, similarity
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Fire Ball", "fireball"),
+        ("fireball", "fireball"),
+        ("Antipathy/Sympathy", "antipathysympathy"),
+        ("Tasha&#39;s Laughter", "tashaslaughter"),
+        ("", ""),
+    ],
+)
+def test_fuzzy_key(text: str, expected: str) -> None:
+    assert fuzzy_key(text) == expected
+
+
+def test_trigrams() -> None:
+    assert trigrams("aid") == {"  a", " ai", "aid", "id "}
+    assert trigrams("a") == {"  a", " a "}
+    assert trigrams("") == set()
+
+
+@pytest.mark.parametrize(
+    "first, second, expected",
+    [("fireball", "fireball", 0), ("firebal", "fireball", 1), ("kitten", "sitting", 3), ("", "abc", 3)],
+)
+def test_edit_distance(first: str, second: str, expected: int) -> None:
+    assert edit_distance(first, second) == expected
+    assert edit_distance(second, first) == expected
+
+
+def test_similarity() -> None:
+    assert similarity("fireball", "fireball", len(trigrams("fireball"))) == 1.0
+    assert similarity("", "fireball", 0) == 0.0
+
+    typo = similarity("firebal", "fireball", len(trigrams("firebal") & trigrams("fireball")))
+    other = similarity("firebal", "firebolt", len(trigrams("firebal") & trigrams("firebolt")))
+    assert 1.0 > typo > other
@@ -0,0 +1,81 @@
+from typing import Callable, List
+
+import pytest
+from rich.console import Console
+
+from pycana.models import Spell
+from pycana.services.database import load_db
+from pycana.services import loadtest
+from pycana.services.loadtest import LoadTestResult, criteria_mix, run_load_test
+
+
+def test_criteria_mix(spells_from: Callable[[str], List[Spell]]) -> None:
+    spells = spells_from("spells_a.xml")
+
+    mix = criteria_mix(spells, size=50, seed=7)
+
+    assert len(mix) == 50
+    assert mix == criteria_mix(spells, size=50, seed=7)
+    assert any(criteria.name is not None and criteria.name.startswith("^") for criteria in mix)
+    assert any(criteria.level is not None for criteria in mix)
+
+
+def test_percentile() -> None:
+    result = LoadTestResult(requests=100, errors=0, seconds=2.0, latencies=[idx / 1000 for idx in range(1, 101)])
+
+    assert result.throughput == 50.0
+    assert result.percentile(50) == 0.05
+    assert result.percentile(95) == 0.095
+    assert result.percentile(99) == 0.099
+    assert result.percentile(100) == 0.1
+    assert LoadTestResult(requests=0, errors=0, seconds=0.0, latencies=[]).percentile(50) == 0.0
+
+
+@pytest.mark.parametrize("processes", [False, True])
+def test_run_load_test(spells_db: str, spells_from: Callable[[str], List[Spell]], processes: bool) -> None:
+    spells = spells_from("spells_a.xml")
+    load_db(Console(), spells_db, spells)
+
+    result = run_load_test(str(spells_db), criteria_mix(spells, seed=1), workers=3, processes=processes, requests=31)
+
+    assert result.requests == 31
+    assert result.errors == 0
+    assert result.latencies == sorted(result.latencies)
+    assert result.reinstalls == 0
+
+
+def test_run_load_test_during_install(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    spells = spells_from("spells_a.xml")
+    load_db(Console(), spells_db, spells)
+
+    result = run_load_test(str(spells_db), criteria_mix(spells, seed=1), workers=2, duration=0.5, install_spells=spells)
+
+    # the installs replace the database atomically, so no search ever fails
+    assert result.reinstalls > 0
+    assert result.requests > 0
+    assert result.errors == 0
+
+
+def test_run_load_test_install_failure(spells_db: str, spells_from: Callable[[str], List[Spell]], monkeypatch) -> None:
+    spells = spells_from("spells_a.xml")
+    load_db(Console(), spells_db, spells)
+
+    def _failing_rebuild(*_, **__):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(loadtest, "rebuild_db", _failing_rebuild)
+
+    # the searches were not measured during installs, so the test fails
+    with pytest.raises(RuntimeError, match="disk full"):
+        run_load_test(str(spells_db), criteria_mix(spells, seed=1), workers=2, duration=0.2, install_spells=spells)
+
+
+def test_run_load_test_invalid(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    with pytest.raises(ValueError, match="needs criteria"):
+        run_load_test(str(spells_db), [], requests=1)
+
+    with pytest.raises(ValueError, match="needs a duration"):
+        run_load_test(str(spells_db), criteria_mix(spells_from("spells_a.xml")))
+
+    with pytest.raises(ValueError, match="needs spells"):
+        run_load_test(str(spells_db), criteria_mix(spells_from("spells_a.xml")), requests=1, install_spells=[])
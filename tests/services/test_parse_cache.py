@@ -0,0 +1,112 @@
+import os
+import shutil
+from pathlib import Path
+from typing import List
+
+from rich.console import Console
+
+from pycana.models import Spell
+from pycana.services.parse_cache import ParseCache
+from pycana.services.xml_loader import load_spells
+
+_RESOURCES = Path(__file__).parent.parent.joinpath("resources")
+
+
+class _Parser:
+    # parses a bundle, counting the calls
+    def __init__(self, bundle: Path) -> None:
+        self.bundle = bundle
+        self.calls = 0
+
+    def __call__(self) -> List[Spell]:
+        self.calls += 1
+        return load_spells(Console(), str(self.bundle))
+
+
+def _bundle(tmp_path: Path, name: str, target: str = "bundle.xml") -> Path:
+    path = Path(tmp_path, target)
+    shutil.copy(Path(_RESOURCES, name), path)
+    return path
+
+
+def test_parse_cache(tmp_path: Path) -> None:
+    cache = ParseCache(str(Path(tmp_path, "cache")))
+    parser = _Parser(_bundle(tmp_path, "spells_a.xml"))
+
+    assert not cache.is_cached(str(parser.bundle))
+    parsed = cache.load(str(parser.bundle), parser)
+    assert cache.is_cached(str(parser.bundle))
+    cached = cache.load(str(parser.bundle), parser)
+
+    assert parser.calls == 1
+    assert cached == parsed
+    assert len(cached) == 17
+
+    # a copy of the bundle has the same content
+    copy = _Parser(_bundle(tmp_path, "spells_a.xml", "copy.xml"))
+    assert cache.load(str(copy.bundle), copy) == parsed
+    assert copy.calls == 0
+
+    # a changed bundle is parsed again
+    _bundle(tmp_path, "spells_b.xml")
+    assert cache.load(str(parser.bundle), parser) != parsed
+    assert parser.calls == 2
+
+    cache.clear()
+    assert not cache.is_cached(str(copy.bundle))
+
+
+def test_parse_cache_eviction(tmp_path: Path) -> None:
+    # the three bundles take 23 KiB once cached
+    cache = ParseCache(str(Path(tmp_path, "cache")), max_size=20 * 1024)
+    parsers = [_Parser(_bundle(tmp_path, f"spells_{name}.xml", f"{name}.xml")) for name in "abc"]
+
+    cache.load(str(parsers[0].bundle), parsers[0])
+    cache.load(str(parsers[1].bundle), parsers[1])
+    # the first bundle was used last
+    os.utime(cache._entry(str(parsers[1].bundle)), ns=(0, 1_000_000_000))
+    cache.load(str(parsers[2].bundle), parsers[2])
+
+    assert sum(path.stat().st_size for path in cache.directory.glob("*.spells")) <= cache.max_size
+    assert cache.is_cached(str(parsers[0].bundle))
+    assert not cache.is_cached(str(parsers[1].bundle))
+    assert cache.is_cached(str(parsers[2].bundle))
+
+
+def test_parse_cache_damaged(tmp_path: Path) -> None:
+    cache = ParseCache(str(Path(tmp_path, "cache")))
+    parser = _Parser(_bundle(tmp_path, "spells_a.xml"))
+    cache.load(str(parser.bundle), parser)
+
+    for entry in cache.directory.glob("*.spells"):
+        entry.write_bytes(b"damaged")
+    Path(cache.directory, "index.json").write_text("{", encoding="utf-8")
+
+    assert len(cache.load(str(parser.bundle), parser)) == 17
+    assert parser.calls == 2
+    assert cache.load(str(parser.bundle), parser)
+    assert parser.calls == 2
+
+
+def test_parse_cache_unwritable(tmp_path: Path) -> None:
+    # the cache directory cannot be created
+    Path(tmp_path, "file").write_text("", encoding="utf-8")
+    cache = ParseCache(str(Path(tmp_path, "file", "cache")))
+    parser = _Parser(_bundle(tmp_path, "spells_a.xml"))
+
+    assert len(cache.load(str(parser.bundle), parser)) == 17
+    assert len(cache.load(str(parser.bundle), parser)) == 17
+    assert parser.calls == 2
+
+
+def test_load_spells_cached(tmp_path: Path, monkeypatch) -> None:
+    output: List[str] = []
+    console = Console()
+    monkeypatch.setattr(console, "print", lambda *args, **_: output.append(args[0]))
+
+    cache = ParseCache(str(Path(tmp_path, "cache")))
+    bundle = str(Path(_RESOURCES, "spells_a.xml.gz"))
+
+    assert load_spells(console, bundle, verbose=True, parse_cache=cache) == load_spells(console, bundle)
+    assert len(load_spells(console, bundle, verbose=True, parse_cache=cache)) == 17
+    assert output[-1] == f" ∟ Loaded 17 spells from {bundle} (cached)."
@@ -0,0 +1,110 @@
+import json
+from pathlib import Path
+from typing import Callable, List
+
+from rich.console import Console
+
+from pycana.models import Spell, SpellCriteria
+from pycana.services.database import ConnectionSettings, find_spells, find_description, load_db
+from pycana.services import query_metrics
+from pycana.services.query_metrics import QueryMetrics, is_full_scan, statement_shape
+
+
+def test_statement_shape() -> None:
+    assert statement_shape("SELECT * FROM spells\n  WHERE name LIKE '%it''s%' AND level IN (1, 2, 3)") == (
+        "SELECT * FROM spells WHERE name LIKE ? AND level IN (?, ...)"
+    )
+    assert statement_shape("SELECT * FROM db1.spells WHERE level = -1 LIMIT 10") == (
+        "SELECT * FROM db1.spells WHERE level = ? LIMIT ?"
+    )
+
+
+def test_is_full_scan() -> None:
+    assert is_full_scan(["SCAN spells"])
+    assert is_full_scan(["SEARCH spells USING INDEX spells_level (level=?)", "SCAN spell_content"])
+    assert not is_full_scan(["SEARCH spells USING INDEX spells_level (level=?)", "USE TEMP B-TREE FOR ORDER BY"])
+    assert not is_full_scan(["SCAN CONSTANT ROW", "SCAN (subquery-1)", "SCAN spell_search VIRTUAL TABLE INDEX 0:M2"])
+
+
+def test_query_metrics(tmp_path: Path) -> None:
+    slow_log = str(Path(tmp_path, "slow.log"))
+    metrics = QueryMetrics(slow_threshold=0.01, slow_log_path=slow_log)
+
+    metrics.record("SELECT * FROM spells WHERE level = 1", 3, 0.0002)
+    metrics.record("SELECT * FROM spells WHERE level = 2", 5, 0.002)
+    metrics.record("SELECT * FROM spells WHERE name LIKE '%x%'", 1, 2.0, full_scan=True)
+
+    statements = metrics.statements()
+    level = statements["SELECT * FROM spells WHERE level = ?"]
+    assert (level.count, level.rows, level.full_scans, level.slow) == (2, 8, 0, 0)
+    assert level.buckets[:4] == [1, 0, 1, 0]
+    assert statements["SELECT * FROM spells WHERE name LIKE ?"].buckets[-1] == 1
+
+    logged = Path(slow_log).read_text(encoding="utf-8").splitlines()
+    assert len(logged) == 1
+    assert logged[0].endswith("\t2000.0 ms\t1 rows\tfull scan\tSELECT * FROM spells WHERE name LIKE ?")
+
+    dumped = json.loads(metrics.to_json())
+    assert dumped["statements"][0]["statement"] == "SELECT * FROM spells WHERE name LIKE ?"
+    assert dumped["statements"][1]["count"] == 2
+
+    prometheus = metrics.to_prometheus().splitlines()
+    label = 'statement="SELECT * FROM spells WHERE level = ?"'
+    assert "# TYPE pycana_query_duration_seconds histogram" in prometheus
+    assert f'pycana_query_duration_seconds_bucket{{{label},le="0.0005"}} 1' in prometheus
+    assert f'pycana_query_duration_seconds_bucket{{{label},le="+Inf"}} 2' in prometheus
+    assert f"pycana_query_duration_seconds_count{{{label}}} 2" in prometheus
+    assert f"pycana_query_rows_total{{{label}}} 8" in prometheus
+    assert 'pycana_query_full_scans_total{statement="SELECT * FROM spells WHERE name LIKE ?"} 1' in prometheus
+
+
+def test_metered_connection(spells_db: str, spells_from: Callable[[str], List[Spell]]) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+    metrics = QueryMetrics()
+    settings = ConnectionSettings(read_only=True, metrics=metrics)
+
+    spells = find_spells(spells_db, SpellCriteria(level="3"), settings=settings, with_description=False)
+    find_spells(spells_db, SpellCriteria(level="5"), settings=settings, with_description=False)
+    find_spells(spells_db, SpellCriteria(range="feet"), settings=settings, with_description=False)
+    find_description(spells_db, spells[0].book, spells[0].name, settings=settings)
+
+    statements = metrics.statements()
+    by_level = [stats for shape, stats in statements.items() if shape.endswith("FROM spells WHERE level = ?")]
+    assert len(by_level) == 1
+    assert by_level[0].count == 2
+    assert by_level[0].rows == len(spells) + len(find_spells(spells_db, SpellCriteria(level="5")))
+    assert by_level[0].full_scans == 0
+
+    by_range = [stats for shape, stats in statements.items() if "range LIKE ?" in shape]
+    assert by_range[0].full_scans == 1
+
+    description = statements["SELECT description FROM full_spells WHERE book = ? AND name = ?"]
+    assert (description.count, description.rows) == (1, 1)
+
+    # the searched values are never recorded
+    assert not any("feet" in shape for shape in statements)
+
+
+def test_query_plans_cached_by_shape(spells_db: str, spells_from: Callable[[str], List[Spell]], monkeypatch) -> None:
+    load_db(Console(), spells_db, spells_from("spells_a.xml"))
+    metrics = QueryMetrics()
+    settings = ConnectionSettings(read_only=True, metrics=metrics)
+
+    explained: List[List[str]] = []
+
+    def _counting_is_full_scan(plan):
+        explained.append(list(plan))
+        return is_full_scan(explained[-1])
+
+    monkeypatch.setattr(query_metrics, "is_full_scan", _counting_is_full_scan)
+
+    find_spells(spells_db, SpellCriteria(level="0"), settings=settings, with_description=False)
+    explained_once = len(explained)
+
+    for level in range(1, 10):
+        find_spells(spells_db, SpellCriteria(level=str(level)), settings=settings, with_description=False)
+
+    # the searches differ only by their values, so their plan is only explained once
+    by_level = [stats for shape, stats in metrics.statements().items() if shape.endswith("WHERE level = ?")]
+    assert by_level[0].count == 10
+    assert len(explained) == explained_once
@@ -0,0 +1,34 @@
+import pytest
+
+from pycana.services import related
+from pycana.services.related import nearest_neighbours
+
+_TEXTS = [
+    "Fire Bolt: you hurl a mote of fire at a creature, which takes fire damage.",
+    "Fireball: a bright streak of fire blossoms into an explosion of flame, each creature takes fire damage.",
+    "Ray of Frost: a frigid beam of cold light streaks toward a creature, which takes cold damage.",
+    "Fire Bolt: you hurl a mote of fire at a creature or object.",
+    "Alarm: you set an alarm against unwanted intrusion.",
+]
+
+_GROUPS = ["fire bolt", "fireball", "ray of frost", "fire bolt", "alarm"]
+
+
+def test_nearest_neighbours() -> None:
+    neighbours = nearest_neighbours(_TEXTS, _GROUPS, count=2)
+
+    # the most similar first, never in the same group, and never sharing no word
+    assert [other for other, _ in neighbours[0]] == [1, 2]
+    assert [other for other, _ in neighbours[3]] == [1, 2]
+    assert neighbours[1][0][0] in (0, 3)
+    assert neighbours[4] == []
+    assert all(0 < score <= 1 for text_neighbours in neighbours for _, score in text_neighbours)
+    assert nearest_neighbours(_TEXTS, _GROUPS, count=1)[0] == neighbours[0][:1]
+
+
+def test_nearest_neighbours_computations_agree() -> None:
+    pytest.importorskip("numpy")
+    vectors = related._tfidf_vectors(_TEXTS * 100)
+    groups = [f"{group} {idx // len(_TEXTS)}" for idx, group in enumerate(_GROUPS * 100)]
+
+    assert related._numpy_neighbours(vectors, groups, 5) == related._sparse_neighbours(vectors, groups, 5)
@@ -1,3 +1,6 @@
+import bz2
+import gzip
+import lzma
 from pathlib import Path
 from typing import List
 
@@ -83,3 +86,36 @@ def test_load_all_spells(name_filter, expected_count, verbose, output_count, mon
 
     assert len(spells) == expected_count
     assert len(output) == output_count
+
+
+@pytest.mark.parametrize("suffix, compress", [(".bz2", bz2.compress), (".xz", lzma.compress)])
+def test_load_spells_with_codec(tmp_path, suffix: str, compress) -> None:
+    source = Path(__file__).parent.parent.joinpath("resources", "spells_a.xml")
+    xml_file = Path(tmp_path, f"spells_a.xml{suffix}")
+    xml_file.write_bytes(compress(source.read_bytes()))
+
+    spells = load_spells(Console(), str(xml_file))
+
+    assert len(spells) == 17
+    assert spells[3].name == "Alter Self"
+
+    # the default filter picks up all of the compressed bundles
+    assert len(load_all_spells(Console(), str(tmp_path), name_filter=None)) == 17
+
+
+def test_load_all_spells_once_per_bundle(tmp_path) -> None:
+    source = Path(__file__).parent.parent.joinpath("resources", "spells_a.xml").read_bytes()
+    Path(tmp_path, "spells_a.xml.gz").write_bytes(gzip.compress(source))
+    Path(tmp_path, "spells_a.xml.bz2").write_bytes(bz2.compress(source))
+    Path(tmp_path, "spells_b.xml.xz").write_bytes(
+        lzma.compress(Path(__file__).parent.parent.joinpath("resources", "spells_b.xml").read_bytes())
+    )
+
+    # the same bundle compressed with two codecs is only loaded once
+    assert len(load_all_spells(Console(), str(tmp_path), name_filter=None)) == 30
+
+
+def test_load_spells_without_mmap() -> None:
+    xml_file = str(Path(__file__).parent.parent.joinpath("resources", "spells_a.xml"))
+
+    assert load_spells(Console(), xml_file, use_mmap=False) == load_spells(Console(), xml_file, use_mmap=True)
@@ -1,6 +1,6 @@
 import pytest
 
-from pycana.models import School
+from pycana.models import School, SpellCriteria
 
 
 @pytest.mark.parametrize(
@@ -26,3 +26,70 @@ from pycana.models import School
 )
 def test_school_from_str(label: str, expected: School) -> None:
     assert School.from_str(label) == expected
+
+
+@pytest.mark.parametrize(
+    "criteria, expected",
+    [
+        (SpellCriteria(), ""),
+        (SpellCriteria(level="3"), "level = 3"),
+        (SpellCriteria(level="(1, 3, 7, 3)"), "level IN (1, 3, 7)"),
+        (SpellCriteria(level="1-3"), "level BETWEEN 1 AND 3"),
+        (SpellCriteria(level="(0, '2-4', 7)"), "(level IN (0, 7) OR level BETWEEN 2 AND 4)"),
+        (SpellCriteria(name="Fire"), "search_key LIKE '%fire%' ESCAPE '\\'"),
+        (SpellCriteria(name="^Fire"), "search_key LIKE 'fire%' ESCAPE '\\'"),
+        (SpellCriteria(name="Tasha's 100%_"), "search_key LIKE '%tasha''s 100\\%\\_%' ESCAPE '\\'"),
+        (
+            SpellCriteria(caster="('wizard', 'Wizard', 'warlock')"),
+            "(casters LIKE '%wizard%' ESCAPE '\\' OR casters LIKE '%warlock%' ESCAPE '\\')",
+        ),
+        (SpellCriteria(school="evocation"), "school = 'EVOCATION'"),
+        (SpellCriteria(school="('evocation', 'Illusion', 'EVOCATION')"), "school IN ('EVOCATION', 'ILLUSION')"),
+        (SpellCriteria(school="evoc"), "school LIKE '%evoc%' ESCAPE '\\'"),
+        (SpellCriteria(ritual=True, level="2"), "level = 2 AND ritual = 1"),
+        (
+            SpellCriteria(description="acid"),
+            "content_hash IN (SELECT content_hash FROM spell_text WHERE description LIKE '%acid%')",
+        ),
+        (
+            SpellCriteria(description="('^acid', '5%')"),
+            "content_hash IN (SELECT content_hash FROM spell_text WHERE "
+            "(description LIKE 'acid%' OR description LIKE '%5\\%%' ESCAPE '\\'))",
+        ),
+    ],
+)
+def test_criteria_predicate(criteria: SpellCriteria, expected: str) -> None:
+    assert criteria.predicate() == expected
+
+
+def test_criteria_predicate_invalid() -> None:
+    with pytest.raises(ValueError, match="Invalid level criteria: one"):
+        SpellCriteria(level="one").predicate()
+
+    with pytest.raises(ValueError, match="Invalid level criteria: a "):
+        SpellCriteria(level="(1, 'a-b')").predicate()
+
+    with pytest.raises(ValueError, match="Invalid multi-value criteria"):
+        SpellCriteria(caster="(wizard, warlock)").predicate()
+
+
+@pytest.mark.parametrize(
+    "criteria, previous, expected",
+    [
+        (SpellCriteria(name="fire"), SpellCriteria(), True),
+        (SpellCriteria(name="fire"), SpellCriteria(name="fir"), True),
+        (SpellCriteria(name="^Fireball"), SpellCriteria(name="^fire"), True),
+        (SpellCriteria(name="Fireball"), SpellCriteria(name="^fire"), False),
+        (SpellCriteria(name="^fireball"), SpellCriteria(name="ball"), True),
+        (SpellCriteria(name="fire", level="3"), SpellCriteria(name="fire"), True),
+        (SpellCriteria(name="fir"), SpellCriteria(name="fire"), False),
+        (SpellCriteria(name="a fire"), SpellCriteria(name="^fire"), False),
+        (SpellCriteria(), SpellCriteria(name="fire"), False),
+        (SpellCriteria(level="2"), SpellCriteria(level="1-3"), False),
+        (SpellCriteria(caster="('wizard', 'bard')"), SpellCriteria(caster="wizard"), False),
+        (SpellCriteria(ritual=True), SpellCriteria(ritual=False), False),
+        (SpellCriteria(ritual=True, school="evocation"), SpellCriteria(ritual=True, school="evoc"), True),
+    ],
+)
+def test_criteria_narrows(criteria: SpellCriteria, previous: SpellCriteria, expected: bool) -> None:
+    assert criteria.narrows(previous) == expected